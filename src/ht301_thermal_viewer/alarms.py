@@ -0,0 +1,243 @@
+import json
+import time
+import socket
+import numpy as np
+from collections import deque
+
+from .footer import FOOTER_ROWS, celsius_to_raw
+from .ht301_hacklib import HT301
+from .utils import get_config_dir
+
+# Rule measures and the raw-frame statistic each one is compared on
+MEASURES = ('max', 'min', 'center')
+
+# Visible image of the sensor, which regions must lie in
+SENSOR_SIZE = (HT301.FRAME_WIDTH, HT301.FRAME_HEIGHT - FOOTER_ROWS)
+
+
+class AlarmRule:
+    """A threshold or rate-of-rise condition and the actions it triggers.
+
+    Rules are built from dicts such as
+        {"name": "breaker", "measure": "max", "above": 80, "frames": 5,
+         "region": [x, y, w, h], "actions": ["snapshot", "event"]}
+        {"name": "cold", "measure": "center", "below": 5, "actions": ["event"]}
+        {"name": "spike", "measure": "max", "rise_per_s": 2.0, "window_s": 2.0,
+         "actions": ["save_buffer", "event"]}
+    Regions are in sensor coordinates (before flips and rotation) and must
+    lie inside the `sensor_size` (width, height) image; without a region the
+    whole frame is used.
+    """
+    def __init__(self, spec, sensor_size=SENSOR_SIZE):
+        self.name = spec.get('name', 'alarm')
+        self.measure = spec.get('measure', 'max')
+        if self.measure not in MEASURES:
+            raise ValueError(f"alarm '{self.name}': unknown measure '{self.measure}'")
+        region = spec.get('region')
+        self.region = self._check_region(region, sensor_size) if region is not None else None
+        self.above = spec.get('above')
+        self.below = spec.get('below')
+        self.rise_per_s = spec.get('rise_per_s')
+        self.window_s = float(spec.get('window_s', 2.0))
+        self.frames = max(1, int(spec.get('frames', 1)))
+        self.cooldown_s = float(spec.get('cooldown_s', 10.0))
+        self.actions = list(spec.get('actions', ['event']))
+        if sum(v is not None for v in (self.above, self.below, self.rise_per_s)) != 1:
+            raise ValueError(f"alarm '{self.name}': give exactly one of above/below/rise_per_s")
+
+    def _check_region(self, region, sensor_size):
+        try:
+            x, y, w, h = (int(v) for v in region)
+        except (TypeError, ValueError):
+            raise ValueError(f"alarm '{self.name}': region must be [x, y, width, height]")
+        if w <= 0 or h <= 0:
+            raise ValueError(f"alarm '{self.name}': region {[x, y, w, h]} is empty")
+        width, height = sensor_size
+        if x < 0 or y < 0 or x + w > width or y + h > height:
+            raise ValueError(f"alarm '{self.name}': region {[x, y, w, h]} outside the {width}x{height} sensor")
+        return x, y, w, h
+
+    @property
+    def key(self):
+        """Identifies the statistic the rule needs, shared between rules."""
+        return (self.measure, self.region)
+
+
+class AlarmEngine:
+    """Evaluate alarm rules on every raw frame and fire their actions.
+
+    Thresholds are converted to raw counts once per LUT (the LUT is monotonic),
+    so a frame costs one max/min per distinct region plus a single vectorized
+    comparison over all threshold rules, however many there are.
+
+    Actions are callables registered by name in `actions` (the window adds
+    "snapshot", "record_start", "record_stop" and "save_buffer"); "event"
+    always prints a JSON line to stdout and, if `event_socket` is set, sends it
+    as a datagram to that Unix socket without ever blocking.
+    """
+    def __init__(self, rules=(), event_socket=None):
+        self.rules = [r if isinstance(r, AlarmRule) else AlarmRule(r) for r in rules]
+        self.actions = {'event': self.emit_event}
+        self.event_socket = event_socket
+        self._socket = None
+        self._lut_version = None
+        self._compile_structure()
+
+    @classmethod
+    def from_config(cls, path=None):
+        """Load rules from alarms.json in the config directory, if present."""
+        path = path or get_config_dir() / 'alarms.json'
+        try:
+            with open(str(path)) as f:
+                config = json.load(f)
+        except FileNotFoundError:
+            return cls()
+        except Exception as e:
+            print(f"Error loading alarm rules from {path}: {e}")
+            return cls()
+
+        rules = []
+        try:
+            for spec in config.get('rules', []):
+                try:
+                    rules.append(AlarmRule(spec))
+                except Exception as e:
+                    # Skip the broken rule, keep the others
+                    print(f"Invalid alarm rule in {path}: {e}")
+            return cls(rules, config.get('event_socket'))
+        except Exception as e:
+            print(f"Invalid alarm rules in {path}: {e}")
+            return cls()
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def _compile_structure(self):
+        # One statistic per distinct (measure, region), shared by all rules using it
+        keys = []
+        for rule in self.rules:
+            if rule.key not in keys:
+                keys.append(rule.key)
+        self._stat_keys = keys
+        self._rule_stat = np.array([keys.index(r.key) for r in self.rules], dtype=np.intp)
+
+        self._threshold_idx = np.array([i for i, r in enumerate(self.rules) if r.rise_per_s is None],
+                                       dtype=np.intp)
+        self._rise_idx = [i for i, r in enumerate(self.rules) if r.rise_per_s is not None]
+        self._history = {i: deque() for i in self._rise_idx}
+
+        n = len(self.rules)
+        self._sign = np.ones(n, dtype=np.int32)
+        self._bound = np.zeros(n, dtype=np.int32)
+        self._streak = np.zeros(n, dtype=np.int32)
+        self._frames_needed = np.array([r.frames for r in self.rules], dtype=np.int32)
+        self._active = np.zeros(n, dtype=bool)
+        self._last_fired = np.full(n, -np.inf)
+
+    def compile(self, lut):
+        """Convert the °C thresholds to raw-count bounds for the given LUT."""
+        for i, rule in enumerate(self.rules):
+            if rule.above is not None:
+                # raw >= first raw value hotter than the threshold
+                self._sign[i] = 1
+                self._bound[i] = celsius_to_raw(lut, rule.above, side='right')
+            elif rule.below is not None:
+                # raw < first raw value at the threshold, i.e. -raw >= 1 - bound
+                self._sign[i] = -1
+                self._bound[i] = 1 - celsius_to_raw(lut, rule.below, side='left')
+
+    def _statistics(self, frame, info):
+        stats = np.empty(len(self._stat_keys), dtype=np.int32)
+        for k, (measure, region) in enumerate(self._stat_keys):
+            if measure == 'center':
+                stats[k] = info['Tcenter_raw']
+            elif region is None:
+                # The footer already carries the whole-frame extremes
+                stats[k] = info['Tmax_raw'] if measure == 'max' else info['Tmin_raw']
+            else:
+                x, y, w, h = region
+                view = frame[y:y + h, x:x + w]
+                stats[k] = view.max() if measure == 'max' else view.min()
+        return stats
+
+    def evaluate(self, frame, info, lut, lut_version=None, timestamp=None):
+        """Check all rules against a raw visible frame; returns names of rules that fired."""
+        if not self.rules:
+            return []
+        if lut_version is None or lut_version != self._lut_version:
+            self.compile(lut)
+            self._lut_version = lut_version
+        timestamp = time.monotonic() if timestamp is None else timestamp
+
+        stats = self._statistics(frame, info)
+        values = stats[self._rule_stat]
+
+        hits = np.zeros(len(self.rules), dtype=bool)
+        idx = self._threshold_idx
+        hits[idx] = self._sign[idx] * values[idx] >= self._bound[idx]
+
+        for i in self._rise_idx:
+            rule = self.rules[i]
+            history = self._history[i]
+            history.append((timestamp, float(lut[values[i]])))
+            while history and timestamp - history[0][0] > rule.window_s:
+                history.popleft()
+            t0, T0 = history[0]
+            if timestamp > t0:
+                hits[i] = (history[-1][1] - T0) / (timestamp - t0) > rule.rise_per_s
+
+        self._streak = np.where(hits, self._streak + 1, 0)
+        active = self._streak >= self._frames_needed
+        rising = active & ~self._active
+        self._active = active
+
+        fired = []
+        for i in np.flatnonzero(rising):
+            if timestamp - self._last_fired[i] < self.rules[i].cooldown_s:
+                continue
+            self._last_fired[i] = timestamp
+            rule = self.rules[i]
+            fired.append(rule.name)
+            self._fire(rule, float(lut[values[i]]), timestamp)
+        return fired
+
+    def _fire(self, rule, value_C, timestamp):
+        for action in rule.actions:
+            handler = self.actions.get(action)
+            if handler is None:
+                print(f"Alarm '{rule.name}': unknown action '{action}'")
+                continue
+            try:
+                if action == 'event':
+                    handler(rule, value_C, timestamp)
+                else:
+                    handler()
+            except Exception as e:
+                print(f"Alarm '{rule.name}': action '{action}' failed: {e}")
+
+    def emit_event(self, rule, value_C, timestamp):
+        """Print the alarm as a JSON line and send it to the event socket, if any."""
+        event = {
+            'alarm': rule.name,
+            'measure': rule.measure,
+            'region': rule.region,
+            'value_C': round(value_C, 2),
+            'time': time.time(),
+            'monotonic': timestamp,
+        }
+        line = json.dumps(event)
+        print(line, flush=True)
+        if self.event_socket:
+            try:
+                if self._socket is None:
+                    self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+                    self._socket.setblocking(False)
+                self._socket.sendto(line.encode() + b'\n', self.event_socket)
+            except OSError:
+                # Nobody listening (or the listener is behind): drop the event
+                pass
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
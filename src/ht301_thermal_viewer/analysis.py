@@ -0,0 +1,125 @@
+#!/usr/bin/python3
+"""Offline analysis of raw recordings.
+
+Extract per-frame telemetry from a `.raw` file into a CSV or NPZ table:
+
+    python3 -m ht301_thermal_viewer.analysis recording.raw -o telemetry.csv
+"""
+import argparse
+import time
+import numpy as np
+from pathlib import Path
+
+from .footer import FOOTER_ROWS, LutCache, decode_footer, split_frame
+from .raw_reader import RawRecording
+
+# Output columns, in order, with their CSV number formats
+TELEMETRY_COLUMNS = [
+    ('frame', '%d'),
+    ('Tmin_C', '%.3f'),
+    ('Tmax_C', '%.3f'),
+    ('Tcenter_C', '%.3f'),
+    ('Tmean_C', '%.3f'),
+    ('Tmin_raw', '%d'),
+    ('Tmax_raw', '%d'),
+    ('Tcenter_raw', '%d'),
+    ('fpatmp_C', '%.3f'),
+    ('coretmp_C', '%.2f'),
+    ('fpaavg', '%d'),
+    ('orgavg', '%d'),
+]
+
+# Frames gathered through the LUT at once when computing the mean temperature;
+# bounds the float32 scratch buffer to a few tens of MB.
+MEAN_BATCH = 32
+
+
+def chunk_telemetry(first, frames_raw, lut_cache, scratch=None):
+    """Compute the telemetry columns for a chunk of consecutive raw frames."""
+    visible, meta = split_frame(np.asarray(frames_raw))
+    fields = decode_footer(meta)
+    luts, inverse = lut_cache.lookup_many(meta)
+
+    n = len(frames_raw)
+    columns = {
+        'frame': np.arange(first, first + n),
+        'Tmin_C': luts[inverse, fields['Tmin_raw']],
+        'Tmax_C': luts[inverse, fields['Tmax_raw']],
+        'Tcenter_C': luts[inverse, fields['Tcenter_raw']],
+        'Tmean_C': np.empty(n),
+    }
+    for name in ('Tmin_raw', 'Tmax_raw', 'Tcenter_raw', 'fpatmp_C', 'coretmp_C', 'fpaavg', 'orgavg'):
+        columns[name] = fields[name]
+
+    # Mean over the image: gather every pixel through its frame's LUT
+    luts32 = luts.astype(np.float32)
+    if scratch is None or scratch.shape[1:] != visible.shape[1:]:
+        scratch = np.empty((MEAN_BATCH,) + visible.shape[1:], dtype=np.float32)
+    for row in range(len(luts32)):
+        idx = np.flatnonzero(inverse == row)
+        for start in range(0, len(idx), MEAN_BATCH):
+            sel = idx[start:start + MEAN_BATCH]
+            buf = scratch[:len(sel)]
+            np.take(luts32[row], visible[sel], out=buf)
+            columns['Tmean_C'][sel] = buf.mean(axis=(1, 2), dtype=np.float64)
+
+    return columns, scratch
+
+
+def extract_telemetry(raw_path, chunk_frames=256):
+    """Yield telemetry column dicts for a raw recording, one per chunk."""
+    recording = RawRecording(raw_path)
+    if recording.height <= FOOTER_ROWS:
+        raise ValueError(f"{raw_path}: frames have no metadata footer")
+
+    lut_cache = LutCache()
+    scratch = None
+    try:
+        for first, frames_raw in recording.chunks(chunk_frames):
+            columns, scratch = chunk_telemetry(first, frames_raw, lut_cache, scratch)
+            yield columns
+    finally:
+        recording.close()
+
+
+def write_telemetry(raw_path, out_path, chunk_frames=256):
+    """Write the telemetry of a raw recording to CSV or NPZ (by extension)."""
+    out_path = Path(out_path)
+    names = [name for name, _ in TELEMETRY_COLUMNS]
+    fmt = [f for _, f in TELEMETRY_COLUMNS]
+    n_frames = 0
+
+    if out_path.suffix == '.npz':
+        parts = {name: [] for name in names}
+        for columns in extract_telemetry(raw_path, chunk_frames):
+            for name in names:
+                parts[name].append(columns[name])
+            n_frames += len(columns['frame'])
+        np.savez(str(out_path), **{name: np.concatenate(parts[name]) if parts[name] else np.empty(0)
+                                   for name in names})
+    else:
+        with open(str(out_path), 'w') as f:
+            f.write(','.join(names) + '\n')
+            for columns in extract_telemetry(raw_path, chunk_frames):
+                table = np.column_stack([columns[name] for name in names])
+                np.savetxt(f, table, fmt=fmt, delimiter=',')
+                n_frames += len(table)
+    return n_frames
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract per-frame telemetry from an HT301 raw recording.")
+    parser.add_argument('raw', help="raw recording (.raw) to analyse")
+    parser.add_argument('-o', '--output', help="output file (.csv or .npz), defaults to <raw>.csv")
+    parser.add_argument('--chunk', type=int, default=256, help="frames processed per chunk")
+    args = parser.parse_args(argv)
+
+    out_path = args.output or str(Path(args.raw).with_suffix('.csv'))
+    start = time.monotonic()
+    n_frames = write_telemetry(args.raw, out_path, args.chunk)
+    print(f"Wrote telemetry for {n_frames} frames to {out_path} in {time.monotonic() - start:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
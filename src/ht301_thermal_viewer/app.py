@@ -6,11 +6,13 @@ from gi.repository import Adw
 from .window import ThermalCameraWindow
 
 class ThermalCameraApp(Adw.Application):
-    def __init__(self):
+    def __init__(self, playback_path=None):
         super().__init__(application_id='org.thermalcam.app')
         self.window = None
+        # Raw recording to play instead of opening the camera
+        self.playback_path = playback_path
         
     def do_activate(self):
         if not self.window:
-            self.window = ThermalCameraWindow(application=self)
+            self.window = ThermalCameraWindow(application=self, playback_path=self.playback_path)
             self.window.present() 
\ No newline at end of file
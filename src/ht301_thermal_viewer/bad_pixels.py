@@ -0,0 +1,200 @@
+#!/usr/bin/python3
+"""Detection and correction of stuck, hot, dead and noisy sensor pixels.
+
+Point the camera at a still scene (the lens cap is fine) and run
+
+    python3 -m ht301_thermal_viewer.bad_pixels --frames 100
+
+to capture a short sequence, detect the bad pixels and save the map of the
+camera in the config directory. The viewer and the headless mode load it
+on startup and replace the bad pixels with the mean of their nearest good
+neighbours in every frame.
+"""
+import re
+import hashlib
+import argparse
+import functools
+import cv2
+import numpy as np
+
+from .footer import split_frame
+from .utils import get_config_dir
+
+# Neighbour offsets within 3 pixels, nearest first
+_OFFSETS = sorted(((dy, dx) for dy in range(-3, 4) for dx in range(-3, 4) if dy or dx),
+                  key=lambda o: (o[0] ** 2 + o[1] ** 2, o))
+
+
+def device_id(device_strings):
+    """File name safe identifier of a camera, from its footer device strings."""
+    text = '_'.join(s for s in device_strings if s)
+    name = re.sub(r'[^A-Za-z0-9.-]+', '_', text).strip('_')[:48]
+    digest = hashlib.sha1('\0'.join(device_strings).encode()).hexdigest()[:8]
+    return f"{name or 'camera'}-{digest}"
+
+
+def map_path(device_strings):
+    return get_config_dir() / 'bad_pixels' / f"{device_id(device_strings)}.npz"
+
+
+def _robust_sigma(values):
+    """Standard deviation estimated from the median absolute deviation."""
+    return 1.4826 * np.median(np.abs(values - np.median(values)))
+
+
+def _neighbours(image, outside):
+    """The 8 neighbours of every pixel, sorted along the first axis."""
+    height, width = image.shape
+    padded = cv2.copyMakeBorder(image, 1, 1, 1, 1, cv2.BORDER_CONSTANT, value=outside)
+    return np.sort([padded[1 + dy:1 + dy + height, 1 + dx:1 + dx + width]
+                    for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dy or dx], axis=0)
+
+
+def detect_bad_pixels(frames, noise_k=8.0, outlier_k=8.0, min_counts=30):
+    """Classify the pixels of a stack of visible raw frames (N, H, W).
+
+    stuck: (almost) no temporal variation while the sensor noise moves
+           every good pixel;
+    noisy: temporal standard deviation far above that of the sensor;
+    hot/dead: temporal mean far above/below its 8 neighbours. The
+           second highest (lowest) neighbour is the reference, so pairs of
+           bad pixels are found too while the smooth peaks of the scene,
+           which only slightly exceed their neighbours, are not.
+    Thresholds are `k` robust standard deviations over the whole sensor;
+    hot/dead also need `min_counts` raw counts of difference. Returns a
+    dict of boolean masks.
+    """
+    frames = np.asarray(frames)
+    if frames.ndim != 3 or len(frames) < 2:
+        raise ValueError("need a stack of at least two frames")
+    mean = frames.mean(axis=0, dtype=np.float64).astype(np.float32)
+    std = frames.std(axis=0, dtype=np.float64)
+
+    typical_std = np.median(std)
+    stuck = std < 0.1 * typical_std if typical_std > 0 else np.zeros(std.shape, dtype=bool)
+    noisy = std > typical_std + noise_k * max(_robust_sigma(std), 0.5)
+
+    threshold = max(outlier_k * _robust_sigma(mean - cv2.medianBlur(mean, 3)), min_counts)
+    # Outside the sensor the padding never wins: -inf when looking for the
+    # highest neighbours, +inf for the lowest
+    hot = mean - _neighbours(mean, -np.inf)[-2] > threshold
+    dead = _neighbours(mean, np.inf)[1] - mean > threshold
+    return {'stuck': stuck, 'noisy': noisy & ~stuck, 'hot': hot & ~stuck, 'dead': dead & ~stuck}
+
+
+class BadPixelMap:
+    """Bad pixel mask with the neighbour indices used to correct it.
+
+    The replacement of every bad pixel is the mean of its `neighbours`
+    nearest good pixels (within 3 pixels); their coordinates are computed
+    once, so correct() is a single gather and scatter over the frame.
+    """
+    def __init__(self, mask, neighbours=4):
+        self.mask = np.asarray(mask, dtype=bool)
+        height, width = self.mask.shape
+        self.rows, self.cols = np.nonzero(self.mask)
+
+        offsets = np.array(_OFFSETS)
+        rows = self.rows[:, None] + offsets[:, 0]
+        cols = self.cols[:, None] + offsets[:, 1]
+        inside = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+        rows, cols = np.clip(rows, 0, height - 1), np.clip(cols, 0, width - 1)
+        good = inside & ~self.mask[rows, cols]
+
+        # First `neighbours` good candidates of each bad pixel (argsort is
+        # stable, so the nearest come first); missing ones repeat the nearest
+        order = np.argsort(~good, axis=1, kind='stable')[:, :neighbours]
+        picked = np.take_along_axis(good, order, axis=1)
+        order = np.where(picked, order, order[:, :1])
+        self.neighbour_rows = np.take_along_axis(rows, order, axis=1)
+        self.neighbour_cols = np.take_along_axis(cols, order, axis=1)
+        # Pixels without a good neighbour nearby are left as they are
+        isolated = ~picked[:, 0]
+        self.neighbour_rows[isolated] = self.rows[isolated, None]
+        self.neighbour_cols[isolated] = self.cols[isolated, None]
+        self.neighbours = neighbours
+
+    def __len__(self):
+        return len(self.rows)
+
+    def correct(self, visible):
+        """Replace the bad pixels of a visible raw frame in place."""
+        if len(self.rows) == 0 or visible.shape != self.mask.shape:
+            return visible
+        total = visible[self.neighbour_rows, self.neighbour_cols].sum(axis=1, dtype=np.uint32)
+        visible[self.rows, self.cols] = (total + self.neighbours // 2) // self.neighbours
+        return visible
+
+    def save(self, path, **counts):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(str(path), mask=self.mask, **counts)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(str(path)) as data:
+            return cls(data['mask'])
+
+
+def load_bad_pixel_map(device_strings):
+    """The saved map of a camera, or None."""
+    path = map_path(device_strings)
+    if not path.exists():
+        return None
+    try:
+        bad_pixels = BadPixelMap.load(path)
+        print(f"Loaded {len(bad_pixels)} bad pixels from {path}")
+        return bad_pixels
+    except Exception as e:
+        print(f"Error loading bad pixel map {path}: {e}")
+        return None
+
+
+def calibrate(camera_manager, frames=100):
+    """Capture `frames` frames, detect the bad pixels and save the camera's map."""
+    # Detect on uncorrected data
+    camera_manager.correct_bad_pixels = False
+    stack = None
+    for i in range(frames):
+        ret, frame, frame_raw = camera_manager.read_raw()
+        if not ret:
+            raise RuntimeError("capture failed")
+        visible = split_frame(frame_raw)[0]
+        if stack is None:
+            stack = np.empty((frames,) + visible.shape, dtype=visible.dtype)
+        stack[i] = visible
+
+    kinds = detect_bad_pixels(stack)
+    mask = functools.reduce(np.logical_or, kinds.values())
+    bad_pixels = BadPixelMap(mask)
+    path = map_path(camera_manager.cap.device_strings)
+    counts = {kind: int(m.sum()) for kind, m in kinds.items()}
+    bad_pixels.save(path, **counts)
+    return bad_pixels, counts, path
+
+
+def main(argv=None):
+    from .camera_manager import CameraManager
+    from .raw_reader import ReplayDevice
+
+    parser = argparse.ArgumentParser(description="Detect the bad pixels of an HT301 and save its map.")
+    parser.add_argument('--frames', type=int, default=100, help="frames captured for the detection")
+    parser.add_argument('--replay', help="detect on a .raw recording instead of the camera")
+    args = parser.parse_args(argv)
+
+    if args.replay:
+        camera_manager = CameraManager(functools.partial(ReplayDevice, args.replay, realtime=False))
+    else:
+        camera_manager = CameraManager()
+    if not camera_manager.initialize():
+        return 1
+    try:
+        bad_pixels, counts, path = calibrate(camera_manager, args.frames)
+    finally:
+        camera_manager.release()
+    details = ', '.join(f"{n} {kind}" for kind, n in counts.items())
+    print(f"Saved {len(bad_pixels)} bad pixels ({details}) to {path}")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
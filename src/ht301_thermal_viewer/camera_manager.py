@@ -1,19 +1,49 @@
+import time
 import cv2
 import numpy as np
-from .ht301_hacklib import HT301
+from .capture import ResilientCapture
+from .footer import LutCache, split_frame
+from .bad_pixels import load_bad_pixel_map
+from .nuc import load_flat_field
 
 class CameraManager:
-    def __init__(self):
+    def __init__(self, device_factory=ResilientCapture):
         self.cap = None
+        # Called to open the device; a ReplayDevice factory plays a recording instead
+        self.device_factory = device_factory
+        # Temperature LUTs only change with the calibration parameters
+        self.lut_cache = LutCache()
+        self.lut = None
+        # Flat field and bad pixel map of the device, loaded once its device
+        # strings are known
+        self.correct_flat_field = True
+        self.flat_field = None
+        self.correct_bad_pixels = True
+        self.bad_pixels = None
+        self._device_maps_loaded = False
+        # Last frame returned by read_raw(): the device's, or the corrected copy
+        self.frame = self.frame_raw = None
+        # Shutter calibrations so far, and when the last one ran (monotonic)
+        self.calibrations = 0
+        self.last_calibration = None
+        # Openings of the device seen so far; a reconnected camera calibrates itself
+        self._connections = 0
         # Don't auto-initialize in __init__, let the window control initialization
         
     def initialize(self):
         """Initialize the thermal camera."""
         try:
-            self.cap = HT301()
+            self.cap = self.device_factory()
             if self.cap is None:
                 print("Camera initialization failed - got None")
                 return False
+            self.flat_field = None
+            self.bad_pixels = None
+            self._device_maps_loaded = False
+            self._connections = getattr(self.cap, 'connections', 1)
+            # Opening the camera runs a shutter calibration
+            self.calibrations += 1
+            self.last_calibration = time.monotonic()
             return True
         except Exception as e:
             print(f"Failed to initialize camera: {e}")
@@ -21,34 +51,116 @@ class CameraManager:
             
     def read_frame(self):
         """Read a frame from the camera and process it."""
-        if self.cap is None:
-            print("Cannot read frame - camera not initialized")
+        ret, frame, frame_raw = self.read_raw()
+        if not ret:
             return False, None, None, None
             
         try:
-            ret, frame, frame_raw = self.cap.read()
-            if not ret:
-                print("Failed to read frame from camera")
-                return False, None, None, None
-                
-            info, lut = self.cap.info()
-            frame = frame.astype(np.float32)
-            
-            # Auto-exposure
-            frame -= frame.min()
-            frame /= frame.max()
-            frame = (np.clip(frame, 0, 1)*255).astype(np.uint8)
+            info = self.read_info()
+            frame = self.normalize_frame(frame)
             
             return True, frame, frame_raw, info
         except Exception as e:
             print(f"Error reading frame: {e}")
             return False, None, None, None
             
+    def read_raw(self):
+        """Read a frame from the camera without decoding or normalizing it."""
+        if self.cap is None:
+            print("Cannot read frame - camera not initialized")
+            return False, None, None
+            
+        try:
+            ret, frame, frame_raw = self.cap.read()
+            if not ret:
+                # Losing and reconnecting the device is reported by the capture itself
+                if self.connected():
+                    print("Failed to read frame from camera")
+                return False, None, None
+            connections = getattr(self.cap, 'connections', 1)
+            if connections != self._connections:
+                # Reopened after a disconnect: it calibrated, and may be another camera
+                self._connections = connections
+                self._device_maps_loaded = False
+                self.calibrations += 1
+                self.last_calibration = time.monotonic()
+            if not self._device_maps_loaded:
+                self.flat_field = load_flat_field(self.cap.device_strings)
+                self.bad_pixels = load_bad_pixel_map(self.cap.device_strings)
+                self._device_maps_loaded = True
+            flat_field = self.flat_field if self.correct_flat_field else None
+            bad_pixels = self.bad_pixels if self.correct_bad_pixels else None
+            if flat_field is not None or bad_pixels is not None:
+                # Corrected in a frame of our own: the device may hand the same
+                # buffer out again (a paused or prefetched recording), and
+                # published frames must never change
+                frame_raw = frame_raw.copy()
+                frame = split_frame(frame_raw)[0]
+                if flat_field is not None:
+                    flat_field.correct(frame)
+                if bad_pixels is not None:
+                    bad_pixels.correct(frame)
+            self.frame, self.frame_raw = frame, frame_raw
+            return True, frame, frame_raw
+        except Exception as e:
+            print(f"Error reading frame: {e}")
+            return False, None, None
+            
+    def read_info(self):
+        """Decode the readings of the last frame read, using the cached LUT."""
+        self.lut = self.lut_cache.lookup(self.cap.meta)
+        info, lut = self.cap.info(self.lut)
+        if self.correct_bad_pixels and self.bad_pixels is not None and len(self.bad_pixels):
+            self.correct_extremes(info, self.frame)
+        return info
+        
+    def correct_extremes(self, info, visible):
+        """Replace the footer's Tmin/Tmax, which the camera computes before correction."""
+        min_raw, max_raw, min_point, max_point = cv2.minMaxLoc(visible)
+        info['Tmin_raw'], info['Tmin_point'], info['Tmin_C'] = int(min_raw), min_point, self.lut[int(min_raw)]
+        info['Tmax_raw'], info['Tmax_point'], info['Tmax_C'] = int(max_raw), max_point, self.lut[int(max_raw)]
+            
+    @staticmethod
+    def normalize_frame(frame):
+        """Stretch a raw visible frame to 8 bits between its min and max."""
+        frame = frame.astype(np.float32)
+        
+        # Auto-exposure
+        frame -= frame.min()
+        frame /= frame.max()
+        return (np.clip(frame, 0, 1)*255).astype(np.uint8)
+            
+    def connected(self):
+        """False while the capture is reconnecting a lost camera."""
+        return self.cap is not None and getattr(self.cap, 'connected', True)
+        
+    def reconnecting(self):
+        """True while the capture is trying to reopen a lost camera."""
+        return self.cap is not None and not getattr(self.cap, 'connected', True)
+        
+    def capture_status(self):
+        """Timeout, retry and reconnection counters of the capture (None for recordings)."""
+        if self.cap is None or not hasattr(self.cap, 'status'):
+            return None
+        return self.cap.status()
+        
+    def sensor_fps(self):
+        """Frame rate reported by the capture device (25 if unknown)."""
+        if self.cap is not None:
+            if not hasattr(self.cap, 'cap'):
+                return getattr(self.cap, 'fps', 25.0)
+            fps = self.cap.cap.get(cv2.CAP_PROP_FPS)
+            if fps and fps > 0:
+                return fps
+        return 25.0
+            
     def calibrate(self):
         """Calibrate the camera."""
         if self.cap:
             print("Calibrating camera...")
             self.cap.calibrate()
+            self.calibrations += 1
+            self.last_calibration = time.monotonic()
             print("Camera calibration complete")
         else:
             print("Cannot calibrate - camera not initialized")
@@ -0,0 +1,252 @@
+"""Capture that survives USB glitches and unplugging.
+
+ResilientCapture has the interface of HT301 (read, info, calibrate,
+release and the attributes of the last frame), but the device is read by a
+background thread and supervised by a watchdog:
+
+- read() waits at most `read_timeout_s` for a new frame and returns
+  (False, None, None) otherwise, so a hung device never blocks the caller;
+  while the camera is disconnected it returns at once.
+- The device is lost after `max_failures` failed reads in a row or when no
+  frame arrived for `loss_timeout_s`. The watchdog then reopens it,
+  running the device discovery again, with exponential backoff between
+  attempts.
+- status() reports the state, the failure and retry counters and how long
+  the last outage lasted.
+
+With `on_demand` set (the time-lapse mode), the thread only grab()s frames
+to keep the V4L2 queue drained, and retrieves and decodes one when read()
+asks for it; read() then always waits for a frame captured after the call.
+"""
+import time
+import threading
+import cv2
+
+from .ht301_hacklib import HT301
+
+CONNECTING, STREAMING, LOST, CLOSED = 'connecting', 'streaming', 'lost', 'closed'
+
+
+class _Session:
+    """One opened device and the thread reading it."""
+    def __init__(self, device):
+        self.device = device
+        self.stopped = False
+        self.failed = None
+        self.failures = 0
+        self.last_frame = time.monotonic()
+        self.calibrate = False
+        self.thread = None
+
+
+class ResilientCapture:
+    """HT301 read by a background thread, reopened by a watchdog when lost."""
+    def __init__(self, device_factory=HT301, read_timeout_s=0.5, loss_timeout_s=3.0, max_failures=5,
+                 backoff_s=0.5, max_backoff_s=8.0, check_interval_s=0.25):
+        self.device_factory = device_factory
+        self.read_timeout_s = read_timeout_s
+        self.loss_timeout_s = loss_timeout_s
+        self.max_failures = max_failures
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.check_interval_s = check_interval_s
+        # Retrieve frames only when read() asks for one (devices without grab() always read)
+        self.on_demand = False
+        self._wanted = False
+        self.state = CONNECTING
+        # Counters since construction
+        self.frames = 0
+        self.grabbed = 0
+        self.dropped = 0
+        self.timeouts = 0
+        self.read_failures = 0
+        self.disconnects = 0
+        self.reconnect_attempts = 0
+        # Successful openings (the first one included); the camera calibrates on each
+        self.connections = 0
+        self.last_outage_s = None
+        self.last_error = None
+        self._past_mismatches = 0
+        self.frame = self.frame_raw = self.meta = self.device_strings = None
+        self._latest = None
+        self._seq = 0
+        self._read_seq = 0
+        self._lost_at = None
+        self._session = None
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+
+        # The first opening fails like HT301() does; later ones are retried
+        self._start_session(device_factory())
+        self._watchdog = threading.Thread(target=self._watch, name='ht301-watchdog', daemon=True)
+        self._watchdog.start()
+
+    def _start_session(self, device):
+        session = _Session(device)
+        with self._condition:
+            self._session = session
+            self.connections += 1
+            self.state = STREAMING
+        session.thread = threading.Thread(target=self._read_loop, args=(session,), name='ht301-capture', daemon=True)
+        session.thread.start()
+
+    def _read_loop(self, session):
+        device = session.device
+        try:
+            while not session.stopped:
+                if session.calibrate:
+                    session.calibrate = False
+                    device.calibrate()
+                if self.on_demand and not self._wanted and hasattr(device, 'grab'):
+                    ret = device.grab()
+                    if ret and not session.stopped:
+                        self.grabbed += 1
+                        session.failures = 0
+                        session.last_frame = time.monotonic()
+                        continue
+                else:
+                    ret, frame, frame_raw = device.read()
+                if session.stopped:
+                    break
+                if not ret:
+                    self.read_failures += 1
+                    session.failures += 1
+                    if session.failures >= self.max_failures:
+                        session.failed = f"{session.failures} failed reads"
+                        break
+                    continue
+                now = time.monotonic()
+                session.failures = 0
+                session.last_frame = now
+                with self._condition:
+                    if self._seq != self._read_seq:
+                        self.dropped += 1
+                    self._latest = (frame, frame_raw, device.meta, device.device_strings)
+                    self._seq += 1
+                    self.frames += 1
+                    self._wanted = False
+                    if self._lost_at is not None:
+                        self.last_outage_s = now - self._lost_at
+                        self._lost_at = None
+                        print(f"Camera reconnected after {self.last_outage_s:.1f}s")
+                    self._condition.notify_all()
+        except Exception as e:
+            session.failed = f"read error: {e}"
+        finally:
+            # Released here, never while a read is in progress
+            try:
+                device.release()
+            except Exception as e:
+                print(f"Error releasing camera: {e}")
+
+    def _watch(self):
+        backoff = self.backoff_s
+        while not self._stop.is_set():
+            session = self._session
+            if session is None:
+                self.reconnect_attempts += 1
+                try:
+                    device = self.device_factory()
+                except Exception as e:
+                    self.last_error = str(e)
+                    print(f"Reconnecting camera failed ({e}), retrying in {backoff:.1f}s")
+                    self._stop.wait(backoff)
+                    backoff = min(backoff * 2, self.max_backoff_s)
+                    continue
+                if self._stop.is_set():
+                    device.release()
+                    break
+                backoff = self.backoff_s
+                self._start_session(device)
+                continue
+
+            self._stop.wait(self.check_interval_s)
+            reason = session.failed
+            if reason is None and time.monotonic() - session.last_frame > self.loss_timeout_s:
+                reason = f"no frame for {self.loss_timeout_s:.1f}s"
+            if reason is not None and not self._stop.is_set():
+                self._lose(session, reason)
+
+    def _lose(self, session, reason):
+        # A reader stuck in read() is abandoned; it releases the device when the read returns
+        session.stopped = True
+        self._past_mismatches += getattr(session.device, 'mismatches', 0)
+        self.last_error = reason
+        self.disconnects += 1
+        print(f"Camera lost ({reason}), reconnecting")
+        with self._condition:
+            self._session = None
+            self.state = LOST
+            if self._lost_at is None:
+                self._lost_at = session.last_frame
+            self._condition.notify_all()
+
+    @property
+    def connected(self):
+        return self.state == STREAMING
+
+    def read(self):
+        with self._condition:
+            if self.on_demand:
+                # A frame retrieved before this call is stale by up to an interval
+                self._read_seq = self._seq
+                self._wanted = True
+            if self._seq == self._read_seq and self.state == STREAMING:
+                self._condition.wait_for(lambda: self._seq != self._read_seq or self.state != STREAMING,
+                                         self.read_timeout_s)
+            if self._seq == self._read_seq:
+                if self.state == STREAMING:
+                    self.timeouts += 1
+                return False, None, None
+            self._read_seq = self._seq
+            self.frame, self.frame_raw, self.meta, self.device_strings = self._latest
+        return True, self.frame, self.frame_raw
+
+    def info(self, lut=None):
+        return HT301.info(self, lut)
+
+    @property
+    def fps(self):
+        session = self._session
+        cap = getattr(session.device, 'cap', None) if session is not None else None
+        fps = cap.get(cv2.CAP_PROP_FPS) if cap is not None else 0
+        return fps if fps and fps > 0 else 25.0
+
+    def calibrate(self):
+        # Run by the capture thread between two reads
+        session = self._session
+        if session is not None:
+            session.calibrate = True
+
+    def status(self):
+        """State, counters and the duration of the last outage."""
+        session = self._session
+        mismatches = self._past_mismatches
+        if session is not None:
+            mismatches += getattr(session.device, 'mismatches', 0)
+        return {
+            'state': self.state,
+            'frames': self.frames,
+            'grabbed': self.grabbed,
+            'dropped': self.dropped,
+            'timeouts': self.timeouts,
+            'read_failures': self.read_failures,
+            'mismatches': mismatches,
+            'disconnects': self.disconnects,
+            'reconnect_attempts': self.reconnect_attempts,
+            'connections': self.connections,
+            'last_outage_s': self.last_outage_s,
+            'last_error': self.last_error,
+        }
+
+    def release(self):
+        self._stop.set()
+        self._watchdog.join()
+        with self._condition:
+            session, self._session = self._session, None
+            self.state = CLOSED
+            self._condition.notify_all()
+        if session is not None:
+            session.stopped = True
+            # Let the reader release the device, unless it hangs in a read
+            session.thread.join(self.loss_timeout_s)
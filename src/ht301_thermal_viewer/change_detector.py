@@ -0,0 +1,79 @@
+import time
+import numpy as np
+
+from .footer import FOOTER_ROWS
+
+
+class FrameChangeDetector:
+    """Decide whether a new raw frame needs to go through the render pipeline.
+
+    The fingerprint is a strided sample of the visible image plus the footer
+    words that feed the readings (Tmin/Tmax/Tcenter) and the LUT. A frame is
+    unchanged when no sampled value moved by more than `tolerance` raw counts
+    since the last rendered frame and the render state version is the same.
+    Comparing against the last rendered frame (not the previous one) keeps
+    slow drifts from accumulating unnoticed; `max_skip_s` bounds how stale
+    the picture can get.
+    """
+    # Footer row 0 words: Tmax_raw, Tmin_raw, Tcenter_raw
+    READING_WORDS = np.array([4, 7, 12])
+
+    def __init__(self, stride=4, tolerance=6, max_skip_s=1.0):
+        self.stride = stride
+        self.tolerance = tolerance
+        self.max_skip_s = max_skip_s
+        self._reference = None
+        self._sample = None
+        self._diff = None
+        self._footer = None
+        self._version = None
+        self._rendered_at = 0.0
+        self.frames = 0
+        self.skipped = 0
+
+    @property
+    def skip_rate(self):
+        return self.skipped / self.frames if self.frames else 0.0
+
+    def _fingerprint(self, frame_raw):
+        sample = frame_raw[:-FOOTER_ROWS:self.stride, ::self.stride]
+        if self._sample is None or self._sample.shape != sample.shape:
+            self._reference = np.empty(sample.shape, dtype=np.int32)
+            self._sample = np.empty(sample.shape, dtype=np.int32)
+            self._diff = np.empty(sample.shape, dtype=np.int32)
+            self._footer = None
+        np.copyto(self._sample, sample)
+        meta = frame_raw[-FOOTER_ROWS:]
+        return np.concatenate([meta[0, self.READING_WORDS], meta[3, :13], meta[3, 127:138]])
+
+    def changed(self, frame_raw, version=0, now=None):
+        """Return True if the frame must be rendered, False if it can be skipped."""
+        self.frames += 1
+        now = time.monotonic() if now is None else now
+        footer = self._fingerprint(frame_raw)
+
+        unchanged = (
+            self._footer is not None
+            and version == self._version
+            and now - self._rendered_at < self.max_skip_s
+            and np.array_equal(footer[3:], self._footer[3:])
+            and np.all(np.abs(footer[:3].astype(np.int32) - self._footer[:3]) <= self.tolerance)
+        )
+        if unchanged:
+            np.subtract(self._sample, self._reference, out=self._diff)
+            np.abs(self._diff, out=self._diff)
+            unchanged = self._diff.max() <= self.tolerance
+        if unchanged:
+            self.skipped += 1
+            return False
+
+        # Rendered: this frame becomes the reference
+        self._reference, self._sample = self._sample, self._reference
+        self._footer = footer
+        self._version = version
+        self._rendered_at = now
+        return True
+
+    def reset(self):
+        """Force the next frame to be rendered."""
+        self._footer = None
@@ -0,0 +1,133 @@
+import json
+import hashlib
+import cv2
+import numpy as np
+from pathlib import Path
+
+from .utils import get_config_dir, get_cache_dir
+
+# OpenCV colormaps offered by default; NO_MAP keeps the grayscale image
+BUILTIN_COLORMAPS = [
+    ('NO_MAP', None),
+    ('JET', cv2.COLORMAP_JET),
+    ('HOT', cv2.COLORMAP_HOT),
+    ('INFERNO', cv2.COLORMAP_INFERNO),
+    ('PLASMA', cv2.COLORMAP_PLASMA),
+    ('VIRIDIS', cv2.COLORMAP_VIRIDIS),
+    ('MAGMA', cv2.COLORMAP_MAGMA),
+    ('RAINBOW', cv2.COLORMAP_RAINBOW),
+    ('BONE', cv2.COLORMAP_BONE),
+]
+
+# Grayscale thermal image the picker previews are rendered from
+PREVIEW_SOURCE = Path(__file__).parent / 'cmaps' / 'NO_MAP.png'
+
+
+def builtin_lut(colormap):
+    """Table of an OpenCV colormap enum: 256x1 BGR, as taken by cv2.applyColorMap."""
+    return cv2.applyColorMap(np.arange(256, dtype=np.uint8).reshape(256, 1), colormap)
+
+
+def _parse_color(value):
+    """An RGB colour given as [r, g, b] or "#rrggbb"; returned as BGR."""
+    if isinstance(value, str):
+        value = value.lstrip('#')
+        r, g, b = (int(value[i:i + 2], 16) for i in (0, 2, 4))
+    else:
+        r, g, b = (int(v) for v in value)
+    return b, g, r
+
+
+def gradient_lut(points):
+    """Interpolate [position, colour] control points (positions 0..1) into a 256x1 BGR table."""
+    points = sorted((float(pos), _parse_color(color)) for pos, color in points)
+    if len(points) < 2:
+        raise ValueError("a gradient needs at least two control points")
+    positions = np.array([pos for pos, _ in points]) * 255.0
+    colors = np.array([color for _, color in points], dtype=np.float64)
+    x = np.arange(256)
+    lut = np.empty((256, 1, 3), dtype=np.uint8)
+    for channel in range(3):
+        lut[:, 0, channel] = np.round(np.interp(x, positions, colors[:, channel]))
+    return lut
+
+
+def table_lut(table):
+    """A table of 256 RGB colours as a 256x1 BGR table."""
+    if len(table) != 256:
+        raise ValueError(f"a colour table needs 256 entries, got {len(table)}")
+    lut = np.array([_parse_color(color) for color in table], dtype=np.uint8)
+    return lut.reshape(256, 1, 3)
+
+
+def load_colormap(path):
+    """Load a custom colormap file; returns (name, lut).
+
+        {"name": "IRON", "points": [[0, "#000000"], [0.4, "#8000a0"], [0.8, "#ff8000"], [1, "#ffffff"]]}
+        {"name": "MYMAP", "table": [[r, g, b], ... 256 entries]}
+    """
+    with open(str(path)) as f:
+        spec = json.load(f)
+    name = str(spec.get('name', Path(path).stem)).upper()
+    if 'points' in spec:
+        return name, gradient_lut(spec['points'])
+    if 'table' in spec:
+        return name, table_lut(spec['table'])
+    raise ValueError("expected 'points' or 'table'")
+
+
+def load_colormaps(directory=None):
+    """Built-in colormaps plus the custom ones in the `colormaps` config directory.
+
+    Every entry is (name, lut) with lut a precomputed 256x1 BGR table (None for
+    NO_MAP), so custom and built-in maps cost the same per frame.
+    """
+    colormaps = [(name, None if cmap is None else builtin_lut(cmap)) for name, cmap in BUILTIN_COLORMAPS]
+    directory = Path(directory) if directory else get_config_dir() / 'colormaps'
+    if not directory.is_dir():
+        return colormaps
+
+    names = {name for name, _ in colormaps}
+    for path in sorted(directory.glob('*.json')):
+        try:
+            name, lut = load_colormap(path)
+        except Exception as e:
+            print(f"Error loading colormap {path}: {e}")
+            continue
+        if name in names:
+            print(f"Ignoring colormap {path}: name {name} is already used")
+            continue
+        names.add(name)
+        colormaps.append((name, lut))
+    return colormaps
+
+
+def lut_hash(lut):
+    """Content hash of a colormap table (of the grayscale map for None)."""
+    data = b'gray' if lut is None else np.ascontiguousarray(lut).tobytes()
+    return hashlib.sha1(data).hexdigest()[:16]
+
+
+def preview_path(lut):
+    """Path of the picker preview of a colormap, rendered on first use.
+
+    Previews are cached by content hash, so editing a custom map renders a
+    new one and unchanged maps are never rendered again.
+    """
+    path = get_cache_dir() / 'previews' / f"{lut_hash(lut)}.png"
+    if path.exists():
+        return path
+    try:
+        source = cv2.imread(str(PREVIEW_SOURCE), cv2.IMREAD_GRAYSCALE)
+        if source is None:
+            return None
+        preview = cv2.cvtColor(source, cv2.COLOR_GRAY2BGR) if lut is None else cv2.applyColorMap(source, lut)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write under a temporary name so a partial file is never picked up
+        partial = path.with_suffix('.tmp.png')
+        cv2.imwrite(str(partial), preview)
+        partial.replace(path)
+        return path
+    except Exception as e:
+        print(f"Error rendering colormap preview: {e}")
+        return None
@@ -0,0 +1,440 @@
+#!/usr/bin/python3
+"""Local control and readings API: JSON-RPC 2.0 over a Unix domain socket.
+
+The viewer (with HT301_CONTROL_SOCKET set) and the headless mode (with
+--control) serve newline-delimited JSON-RPC requests:
+
+    {"jsonrpc": "2.0", "id": 1, "method": "info"}
+    {"jsonrpc": "2.0", "id": 2, "method": "roi_stats", "params": {"x": 100, "y": 80, "width": 40, "height": 30}}
+    {"jsonrpc": "2.0", "id": 3, "method": "subscribe", "params": {"rate": 5}}
+
+After subscribe the server pushes "readings" notifications at the
+requested rate. A client that cannot keep up gets the latest readings
+whenever it is ready again, with the number of skipped ones in
+"coalesced", so slow clients never queue up data.
+
+The server runs an asyncio loop in a thread of its own. The frame loop only
+hands it the latest frame (publish(), a single assignment) and runs the
+queued control calls (run_pending(), which never waits), so clients never
+block it. Readings and ROI statistics are computed in the server thread.
+
+    python3 -m ht301_thermal_viewer.control_server info
+    python3 -m ht301_thermal_viewer.control_server roi_stats '{"x": 100, "y": 80, "width": 40, "height": 30}'
+    python3 -m ht301_thermal_viewer.control_server --subscribe 2
+"""
+import os
+import json
+import queue
+import socket
+import asyncio
+import argparse
+import threading
+import concurrent.futures
+import cv2
+import numpy as np
+from pathlib import Path
+
+from .footer import TELEMETRY_FIELDS, decode_footer, split_frame
+from .frame_bus import telemetry_vector
+
+# JSON-RPC error codes
+PARSE_ERROR, INVALID_REQUEST, METHOD_NOT_FOUND, INVALID_PARAMS, INTERNAL_ERROR = -32700, -32600, -32601, -32602, -32603
+# No frame yet, or the frame loop did not run a control call in time
+NOT_READY = -32000
+
+MAX_RATE = 30.0
+SEND_BUFFER = 16384
+
+
+def default_socket_path():
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR') or '/tmp'
+    return Path(runtime_dir) / 'ht301-thermal-viewer.sock'
+
+
+def socket_path(value):
+    """Socket path for a --control / HT301_CONTROL_SOCKET value: '1' for the default; empty disables the server."""
+    if not value:
+        return None
+    return default_socket_path() if value == '1' else Path(value)
+
+
+class RPCError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+class ControlServer:
+    """JSON-RPC server over a Unix socket, served from a background thread.
+
+    Built-in methods read the camera state (info, roi_stats, telemetry,
+    capture_status, methods) or run on the frame loop (calibrate). The
+    viewer and the headless mode add their own controls with register().
+    """
+    def __init__(self, path, camera_manager, telemetry=None, call_timeout_s=5.0):
+        self.path = Path(path)
+        self.camera_manager = camera_manager
+        self.telemetry = telemetry
+        self.call_timeout_s = call_timeout_s
+        # name -> (function, runs on the frame loop, description)
+        self.methods = {}
+        # Latest (seq, frame_raw, lut, timestamp), replaced by publish()
+        self._latest = None
+        self._seq = 0
+        self._readings = None
+        self._pending = queue.SimpleQueue()
+        self._loop = None
+        self._stopped = None
+        self._thread = None
+        self.clients = 0
+
+        self.register('info', self.info, description="current readings (°C, raw counts, sensor temperatures)")
+        self.register('roi_stats', self.roi_stats, description="temperature statistics of a sensor rectangle")
+        self.register('telemetry', self.telemetry_history, description="footer telemetry of the last seconds")
+        self.register('capture_status', self.capture_status, description="capture state and reconnection counters")
+        self.register('calibrate', self.calibrate, frame_loop=True, description="trigger the shutter calibration")
+        self.register('methods', self.list_methods, description="available methods")
+
+    def register(self, name, function, frame_loop=False, description=""):
+        """Expose function(**params); frame_loop=True runs it from run_pending()."""
+        self.methods[name] = (function, frame_loop, description)
+
+    def start(self):
+        if self.path.exists():
+            # A stale socket of a previous run, unless someone still answers on it
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(str(self.path))
+                probe.close()
+                print(f"Control socket {self.path} is in use by another process")
+                return False
+            except OSError:
+                self.path.unlink()
+        started = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(started,), name='control-server', daemon=True)
+        self._thread.start()
+        started.wait()
+        return self._loop is not None
+
+    def _run(self, started):
+        try:
+            asyncio.run(self._serve(started))
+        except Exception as e:
+            print(f"Control server stopped: {e}")
+        finally:
+            started.set()
+
+    async def _serve(self, started):
+        self._stopped = asyncio.Event()
+        server = await asyncio.start_unix_server(self._handle_client, path=str(self.path))
+        os.chmod(str(self.path), 0o600)
+        self._loop = asyncio.get_running_loop()
+        print(f"Control server listening on {self.path}")
+        started.set()
+        async with server:
+            await self._stopped.wait()
+
+    def close(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+            self._thread.join(timeout=2.0)
+            self._loop = None
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+        # Fail the calls the frame loop will not run any more
+        self.run_pending(cancel=True)
+
+    # Frame loop side
+
+    def publish(self, frame_raw, lut, timestamp):
+        """Make a frame the current one; the frame must not be modified afterwards."""
+        self._seq += 1
+        self._latest = (self._seq, frame_raw, lut, timestamp)
+
+    def run_pending(self, cancel=False):
+        """Run the control calls queued by clients; call it from the frame loop."""
+        while True:
+            try:
+                function, params, future = self._pending.get_nowait()
+            except queue.Empty:
+                return
+            if not future.set_running_or_notify_cancel():
+                continue
+            if cancel:
+                future.set_exception(RPCError(NOT_READY, "server closed"))
+                continue
+            try:
+                future.set_result(function(**params))
+            except Exception as e:
+                future.set_exception(e)
+
+    # Methods
+
+    def _frame(self):
+        latest = self._latest
+        if latest is None:
+            raise RPCError(NOT_READY, "no frame yet")
+        return latest
+
+    def info(self):
+        seq, frame_raw, lut, timestamp = self._frame()
+        if self._readings is not None and self._readings['seq'] == seq:
+            return self._readings
+        visible, meta = split_frame(frame_raw)
+        fields = decode_footer(meta)
+        vector = telemetry_vector(fields, lut, timestamp, np.empty(len(TELEMETRY_FIELDS)))
+        readings = {name: _number(value) for name, value in zip(TELEMETRY_FIELDS, vector)}
+        camera = self.camera_manager
+        if camera.correct_bad_pixels and camera.bad_pixels is not None and len(camera.bad_pixels):
+            # The footer extremes are computed before the bad pixel correction
+            min_raw, max_raw, min_point, max_point = cv2.minMaxLoc(visible)
+            readings.update(Tmin_raw=int(min_raw), Tmax_raw=int(max_raw),
+                            Tmin_x=min_point[0], Tmin_y=min_point[1], Tmax_x=max_point[0], Tmax_y=max_point[1])
+            if lut is not None:
+                readings.update(Tmin_C=float(lut[int(min_raw)]), Tmax_C=float(lut[int(max_raw)]))
+        readings['seq'] = seq
+        self._readings = readings
+        return readings
+
+    def roi_stats(self, x, y, width, height):
+        seq, frame_raw, lut, timestamp = self._frame()
+        visible = split_frame(frame_raw)[0]
+        x, y, width, height = int(x), int(y), int(width), int(height)
+        if width <= 0 or height <= 0 or x < 0 or y < 0 or x + width > visible.shape[1] or y + height > visible.shape[0]:
+            raise RPCError(INVALID_PARAMS, f"rectangle outside the {visible.shape[1]}x{visible.shape[0]} sensor")
+        if lut is None:
+            raise RPCError(NOT_READY, "no temperature calibration yet")
+        roi = visible[y:y + height, x:x + width]
+        temps = lut[roi]
+        min_raw, max_raw, min_point, max_point = cv2.minMaxLoc(roi)
+        return {
+            'seq': seq, 'timestamp': timestamp,
+            'min_C': float(lut[int(min_raw)]), 'max_C': float(lut[int(max_raw)]),
+            'mean_C': float(temps.mean()), 'std_C': float(temps.std()),
+            'min_point': [x + min_point[0], y + min_point[1]],
+            'max_point': [x + max_point[0], y + max_point[1]],
+            'pixels': int(roi.size),
+        }
+
+    def telemetry_history(self, seconds=10.0):
+        if self.telemetry is None or self.telemetry.count == 0:
+            raise RPCError(NOT_READY, "no telemetry yet")
+        columns = self.telemetry.since(self.telemetry.current('timestamp') - float(seconds))
+        return {name: [_number(v) for v in values] for name, values in columns.items()}
+
+    def capture_status(self):
+        return self.camera_manager.capture_status()
+
+    def calibrate(self):
+        self.camera_manager.calibrate()
+        return True
+
+    def list_methods(self):
+        return {name: description for name, (_, _, description) in sorted(self.methods.items())}
+
+    # Connections
+
+    async def _handle_client(self, reader, writer):
+        self.clients += 1
+        subscription = {'task': None}
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            # A small send buffer makes a slow subscriber show up as pending
+            # writes within a few messages, which are then coalesced
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Longer than the stream limit
+                    await self._send(writer, _error(None, INVALID_REQUEST, "request too long"))
+                    break
+                if not line:
+                    break
+                response = await self._dispatch(line, writer, subscription)
+                if response is not None:
+                    await self._send(writer, response)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.clients -= 1
+            if subscription['task'] is not None:
+                subscription['task'].cancel()
+            writer.close()
+
+    async def _send(self, writer, message):
+        writer.write(json.dumps(message).encode() + b'\n')
+        await writer.drain()
+
+    async def _dispatch(self, line, writer, subscription):
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return _error(None, PARSE_ERROR, "invalid JSON")
+        if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+            return _error(None, INVALID_REQUEST, "not a JSON-RPC request")
+        request_id = request.get('id')
+        method = request['method']
+        params = request.get('params') or {}
+        if not isinstance(params, dict):
+            return _error(request_id, INVALID_PARAMS, "params must be an object")
+        try:
+            if method == 'subscribe':
+                result = self._subscribe(writer, subscription, **params)
+            elif method == 'unsubscribe':
+                result = self._unsubscribe(subscription)
+            elif method in self.methods:
+                result = await self._call(method, params)
+            else:
+                raise RPCError(METHOD_NOT_FOUND, f"unknown method '{method}'")
+        except RPCError as e:
+            return _error(request_id, e.code, str(e))
+        except TypeError as e:
+            return _error(request_id, INVALID_PARAMS, str(e))
+        except Exception as e:
+            return _error(request_id, INTERNAL_ERROR, str(e))
+        if request_id is None:
+            # A notification: no response
+            return None
+        return {'jsonrpc': '2.0', 'id': request_id, 'result': result}
+
+    async def _call(self, method, params):
+        function, frame_loop, _ = self.methods[method]
+        if not frame_loop:
+            return function(**params)
+        future = concurrent.futures.Future()
+        self._pending.put((function, params, future))
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.call_timeout_s)
+        except asyncio.TimeoutError:
+            future.cancel()
+            raise RPCError(NOT_READY, "the frame loop is not running")
+
+    def _subscribe(self, writer, subscription, rate=1.0, roi=None):
+        rate = min(max(float(rate), 0.1), MAX_RATE)
+        if roi is not None and len(roi) != 4:
+            raise RPCError(INVALID_PARAMS, "roi is [x, y, width, height]")
+        self._unsubscribe(subscription)
+        subscription['task'] = asyncio.ensure_future(self._push_readings(writer, rate, roi))
+        return {'rate': rate}
+
+    def _unsubscribe(self, subscription):
+        if subscription['task'] is not None:
+            subscription['task'].cancel()
+            subscription['task'] = None
+        return True
+
+    async def _push_readings(self, writer, rate, roi):
+        loop = asyncio.get_running_loop()
+        interval = 1.0 / rate
+        next_time = loop.time()
+        last_seq = None
+        coalesced = 0
+        while True:
+            next_time += interval
+            await asyncio.sleep(max(next_time - loop.time(), 0.0))
+            latest = self._latest
+            if latest is None or latest[0] == last_seq:
+                continue
+            if writer.transport.get_write_buffer_size() > 0:
+                # The client is behind: skip this one, it gets the newest later
+                coalesced += 1
+                continue
+            try:
+                params = {'readings': self.info(), 'coalesced': coalesced}
+                if roi is not None:
+                    params['roi'] = self.roi_stats(*roi)
+            except RPCError:
+                continue
+            last_seq = latest[0]
+            coalesced = 0
+            writer.write(json.dumps({'jsonrpc': '2.0', 'method': 'readings', 'params': params}).encode() + b'\n')
+            if next_time < loop.time() - interval:
+                # Fell behind (suspended, slow machine): don't burst to catch up
+                next_time = loop.time()
+
+
+def _number(value):
+    """JSON number, None for NaN."""
+    value = float(value)
+    return None if np.isnan(value) else value
+
+
+def _error(request_id, code, message):
+    return {'jsonrpc': '2.0', 'id': request_id, 'error': {'code': code, 'message': message}}
+
+
+class ControlClient:
+    """Minimal blocking client of the control server."""
+    def __init__(self, path=None, timeout=10.0):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(str(path or default_socket_path()))
+        self.file = self.sock.makefile('rb')
+        self.next_id = 1
+        # Notifications received while waiting for a response
+        self.notifications = []
+
+    def call(self, method, **params):
+        request_id = self.next_id
+        self.next_id += 1
+        self.sock.sendall(json.dumps({'jsonrpc': '2.0', 'id': request_id, 'method': method,
+                                      'params': params}).encode() + b'\n')
+        while True:
+            message = self.receive()
+            if message.get('id') != request_id:
+                self.notifications.append(message)
+                continue
+            if 'error' in message:
+                raise RPCError(message['error']['code'], message['error']['message'])
+            return message['result']
+
+    def receive(self):
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("control server closed the connection")
+        return json.loads(line)
+
+    def next_notification(self):
+        if self.notifications:
+            return self.notifications.pop(0)
+        return self.receive()
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Call the HT301 control server.")
+    parser.add_argument('method', nargs='?', default='info', help="method to call (default: info)")
+    parser.add_argument('params', nargs='?', default='{}', help="parameters as a JSON object")
+    parser.add_argument('--socket', help=f"server socket (default: {default_socket_path()})")
+    parser.add_argument('--subscribe', type=float, metavar='RATE', help="print readings pushed at RATE per second")
+    args = parser.parse_args(argv)
+
+    client = ControlClient(args.socket)
+    try:
+        if args.subscribe:
+            client.call('subscribe', rate=args.subscribe)
+            while True:
+                params = client.next_notification()['params']
+                r = params['readings']
+                print(f"{r['seq']}: Tmin {r['Tmin_C']:.2f}C Tmax {r['Tmax_C']:.2f}C "
+                      f"Tcenter {r['Tcenter_C']:.2f}C ({params['coalesced']} coalesced)")
+        print(json.dumps(client.call(args.method, **json.loads(args.params)), indent=2))
+    except RPCError as e:
+        print(f"Error {e.code}: {e}")
+        return 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.close()
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
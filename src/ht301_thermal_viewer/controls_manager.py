@@ -1,8 +1,12 @@
 import os
 import gi
-from gi.repository import Gtk, Gdk, GLib
+from gi.repository import Gtk, Gdk, GLib, Gio
 from pathlib import Path
 
+from .isotherm import IsothermBand, load_isotherms
+from .colormaps import preview_path
+from .utils import get_videos_dir
+
 class ControlsManager:
     def __init__(self, window, image_processor, camera_manager, recorder):
         self.window = window
@@ -13,6 +17,9 @@ class ControlsManager:
         # Get the installation directory for resources
         self.install_dir = Path(__file__).parent.parent
         
+        # Extra isotherm bands from isotherms.json, shown with the setpoint band
+        self.configured_isotherms = load_isotherms()
+        
         # Create controls containers
         self.controls = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL)
         self.controls.set_halign(Gtk.Align.CENTER)
@@ -63,6 +70,16 @@ class ControlsManager:
         quit_button.connect("clicked", self._on_quit_clicked)
         quit_button.set_tooltip_text("Quit Application")
         self.top_left_controls.append(quit_button)
+        
+        # Open a raw recording for playback / go back to the camera
+        self.playback_button = Gtk.Button()
+        self.playback_button.set_icon_name("document-open-symbolic")
+        self.playback_button.add_css_class("circular")
+        self.playback_button.add_css_class("flat")
+        self.playback_button.add_css_class("playback-button")
+        self.playback_button.connect("clicked", self._on_playback_clicked)
+        self.playback_button.set_tooltip_text("Play Raw Recording")
+        self.top_left_controls.append(self.playback_button)
 
         # Temperature toggle button
         temp_toggle = Gtk.ToggleButton()
@@ -75,6 +92,26 @@ class ControlsManager:
         temp_toggle.set_tooltip_text("Toggle Temperature Display")
         self.top_right_controls.append(temp_toggle)
         
+        # Histogram panel toggle button
+        histogram_toggle = Gtk.ToggleButton()
+        histogram_toggle.set_icon_name("utilities-system-monitor-symbolic")
+        histogram_toggle.add_css_class("circular")
+        histogram_toggle.add_css_class("flat")
+        histogram_toggle.add_css_class("histogram-toggle-button")
+        histogram_toggle.connect("toggled", self._on_histogram_toggle)
+        histogram_toggle.set_tooltip_text("Toggle Histogram")
+        self.top_right_controls.append(histogram_toggle)
+        
+        # Line profile tool toggle button
+        line_profile_toggle = Gtk.ToggleButton()
+        line_profile_toggle.set_icon_name("document-edit-symbolic")
+        line_profile_toggle.add_css_class("circular")
+        line_profile_toggle.add_css_class("flat")
+        line_profile_toggle.add_css_class("line-profile-toggle-button")
+        line_profile_toggle.connect("toggled", self._on_line_profile_toggle)
+        line_profile_toggle.set_tooltip_text("Toggle Line Profile")
+        self.top_right_controls.append(line_profile_toggle)
+        
         # Colormap button
         colormap_button = self._create_colormap_button()
         self.top_right_controls.append(colormap_button)
@@ -120,6 +157,10 @@ class ControlsManager:
         
         self.controls.append(self.raw_record_button)
         
+        # Pre-trigger buffer menu
+        buffer_button = self._create_buffer_button()
+        self.controls.append(buffer_button)
+        
         # Calibrate button
         calibrate_button = Gtk.Button()
         calibrate_button.set_icon_name("view-refresh-symbolic")
@@ -130,6 +171,46 @@ class ControlsManager:
         calibrate_button.set_tooltip_text("Calibrate")
         self.controls.append(calibrate_button)
         
+    def _create_buffer_button(self):
+        button = Gtk.MenuButton()
+        button.set_icon_name("document-save-symbolic")
+        button.add_css_class("circular")
+        button.add_css_class("flat")
+        button.add_css_class("buffer-button")
+        button.set_tooltip_text("Last Seconds")
+        
+        popover = Gtk.Popover()
+        popover.set_position(Gtk.PositionType.TOP)
+        
+        box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=4)
+        box.set_margin_start(4)
+        box.set_margin_end(4)
+        box.set_margin_top(4)
+        box.set_margin_bottom(4)
+        
+        save_raw_btn = Gtk.Button(label="Save Last Seconds")
+        save_raw_btn.add_css_class("flat")
+        save_raw_btn.set_tooltip_text("Save the buffered raw frames as a raw recording")
+        save_raw_btn.connect("clicked", self._on_save_buffer_clicked)
+        box.append(save_raw_btn)
+        
+        save_video_btn = Gtk.Button(label="Save Last Seconds as Video")
+        save_video_btn.add_css_class("flat")
+        save_video_btn.set_tooltip_text("Render the buffered frames to an MP4 with the current view settings")
+        save_video_btn.connect("clicked", self._on_save_buffer_video_clicked)
+        box.append(save_video_btn)
+        
+        preroll_toggle = Gtk.ToggleButton(label="Prepend to Raw Recordings")
+        preroll_toggle.add_css_class("flat")
+        preroll_toggle.set_tooltip_text("Start each raw recording with the buffered last seconds")
+        preroll_toggle.set_active(self.window.pretrigger_preroll)
+        preroll_toggle.connect("toggled", self._on_preroll_toggled)
+        box.append(preroll_toggle)
+        
+        popover.set_child(box)
+        button.set_popover(popover)
+        return button
+        
     def _create_colormap_button(self):
         button = Gtk.MenuButton()
         button.set_icon_name("color-select-symbolic")
@@ -170,9 +251,9 @@ class ControlsManager:
         overlay.set_hexpand(True)
         overlay.set_vexpand(True)
         
-        # Use absolute path for colormap images
-        icon_path = self.install_dir / "ht301_thermal_viewer" / "cmaps" / f"{name}.png"
-        if icon_path.exists():
+        # Preview rendered from the colormap table, cached on disk
+        icon_path = preview_path(self.image_processor.colormaps[idx][1])
+        if icon_path is not None:
             picture = Gtk.Picture.new_for_filename(str(icon_path))
             picture.set_can_shrink(True)
             picture.set_keep_aspect_ratio(False)
@@ -240,6 +321,55 @@ class ControlsManager:
         rotate_ccw_btn.connect("clicked", self._on_rotate_counterclockwise)
         box.append(rotate_ccw_btn)
         
+        denoise_btn = Gtk.Button(label=self._denoise_label())
+        denoise_btn.add_css_class("flat")
+        denoise_btn.connect("clicked", self._on_denoise_toggled)
+        box.append(denoise_btn)
+        
+        agc_btn = Gtk.Button(label=self._agc_label())
+        agc_btn.add_css_class("flat")
+        agc_btn.connect("clicked", self._on_agc_toggled)
+        box.append(agc_btn)
+        
+        zoom_contrast_btn = Gtk.Button(label=self._zoom_contrast_label())
+        zoom_contrast_btn.add_css_class("flat")
+        zoom_contrast_btn.connect("clicked", self._on_zoom_contrast_toggled)
+        box.append(zoom_contrast_btn)
+        
+        reset_zoom_btn = Gtk.Button(label="Reset Zoom")
+        reset_zoom_btn.add_css_class("flat")
+        reset_zoom_btn.connect("clicked", self._on_reset_zoom_clicked)
+        box.append(reset_zoom_btn)
+        
+        telemetry_toggle = Gtk.ToggleButton(label="Sensor Telemetry")
+        telemetry_toggle.add_css_class("flat")
+        telemetry_toggle.connect("toggled", self._on_telemetry_toggled)
+        box.append(telemetry_toggle)
+        
+        hotspots_toggle = Gtk.ToggleButton(label="Hotspots")
+        hotspots_toggle.add_css_class("flat")
+        hotspots_toggle.set_tooltip_text("Mark and track the hottest local maxima")
+        hotspots_toggle.connect("toggled", self._on_hotspots_toggled)
+        box.append(hotspots_toggle)
+        
+        auto_calibration_btn = Gtk.Button(label=self._auto_calibration_label())
+        auto_calibration_btn.add_css_class("flat")
+        auto_calibration_btn.connect("clicked", self._on_auto_calibration_toggled)
+        box.append(auto_calibration_btn)
+        
+        # Isotherm: highlight everything above the setpoint
+        isotherm_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=4)
+        self.isotherm_toggle = Gtk.ToggleButton(label="Isotherm above")
+        self.isotherm_toggle.add_css_class("flat")
+        self.isotherm_toggle.connect("toggled", self._on_isotherm_changed)
+        isotherm_box.append(self.isotherm_toggle)
+        self.isotherm_spin = Gtk.SpinButton.new_with_range(-40, 550, 1)
+        self.isotherm_spin.set_value(50)
+        self.isotherm_spin.set_tooltip_text("Isotherm setpoint (°C)")
+        self.isotherm_spin.connect("value-changed", self._on_isotherm_changed)
+        isotherm_box.append(self.isotherm_spin)
+        box.append(isotherm_box)
+        
         popover.set_child(box)
         button.set_popover(popover)
         button.set_tooltip_text("Image Transformations")
@@ -249,6 +379,12 @@ class ControlsManager:
     def _on_temp_toggle(self, button):
         self.image_processor.draw_temp = button.get_active()
         
+    def _on_histogram_toggle(self, button):
+        self.window.histogram_panel.show_panel(button.get_active())
+        
+    def _on_line_profile_toggle(self, button):
+        self.window.line_profile_panel.show_panel(button.get_active())
+        
     def _on_colormap_selected(self, button, idx):
         grid = button.get_parent()
         for child in grid:
@@ -282,7 +418,8 @@ class ControlsManager:
             
     def _on_raw_record_toggled(self, button):
         if button.get_active():
-            if self.recorder.start_raw_recording(self.window.camera_manager.cap.frame_raw):
+            pretrigger = self.window.pretrigger_buffer if self.window.pretrigger_preroll else None
+            if self.recorder.start_raw_recording(self.window.camera_manager.frame_raw, pretrigger):
                 # Remove the label and set the stop icon
                 button.set_child(None)
                 button.set_icon_name("media-playback-stop-symbolic")
@@ -296,6 +433,19 @@ class ControlsManager:
             button.set_tooltip_text("Start Raw Recording")
             button.remove_css_class("recording")
             
+    def _on_save_buffer_clicked(self, button):
+        self.window.save_pretrigger_buffer()
+        if button.get_ancestor(Gtk.Popover):
+            button.get_ancestor(Gtk.Popover).set_visible(False)
+            
+    def _on_save_buffer_video_clicked(self, button):
+        self.window.save_pretrigger_buffer(as_video=True)
+        if button.get_ancestor(Gtk.Popover):
+            button.get_ancestor(Gtk.Popover).set_visible(False)
+            
+    def _on_preroll_toggled(self, button):
+        self.window.pretrigger_preroll = button.get_active()
+        
     def _on_calibrate_clicked(self, button):
         self.camera_manager.calibrate()
         
@@ -319,5 +469,96 @@ class ControlsManager:
         if button.get_ancestor(Gtk.Popover):
             button.get_ancestor(Gtk.Popover).set_visible(False)
 
+    def _denoise_label(self):
+        return "Denoise: On" if self.image_processor.denoise else "Denoise: Off"
+        
+    def _on_denoise_toggled(self, button):
+        self.image_processor.denoise = not self.image_processor.denoise
+        button.set_label(self._denoise_label())
+        if button.get_ancestor(Gtk.Popover):
+            button.get_ancestor(Gtk.Popover).set_visible(False)
+            
+    def _agc_label(self):
+        return "AGC: Histogram" if self.image_processor.agc == 'histogram' else "AGC: Min/Max"
+        
+    def _on_agc_toggled(self, button):
+        self.image_processor.agc = 'minmax' if self.image_processor.agc == 'histogram' else 'histogram'
+        button.set_label(self._agc_label())
+        if button.get_ancestor(Gtk.Popover):
+            button.get_ancestor(Gtk.Popover).set_visible(False)
+            
+    def _zoom_contrast_label(self):
+        return "Zoom Contrast: Region" if self.image_processor.zoom_contrast else "Zoom Contrast: Full Frame"
+        
+    def _on_zoom_contrast_toggled(self, button):
+        self.image_processor.zoom_contrast = not self.image_processor.zoom_contrast
+        button.set_label(self._zoom_contrast_label())
+        
+    def _on_reset_zoom_clicked(self, button):
+        self.image_processor.reset_zoom()
+        if button.get_ancestor(Gtk.Popover):
+            button.get_ancestor(Gtk.Popover).set_visible(False)
+        
+    def _on_telemetry_toggled(self, button):
+        self.window.telemetry_panel.show_panel(button.get_active())
+        
+    def _on_hotspots_toggled(self, button):
+        detector = self.window.hotspot_detector
+        detector.enabled = button.get_active()
+        if not detector.enabled:
+            detector.tracker.reset()
+        # Redraw even if the scene is still
+        self.window.change_detector.reset()
+        
+    def _auto_calibration_label(self):
+        return "Auto Calibration: On" if self.window.shutter_scheduler.enabled else "Auto Calibration: Off"
+        
+    def _on_auto_calibration_toggled(self, button):
+        scheduler = self.window.shutter_scheduler
+        scheduler.enabled = not scheduler.enabled
+        button.set_label(self._auto_calibration_label())
+        if button.get_ancestor(Gtk.Popover):
+            button.get_ancestor(Gtk.Popover).set_visible(False)
+            
+    def _on_isotherm_changed(self, widget):
+        if self.isotherm_toggle.get_active():
+            setpoint = IsothermBand(low=self.isotherm_spin.get_value(), color=(255, 0, 255), alpha=0.6)
+            self.image_processor.isotherms = [setpoint] + self.configured_isotherms
+        else:
+            self.image_processor.isotherms = []
+            
+    def _on_playback_clicked(self, button):
+        if self.window.playback_path is not None:
+            self.window.close_recording()
+            self.update_playback_button()
+            return
+        dialog = Gtk.FileDialog()
+        dialog.set_title("Play Raw Recording")
+        dialog.set_initial_folder(Gio.File.new_for_path(str(get_videos_dir())))
+        raw_filter = Gtk.FileFilter()
+        raw_filter.set_name("Raw recordings")
+        raw_filter.add_pattern("*.raw")
+        filters = Gio.ListStore.new(Gtk.FileFilter)
+        filters.append(raw_filter)
+        dialog.set_filters(filters)
+        dialog.open(self.window, None, self._on_recording_chosen)
+        
+    def _on_recording_chosen(self, dialog, result):
+        try:
+            file = dialog.open_finish(result)
+        except GLib.Error:
+            # Dialog dismissed
+            return
+        self.window.open_recording(file.get_path())
+        self.update_playback_button()
+        
+    def update_playback_button(self):
+        if self.window.playback_path is not None:
+            self.playback_button.set_icon_name("camera-web-symbolic")
+            self.playback_button.set_tooltip_text("Back to Camera")
+        else:
+            self.playback_button.set_icon_name("document-open-symbolic")
+            self.playback_button.set_tooltip_text("Play Raw Recording")
+            
     def _on_quit_clicked(self, button):
         self.window.close() 
\ No newline at end of file
@@ -0,0 +1,215 @@
+import cv2
+import time
+import multiprocessing
+import numpy as np
+from multiprocessing import shared_memory
+
+from .recorder import FrameRateConformer, write_timestamps
+
+# Control words at the start of the shared block (int64 each)
+_WRITE_COUNT, _READ_COUNT, _CLOSED = 0, 1, 2
+_HEADER_WORDS = 8
+
+
+class SharedFrameRing:
+    """Single-producer/single-consumer ring of fixed-size frames in shared memory.
+
+    The producer copies a frame into slot `write_count % slots` and only then
+    increments `write_count`; the consumer encodes every slot below
+    `write_count` and then advances `read_count`. Each counter has a single
+    writer and aligned 8-byte stores are atomic on the platforms we run on, so
+    the handoff needs no lock and frames are never pickled.
+    """
+    def __init__(self, shape, slots=64, dtype=np.uint8, name=None):
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.dtype = np.dtype(dtype)
+        frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        size = _HEADER_WORDS * 8 + slots * 8 + slots * frame_bytes
+
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.owner = True
+        else:
+            # Spawned children share the parent's resource tracker, so
+            # attaching here does not make the block go away when we exit
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+
+        buf = self.shm.buf
+        self.control = np.ndarray((_HEADER_WORDS,), dtype=np.int64, buffer=buf)
+        self.timestamps = np.ndarray((slots,), dtype=np.float64, buffer=buf, offset=_HEADER_WORDS * 8)
+        self.frames = np.ndarray((slots,) + self.shape, dtype=self.dtype, buffer=buf,
+                                 offset=_HEADER_WORDS * 8 + slots * 8)
+        if self.owner:
+            self.control[:] = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def backlog(self):
+        """Number of frames written but not yet consumed."""
+        return int(self.control[_WRITE_COUNT] - self.control[_READ_COUNT])
+
+    def push(self, frame, timestamp):
+        """Copy a frame into the next free slot; False if the ring is full."""
+        write = int(self.control[_WRITE_COUNT])
+        if write - int(self.control[_READ_COUNT]) >= self.slots:
+            return False
+        slot = write % self.slots
+        np.copyto(self.frames[slot], frame)
+        self.timestamps[slot] = timestamp
+        self.control[_WRITE_COUNT] = write + 1
+        return True
+
+    def oldest_timestamp(self):
+        """Capture time of the oldest frame still waiting in the ring."""
+        return float(self.timestamps[int(self.control[_READ_COUNT]) % self.slots])
+
+    def close(self):
+        """Detach from the block, removing it if this side created it."""
+        self.control = self.timestamps = self.frames = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _encoder_main(ring_name, shape, slots, video_path, fps, constant_rate, timestamps_path, results):
+    """Child process: encode frames from the ring until the producer closes it."""
+    ring = SharedFrameRing(shape, slots, name=ring_name)
+    height, width = shape[:2]
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'avc1'), fps, (width, height))
+    conformer = FrameRateConformer(fps)
+    timestamps = []
+    previous = None
+    frame = None
+    max_lag = 0.0
+
+    try:
+        while True:
+            read = int(ring.control[_READ_COUNT])
+            write = int(ring.control[_WRITE_COUNT])
+            if read == write:
+                # Re-check after seeing the flag: the last push may have raced it
+                if ring.control[_CLOSED] and int(ring.control[_WRITE_COUNT]) == read:
+                    break
+                time.sleep(0.002)
+                continue
+
+            for idx in range(read, write):
+                slot = idx % slots
+                frame = ring.frames[slot]
+                timestamp = float(ring.timestamps[slot])
+                max_lag = max(max_lag, time.monotonic() - timestamp)
+                if constant_rate:
+                    repeats, keep = conformer.place(timestamp)
+                    for _ in range(repeats):
+                        writer.write(previous)
+                    if keep:
+                        writer.write(frame)
+                        # The slot is recycled once released, keep our own copy
+                        if previous is None:
+                            previous = frame.copy()
+                        else:
+                            np.copyto(previous, frame)
+                else:
+                    conformer.observe(timestamp)
+                    conformer.written += 1
+                    writer.write(frame)
+                    timestamps.append(timestamp)
+                ring.control[_READ_COUNT] = idx + 1
+    finally:
+        writer.release()
+        if not constant_rate and timestamps_path is not None:
+            write_timestamps(timestamps_path, timestamps)
+        results.put({
+            'received': conformer.received,
+            'written': conformer.written,
+            'duplicated': conformer.duplicated,
+            'dropped': conformer.dropped,
+            'measured_fps': conformer.measured_fps(),
+            'duration_s': (conformer.last_timestamp or 0) - (conformer.first_timestamp or 0),
+            'max_lag_s': max_lag,
+        })
+        frame = None
+        ring.close()
+
+
+class VideoEncoderProcess:
+    """H.264 encoder running in a child process, fed through a SharedFrameRing.
+
+    Same interface as VideoEncoderThread, but the encoding runs on another core
+    without holding the GIL of the UI process.
+    """
+    def __init__(self, video_path, frame_shape, fps, constant_rate=True, timestamps_path=None, slots=64):
+        self.fps = fps
+        self.constant_rate = constant_rate
+        self.ring = SharedFrameRing(frame_shape, slots)
+        try:
+            # spawn rather than fork: forking a process that runs GTK is unsafe
+            ctx = multiprocessing.get_context('spawn')
+            self.results = ctx.Queue()
+            self.process = ctx.Process(
+                target=_encoder_main,
+                args=(self.ring.name, self.ring.shape, slots, str(video_path), fps, constant_rate,
+                      None if timestamps_path is None else str(timestamps_path), self.results),
+                daemon=True,
+            )
+        except Exception:
+            # Do not leave the block behind in /dev/shm
+            self.ring.close()
+            raise
+        self.queue_dropped = 0
+        self.max_backlog = 0
+        self.result = None
+
+    def start(self):
+        self.process.start()
+
+    def submit(self, frame, timestamp):
+        """Copy the frame into shared memory; drop it if the encoder is too far behind."""
+        if not self.process.is_alive():
+            self.queue_dropped += 1
+            return False
+        if not self.ring.push(frame, timestamp):
+            self.queue_dropped += 1
+            return False
+        self.max_backlog = max(self.max_backlog, self.ring.backlog())
+        return True
+
+    def lag(self):
+        """Return (frames, seconds) the encoder is behind the producer."""
+        backlog = self.ring.backlog()
+        if backlog == 0:
+            return 0, 0.0
+        return backlog, max(0.0, time.monotonic() - self.ring.oldest_timestamp())
+
+    def finish(self, timeout=60.0):
+        """Let the child drain the ring, then wait for it to exit."""
+        self.ring.control[_CLOSED] = 1
+        try:
+            self.result = self.results.get(timeout=timeout if self.process.is_alive() else 1.0)
+        except Exception as e:
+            print(f"Encoder process did not report back: {e}")
+        self.process.join(timeout=5.0)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.ring.close()
+
+    def report(self):
+        """Summarize what happened to the submitted frames."""
+        r = self.result or {}
+        return {
+            'mode': 'constant' if self.constant_rate else 'variable',
+            'output_fps': self.fps,
+            'measured_fps': round(r.get('measured_fps', 0.0), 3),
+            'duration_s': round(r.get('duration_s', 0.0), 3),
+            'frames_received': r.get('received', 0) + self.queue_dropped,
+            'frames_written': r.get('written', 0),
+            'frames_duplicated': r.get('duplicated', 0),
+            'frames_dropped_late': r.get('dropped', 0),
+            'frames_dropped_backlog': self.queue_dropped,
+            'max_encoder_backlog': self.max_backlog,
+            'max_encoder_lag_s': round(r.get('max_lag_s', 0.0), 3),
+        }
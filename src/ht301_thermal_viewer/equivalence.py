@@ -0,0 +1,433 @@
+#!/usr/bin/python3
+"""Numerical equivalence of the optimized paths with reference oracles.
+
+The reference_* functions below are frozen copies of the plain
+implementations the viewer started from: the temperature LUT of
+temperatureLut/sub_10001180 (without the module globals), device_info,
+the float normalization of CameraManager.read_frame and the
+applyColorMap/flip/rotate chain of ImageProcessor.process_frame. Nothing
+in the viewer calls them. Whatever is sped up in the paths they guard must
+keep agreeing with them within these tolerances:
+
+    temperature LUT (LutCache, ht301_hacklib.info)   LUT_TOLERANCE_C, same NaNs
+    footer readings (decode_footer, TelemetryLog)    READING_TOLERANCE_C
+    device strings (device_info)                     equal
+    normalization (NormalizeStage)                   NORMALIZE_LSB; it rounds where the reference truncates
+    rendered BGR (ImageProcessor.process_frame)      per channel, the colormap's largest step
+                                                     between neighbouring entries (the effect of 1 LSB)
+
+Inputs are synthetic frames with realistic footers, the cmaps/frame.npy
+fixture with a footer added, and seeded random sweeps of the calibration
+and user parameters that include the edge cases: emissivity and the first
+calibration coefficient near 0 (the arange fallback), distance on both
+sides of the 20 m clamp, dry and saturated air, and sensor temperatures
+far enough from 20°C for the raw offset to overflow. When the reference
+raises, the optimized path must raise the same exception.
+
+Markers are not compared: since the digital zoom they are mapped to pixel
+centres (see ImageProcessor.to_display), one pixel away from the
+reference's position in flipped views.
+
+    python3 -m ht301_thermal_viewer.equivalence
+    python3 -m ht301_thermal_viewer.equivalence --sweeps 1000 --seed 7
+"""
+import math
+import argparse
+import cv2
+import numpy as np
+from pathlib import Path
+
+from .colormaps import BUILTIN_COLORMAPS, builtin_lut
+from .footer import FOOTER_ROWS, LutCache, decode_footer, lut_key, split_frame
+from .ht301_hacklib import ABSOLUTE_ZERO_CELSIUS, device_info, info
+from .image_processor import ImageProcessor
+from .telemetry import TelemetryLog
+
+LUT_TOLERANCE_C = 1e-6
+READING_TOLERANCE_C = 1e-4
+NORMALIZE_LSB = 1
+
+FIXTURE = Path(__file__).parent / 'cmaps' / 'frame.npy'
+
+# Calibration floats (row 3 bytes 6..26), sensor words and user parameters
+# in the range of a real camera
+CALIBRATION = (1e-3, 1.0, 1e-5, 1e-4, 0.036)
+DEFAULT_PARAMETERS = {
+    'tfpa_raw': 7800, 'coretmp_raw': 3000, 'cx': 8249, 'calib': CALIBRATION,
+    'fix': 0.0, 'refltmp': 25.0, 'airtmp': 24.0, 'humidity': 0.45, 'emissivity': 0.95, 'distance': 1,
+}
+DEVICE_STRINGS = ('HT-301', 'V1.1.3', '2020-09-18', 'T3-317-13', '0A1B2C3D', 'HTIR')
+
+
+# Reference oracles: keep these as they are
+
+def _f32(m3, idx):
+    return float(m3[idx:idx + 4].view(np.float32)[0])
+
+
+def _u16(m3, idx):
+    return int(m3[idx:idx + 4].view(np.uint16)[0])
+
+
+def reference_temperature_lut(meta):
+    """temperatureLut(fpatmp, meta[3]) of the original ht301_hacklib, operation for operation."""
+    meta3 = np.ascontiguousarray(meta[3])
+    fpatmp = 20.0 - (float(meta[0][1]) - 7800.0) / 36.0
+    m3 = meta3.view(np.uint8)
+    cx = meta3[0]
+    coretmp = float(meta3[1]) / 10.0 + ABSOLUTE_ZERO_CELSIUS
+    c60, c5c, c9c, c98, c94 = (_f32(m3, i) for i in (6, 10, 14, 18, 22))
+    refltmp, airtmp, humidity, emissivity = (_f32(m3, 254 + i) for i in (4, 8, 12, 16))
+    distance = _u16(m3, 274)
+    if abs(emissivity) < 0.0001 or abs(c60) < 0.0001:
+        return np.arange(16384.0)
+
+    w = math.exp(0.00000068455 * airtmp ** 3 + -0.00027816 * airtmp ** 2
+                 + 0.06938999999999999 * airtmp + 1.5587) * humidity
+    d_ = -distance ** 0.5
+    w_ = w ** 0.5
+    t = 1.9 * math.exp(d_ * (0.0066 + -0.0023 * w_)) + (1. - 1.9) * math.exp(d_ * (0.0126 + -0.0067 * w_))
+    part_emi_t_1 = 1.0 / (emissivity * t)
+    part_Tatm_Trefl = ((1.0 - emissivity) * t * (refltmp - ABSOLUTE_ZERO_CELSIUS) ** 4
+                       + (1.0 - t) * (airtmp - ABSOLUTE_ZERO_CELSIUS) ** 4)
+
+    l_flt_1000337C = c5c / (2.0 * c60)
+    l_flt_1000337C_2 = l_flt_1000337C ** 2
+    v23 = c60 * coretmp ** 2 + c5c * coretmp
+    v22 = c9c * fpatmp ** 2 + c98 * fpatmp + c94
+    v2 = int(390.0 - fpatmp * 7.05)
+    v4 = cx - v2
+    if distance >= 20:
+        distance_c = (20 * 0.85 - 1.125) / 100.
+    else:
+        distance_c = (distance * 0.85 - 1.125) / 100.
+
+    np_v5 = np.arange(16384.0) - v4
+    np_v8 = (np_v5 * v22 + v23) / c60 + l_flt_1000337C_2
+    np_v8 = np.maximum(np_v8, 0)
+    np_Ttot = np_v8 ** 0.5 - l_flt_1000337C - ABSOLUTE_ZERO_CELSIUS
+    np_Tobj_C = ((np_Ttot ** 4 - part_Tatm_Trefl) * part_emi_t_1) ** 0.25 + ABSOLUTE_ZERO_CELSIUS
+    return np_Tobj_C + distance_c * (np_Tobj_C - airtmp)
+
+
+def reference_device_info(meta):
+    """The six NUL terminated strings from byte 48 of footer row 3."""
+    chars = list(np.ascontiguousarray(meta[3]).view(np.uint8))
+    idx, strings = 48, []
+    for _ in range(6):
+        try:
+            end = chars.index(0, idx)
+        except ValueError:
+            end = idx
+        strings.append(''.join(chr(c) for c in chars[idx:end]))
+        idx = end + 1
+    return strings
+
+
+def reference_normalize(visible):
+    """The 8-bit stretch of the original CameraManager.read_frame."""
+    frame = visible.astype(np.float32)
+    frame -= frame.min()
+    frame /= frame.max()
+    return (np.clip(frame, 0, 1) * 255).astype(np.uint8)
+
+
+def reference_render(frame, colormap, flip_horizontal=False, flip_vertical=False, rotation=0):
+    """Colormap, flips and rotation of the original ImageProcessor.process_frame."""
+    if colormap is not None:
+        frame = cv2.applyColorMap(frame, colormap)
+    else:
+        frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+    if flip_horizontal:
+        frame = cv2.flip(frame, 1)
+    if flip_vertical:
+        frame = cv2.flip(frame, 0)
+    if rotation == 90:
+        frame = cv2.rotate(frame, cv2.ROTATE_90_CLOCKWISE)
+    elif rotation == 180:
+        frame = cv2.rotate(frame, cv2.ROTATE_180)
+    elif rotation == 270:
+        frame = cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    return frame
+
+
+# Synthetic inputs
+
+def make_footer(visible, tfpa_raw, coretmp_raw, cx, calib, fix, refltmp, airtmp, humidity, emissivity,
+                distance, strings=DEVICE_STRINGS):
+    """A (4, W) footer for a visible raw image, laid out like the camera's."""
+    height, width = visible.shape
+    meta = np.zeros((FOOTER_ROWS, width), dtype=np.uint16)
+    min_y, min_x = np.unravel_index(int(np.argmin(visible)), visible.shape)
+    max_y, max_x = np.unravel_index(int(np.argmax(visible)), visible.shape)
+    row0 = meta[0]
+    row0[0] = int(visible.mean())
+    row0[1] = tfpa_raw
+    row0[2:5] = max_x, max_y, visible[max_y, max_x]
+    row0[5:8] = min_x, min_y, visible[min_y, min_x]
+    row0[8] = row0[0]
+    row0[12] = visible[height // 2, width // 2]
+
+    row3 = meta[3]
+    row3[0], row3[1] = cx, coretmp_raw
+    m3 = row3.view(np.uint8)
+    m3[6:26] = np.array(calib, dtype='<f4').view(np.uint8)
+    text = b''.join(s.encode('latin-1') + b'\0' for s in strings)
+    m3[48:48 + len(text)] = np.frombuffer(text, dtype=np.uint8)
+    m3[254:274] = np.array([fix, refltmp, airtmp, humidity, emissivity], dtype='<f4').view(np.uint8)
+    row3[137] = distance
+    return meta
+
+
+def synthetic_frame(rng, height=288, width=384, **parameters):
+    """A raw frame (visible image and footer): a gradient, two warm objects and sensor noise."""
+    parameters = dict(DEFAULT_PARAMETERS, **parameters)
+    y, x = np.mgrid[0:height, 0:width]
+    scene = parameters['cx'] - 300 + 0.8 * x + 0.5 * y
+    for cx, cy, amplitude in ((0.3 * width, 0.4 * height, 600), (0.7 * width, 0.6 * height, 1200)):
+        scene = scene + amplitude * np.exp(-((x - cx) ** 2 + (y - cy) ** 2) / 300.0)
+    visible = np.clip(scene + rng.normal(0, 6, scene.shape), 0, 16383).astype(np.uint16)
+    return np.vstack([visible, make_footer(visible, **parameters)])
+
+
+def fixture_frame(**parameters):
+    """cmaps/frame.npy with a footer, its raw range centred on the calibration offset."""
+    visible = np.load(str(FIXTURE)).astype(np.uint16)
+    parameters = dict(DEFAULT_PARAMETERS, **parameters)
+    fpatmp = 20.0 - (parameters['tfpa_raw'] - 7800.0) / 36.0
+    parameters['cx'] = int(np.median(visible)) + int(390.0 - fpatmp * 7.05)
+    return np.vstack([visible, make_footer(visible, **parameters)])
+
+
+def random_parameters(rng):
+    """Calibration and user parameters drawn over (and past) their realistic range."""
+    emissivity = rng.choice([rng.uniform(0.05, 1.0), rng.uniform(-2e-4, 2e-4), 0.0, 1.0])
+    return {
+        'tfpa_raw': int(rng.integers(5000, 9500)),
+        'coretmp_raw': int(rng.integers(2600, 3400)),
+        'cx': int(rng.integers(6000, 10000)),
+        'calib': (rng.choice([rng.uniform(5e-4, 2e-3), rng.uniform(-2e-4, 2e-4)]),
+                  rng.uniform(0.5, 1.5), rng.uniform(-2e-5, 2e-5), rng.uniform(-2e-4, 2e-4), rng.uniform(0.02, 0.05)),
+        'fix': 0.0,
+        'refltmp': rng.uniform(-20.0, 60.0),
+        'airtmp': rng.uniform(-20.0, 50.0),
+        'humidity': rng.choice([0.0, 1.0, rng.uniform(0.0, 1.0)]),
+        'emissivity': emissivity,
+        'distance': int(rng.choice([0, 19, 20, 21, int(rng.integers(0, 200))])),
+    }
+
+
+EDGE_CASES = [
+    {'emissivity': 0.0},
+    {'emissivity': 5e-5},
+    {'emissivity': -5e-5},
+    {'emissivity': 1e-4},
+    {'calib': (5e-5,) + CALIBRATION[1:]},
+    {'distance': 0},
+    {'distance': 20},
+    {'distance': 65535},
+    {'humidity': 0.0},
+    {'humidity': 1.0},
+    {'airtmp': -20.0, 'refltmp': -20.0},
+    # Sensor at about 58°C: the raw offset int(390 - 7.05 * fpatmp) goes negative
+    {'tfpa_raw': 6400},
+]
+
+
+# Checks: each returns (worst error, list of failures)
+
+def _outcome(fn, *args):
+    try:
+        with np.errstate(all='ignore'):
+            return fn(*args), None
+    except Exception as e:
+        return None, type(e)
+
+
+def check_lut(meta, cache, shape):
+    """LutCache and the info() readings against the reference LUT."""
+    expected, expected_error = _outcome(reference_temperature_lut, meta)
+    lut, error = _outcome(cache.lookup, meta)
+    if expected_error is not None or error is not None:
+        if expected_error != error:
+            return 0.0, [f"LUT raised {error} where the reference raised {expected_error}"]
+        return 0.0, []
+    failures = []
+    nan = np.isnan(expected)
+    if not np.array_equal(nan, np.isnan(lut)):
+        failures.append(f"LUT NaNs differ at {int(np.sum(nan != np.isnan(lut)))} raw levels")
+    worst = float(np.max(np.abs(lut[~nan] - expected[~nan]), initial=0.0))
+    if worst > LUT_TOLERANCE_C:
+        failures.append(f"LUT off by {worst:.3g}°C")
+
+    readings, _ = info(meta, reference_device_info(meta), shape[1], shape[0], lut)
+    for name in ('Tmin', 'Tmax', 'Tcenter'):
+        raw = int(readings[name + '_raw'])
+        if raw != int(meta[0][{'Tmin': 7, 'Tmax': 4, 'Tcenter': 12}[name]]):
+            failures.append(f"info {name}_raw is {raw}")
+        error = _difference(readings[name + '_C'], expected[raw])
+        worst = max(worst, error)
+        if error > LUT_TOLERANCE_C:
+            failures.append(f"info {name}_C off by {error:.3g}°C")
+    return worst, failures
+
+
+def check_readings(meta):
+    """decode_footer and the telemetry log against the reference decoding."""
+    lut, error = _outcome(reference_temperature_lut, meta)
+    if error is not None:
+        return 0.0, []
+    fields = decode_footer(meta)
+    expected = {
+        'fpatmp_C': 20.0 - (float(meta[0][1]) - 7800.0) / 36.0,
+        'coretmp_C': float(meta[3][1]) / 10.0 + ABSOLUTE_ZERO_CELSIUS,
+    }
+    m3 = np.ascontiguousarray(meta[3]).view(np.uint8)
+    for name, offset in (('refltmp_C', 4), ('airtmp_C', 8), ('humidity', 12), ('emissivity', 16)):
+        expected[name] = _f32(m3, 254 + offset)
+
+    failures, worst = [], 0.0
+    for name, value in expected.items():
+        error = _difference(fields[name], value)
+        worst = max(worst, error)
+        if error > READING_TOLERANCE_C:
+            failures.append(f"decode_footer {name} off by {error:.3g}")
+
+    log = TelemetryLog(capacity=1)
+    with np.errstate(all='ignore'):
+        log.append(meta, 0.0, lut)
+    expected.update({'Tmin_C': lut[meta[0][7]], 'Tmax_C': lut[meta[0][4]], 'Tcenter_C': lut[meta[0][12]]})
+    for name, value in expected.items():
+        error = _difference(log.current(name), value)
+        worst = max(worst, error)
+        if error > READING_TOLERANCE_C:
+            failures.append(f"telemetry {name} off by {error:.3g}")
+    return worst, failures
+
+
+def check_device_info(meta):
+    expected, strings = reference_device_info(meta), device_info(meta)
+    return 0.0, [] if strings == expected else [f"device strings {strings} != {expected}"]
+
+
+def check_normalize(visible, processor):
+    """The pipeline's 8-bit stretch (no colormap or transform) against the reference."""
+    with np.errstate(all='ignore'):
+        expected = reference_normalize(visible)
+    processor.current_colormap_idx = 0
+    processor.flip_horizontal = processor.flip_vertical = False
+    processor.rotation = 0
+    result = processor.process_frame(visible)[..., 0]
+    worst = int(np.max(np.abs(result.astype(np.int16) - expected)))
+    return worst, [] if worst <= NORMALIZE_LSB else [f"normalization off by {worst} LSB"]
+
+
+def render_limits(colormap):
+    """Largest difference per BGR channel caused by a 1 LSB change of the 8-bit image."""
+    if colormap is None:
+        return np.full(3, NORMALIZE_LSB)
+    table = builtin_lut(colormap).reshape(256, 3).astype(np.int16)
+    return np.abs(np.diff(table, axis=0)).max(axis=0) * NORMALIZE_LSB
+
+
+def check_render(visible, processor, name, colormap, flip_horizontal, flip_vertical, rotation):
+    """ImageProcessor.process_frame of the raw image against normalize + reference render."""
+    with np.errstate(all='ignore'):
+        expected = reference_render(reference_normalize(visible), colormap, flip_horizontal, flip_vertical, rotation)
+    names = [n for n, _ in processor.colormaps]
+    processor.current_colormap_idx = names.index(name)
+    processor.flip_horizontal, processor.flip_vertical = flip_horizontal, flip_vertical
+    processor.rotation = rotation
+    result = processor.process_frame(visible)
+    if result.shape != expected.shape:
+        return 0, [f"{name} rotation {rotation}: shape {result.shape} != {expected.shape}"]
+    errors = np.abs(result.astype(np.int16) - expected).reshape(-1, 3).max(axis=0)
+    limits = render_limits(colormap)
+    failures = []
+    if np.any(errors > limits):
+        failures.append(f"{name} flips {flip_horizontal}/{flip_vertical} rotation {rotation}: "
+                        f"BGR off by {errors.tolist()} LSB, limits {limits.tolist()}")
+    return int(errors.max()), failures
+
+
+def check_lut_key(meta, rng):
+    """Changing any footer word temperatureLut reads must change the LUT cache key."""
+    key = lut_key(meta)
+    words = [(0, 1)] + [(3, w) for w in list(range(0, 13)) + list(range(127, 138))]
+    failures = []
+    for row, word in words:
+        changed = meta.copy()
+        changed[row, word] ^= np.uint16(1 << int(rng.integers(0, 16)))
+        if np.array_equal(lut_key(changed), key):
+            failures.append(f"LUT key ignores row {row} word {word}")
+    return 0.0, failures
+
+
+def _difference(value, expected):
+    value, expected = float(value), float(expected)
+    if math.isnan(value) and math.isnan(expected):
+        return 0.0
+    return abs(value - expected)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the optimized paths with the reference oracles.")
+    parser.add_argument('--sweeps', type=int, default=200, help="random calibration parameter sets")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    frames = [('synthetic', synthetic_frame(rng)), ('frame.npy', fixture_frame())]
+    frames += [(f"edge {case}", synthetic_frame(rng, **case)) for case in EDGE_CASES]
+    frames += [(f"sweep {i}", synthetic_frame(rng, 64, **random_parameters(rng))) for i in range(args.sweeps)]
+
+    processor = ImageProcessor()
+    processor.draw_temp = False
+    results = {}
+
+    def record(check, label, outcome):
+        worst, failures = outcome
+        entry = results.setdefault(check, [0, 0.0, []])
+        entry[0] += 1
+        entry[1] = max(entry[1], worst)
+        entry[2].extend(f"{label}: {failure}" for failure in failures)
+
+    for label, frame_raw in frames:
+        visible, meta = split_frame(frame_raw)
+        # A cache per frame: every lookup computes its LUT
+        record('lut', label, check_lut(meta, LutCache(), visible.shape))
+        record('readings', label, check_readings(meta))
+        record('device_info', label, check_device_info(meta))
+        record('lut_key', label, check_lut_key(meta, rng))
+        record('normalize', label, check_normalize(visible, processor))
+
+    # A frame with the Emiss_ ~ 0 fallback must get the identity LUT
+    meta = split_frame(synthetic_frame(rng, **EDGE_CASES[1]))[1]
+    fallback = LutCache().lookup(meta)
+    record('lut', 'fallback', (0.0, [] if np.array_equal(fallback, np.arange(16384.0))
+                               else ["Emiss_ ~ 0 does not give the identity LUT"]))
+
+    # Flat image: the reference divides 0 by 0
+    flat = np.full((64, 64), 8000, dtype=np.uint16)
+    record('normalize', 'flat', check_normalize(flat, processor))
+
+    for label, frame_raw in frames[:2]:
+        visible = split_frame(frame_raw)[0]
+        for name, colormap in BUILTIN_COLORMAPS:
+            for flips in ((False, False), (True, False), (False, True), (True, True)):
+                for rotation in (0, 90, 180, 270):
+                    record('render', label, check_render(visible, processor, name, colormap, *flips, rotation))
+
+    failed = False
+    for check, (count, worst, failures) in results.items():
+        failed |= bool(failures)
+        print(f"{check:12s} {'ok' if not failures else 'FAIL':4s} {count} cases, worst error {worst:.3g}")
+        for failure in failures[:10]:
+            print(f"    {failure}")
+        if len(failures) > 10:
+            print(f"    ... {len(failures) - 10} more")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,238 @@
+#!/usr/bin/python3
+"""Export raw recordings to standard containers for other tools.
+
+    python3 -m ht301_thermal_viewer.export recording.raw --tiff counts.tif --npy temps.npy --metadata meta.csv
+
+--tiff writes the visible raw counts as a multi-page 16-bit TIFF (BigTIFF
+when it would exceed 4 GB), --npy the temperatures in °C as a float32
+(frames, height, width) NPY file that np.load(..., mmap_mode='r') opens
+without reading it, and --metadata the per-frame telemetry table (CSV).
+
+The recording is processed chunk by chunk: while a writer thread stores one
+chunk, the next one is read and converted, and at most a few chunks are in
+memory at once whatever the size of the recording.
+"""
+import time
+import queue
+import struct
+import argparse
+import threading
+import numpy as np
+from pathlib import Path
+
+from .analysis import TELEMETRY_COLUMNS, chunk_telemetry
+from .footer import FOOTER_ROWS, LutCache, split_frame
+from .raw_reader import RawRecording, read_timestamps
+
+# TIFF field types
+SHORT, LONG, LONG8 = 3, 4, 16
+
+
+class TiffStackWriter:
+    """Write same-sized grayscale uint16 pages to a TIFF file one at a time.
+
+    Each page is stored uncompressed as a single strip followed by its IFD;
+    the previous IFD is patched to point at the new one, so pages can be
+    appended without knowing their number in advance. Files that may grow
+    past 4 GB must be opened with bigtiff=True (64-bit offsets).
+    """
+    def __init__(self, path, shape, bigtiff=False):
+        self.height, self.width = shape
+        self.bigtiff = bigtiff
+        self.pages = 0
+        self.file = open(str(path), 'wb')
+        if bigtiff:
+            self.file.write(b'II' + struct.pack('<HHHQ', 43, 8, 0, 0))
+            # Where the offset of the next IFD goes
+            self._link = 8
+        else:
+            self.file.write(b'II' + struct.pack('<HI', 42, 0))
+            self._link = 4
+
+    def _entry(self, tag, type_, value):
+        if self.bigtiff:
+            data = struct.pack('<H', value) if type_ == SHORT else struct.pack('<Q' if type_ == LONG8 else '<I', value)
+            return struct.pack('<HHQ', tag, type_, 1) + data.ljust(8, b'\0')
+        data = struct.pack('<H' if type_ == SHORT else '<I', value)
+        return struct.pack('<HHI', tag, type_, 1) + data.ljust(4, b'\0')
+
+    def write(self, page):
+        page = np.ascontiguousarray(page, dtype='<u2')
+        if page.shape != (self.height, self.width):
+            raise ValueError(f"page shape {page.shape} differs from {(self.height, self.width)}")
+        f = self.file
+        offset = f.tell()
+        page.tofile(f)
+        nbytes = page.nbytes
+        if not self.bigtiff and offset + nbytes > 0xFFFFFFFF - 4096:
+            raise ValueError("TIFF file exceeds 4 GB; write it as BigTIFF")
+
+        offset_type = LONG8 if self.bigtiff else LONG
+        entries = [
+            self._entry(256, LONG, self.width),          # ImageWidth
+            self._entry(257, LONG, self.height),         # ImageLength
+            self._entry(258, SHORT, 16),                 # BitsPerSample
+            self._entry(259, SHORT, 1),                  # Compression: none
+            self._entry(262, SHORT, 1),                  # Photometric: black is zero
+            self._entry(273, offset_type, offset),       # StripOffsets
+            self._entry(277, SHORT, 1),                  # SamplesPerPixel
+            self._entry(278, LONG, self.height),         # RowsPerStrip
+            self._entry(279, offset_type, nbytes),       # StripByteCounts
+            self._entry(339, SHORT, 1),                  # SampleFormat: unsigned
+        ]
+        ifd = f.tell()
+        if self.bigtiff:
+            f.write(struct.pack('<Q', len(entries)) + b''.join(entries) + struct.pack('<Q', 0))
+            link_format, next_link = '<Q', ifd + 8 + 20 * len(entries)
+        else:
+            f.write(struct.pack('<H', len(entries)) + b''.join(entries) + struct.pack('<I', 0))
+            link_format, next_link = '<I', ifd + 2 + 12 * len(entries)
+
+        # Chain the new IFD to the previous one (or to the header)
+        f.seek(self._link)
+        f.write(struct.pack(link_format, ifd))
+        f.seek(0, 2)
+        self._link = next_link
+        self.pages += 1
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class RecordingExporter:
+    """Stream a raw recording into any of: TIFF stack, temperature NPY, metadata CSV."""
+    def __init__(self, raw_path, tiff_path=None, npy_path=None, metadata_path=None, chunk_frames=64):
+        self.raw_path = raw_path
+        self.tiff_path = tiff_path
+        self.npy_path = npy_path
+        self.metadata_path = metadata_path
+        self.chunk_frames = chunk_frames
+        # Decoded chunks waiting for the writer; bounds the memory in use
+        self.queue = queue.Queue(maxsize=2)
+        self.error = None
+
+    def run(self):
+        """Export the recording; returns the number of frames written."""
+        recording = RawRecording(self.raw_path)
+        if recording.height <= FOOTER_ROWS:
+            recording.close()
+            raise ValueError(f"{self.raw_path}: frames have no metadata footer")
+        n_frames = len(recording)
+        shape = (recording.height - FOOTER_ROWS, recording.width)
+
+        times = None
+        sidecar = recording.path.with_suffix('.timestamps.txt')
+        if sidecar.exists():
+            times = read_timestamps(sidecar)
+            if len(times) != n_frames:
+                print(f"Ignoring {sidecar}: {len(times)} timestamps for {n_frames} frames")
+                times = None
+
+        self._open_outputs(n_frames, shape, times is not None)
+        writer = threading.Thread(target=self._write_chunks, name='export-writer')
+        writer.start()
+        lut_cache = LutCache()
+        scratch = None
+        try:
+            for first, frames_raw in recording.chunks(self.chunk_frames):
+                if self.error is not None:
+                    break
+                frames_raw = np.array(frames_raw)
+                visible, meta = split_frame(frames_raw)
+                temps = None
+                if self.npy is not None:
+                    temps = np.empty((len(frames_raw),) + shape, dtype=np.float32)
+                    luts, inverse = lut_cache.lookup_many(meta)
+                    luts32 = luts.astype(np.float32)
+                    for i in range(len(frames_raw)):
+                        np.take(luts32[inverse[i]], visible[i], out=temps[i])
+                columns = None
+                if self.metadata is not None:
+                    columns, scratch = chunk_telemetry(first, frames_raw, lut_cache, scratch)
+                    if times is not None:
+                        columns['time_s'] = times[first:first + len(frames_raw)]
+                self.queue.put((first, visible, temps, columns))
+        finally:
+            self.queue.put(None)
+            writer.join()
+            recording.close()
+            self._close_outputs()
+        if self.error is not None:
+            raise self.error
+        return n_frames
+
+    def _open_outputs(self, n_frames, shape, timed):
+        self.tiff = self.npy = self.metadata = None
+        if self.tiff_path:
+            # Page data plus IFDs and some slack
+            size = n_frames * (shape[0] * shape[1] * 2 + 512)
+            self.tiff = TiffStackWriter(self.tiff_path, shape, bigtiff=size > 0xFFFFFFFF - 4096)
+        if self.npy_path:
+            self.npy = np.lib.format.open_memmap(str(self.npy_path), mode='w+', dtype=np.float32,
+                                                 shape=(n_frames,) + shape)
+        if self.metadata_path:
+            self.columns = [(name, fmt) for name, fmt in TELEMETRY_COLUMNS]
+            if timed:
+                self.columns.insert(1, ('time_s', '%.6f'))
+            self.metadata = open(str(self.metadata_path), 'w')
+            self.metadata.write(','.join(name for name, _ in self.columns) + '\n')
+
+    def _write_chunks(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            if self.error is not None:
+                # Keep draining so the reader never blocks on a full queue
+                continue
+            first, visible, temps, columns = item
+            try:
+                if self.tiff is not None:
+                    for page in visible:
+                        self.tiff.write(page)
+                if self.npy is not None:
+                    self.npy[first:first + len(temps)] = temps
+                    # Write the pages back now so dirty memory does not pile up
+                    self.npy.flush()
+                if self.metadata is not None:
+                    table = np.column_stack([columns[name] for name, _ in self.columns])
+                    np.savetxt(self.metadata, table, fmt=[fmt for _, fmt in self.columns], delimiter=',')
+            except Exception as e:
+                self.error = e
+
+    def _close_outputs(self):
+        if self.tiff is not None:
+            self.tiff.close()
+        if self.npy is not None:
+            self.npy.flush()
+            # Drop the memory map
+            self.npy = None
+        if self.metadata is not None:
+            self.metadata.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export an HT301 raw recording to TIFF, NPY and CSV.")
+    parser.add_argument('raw', help="raw recording (.raw) to export")
+    parser.add_argument('--tiff', help="multi-page 16-bit TIFF of the raw counts")
+    parser.add_argument('--npy', help="float32 NPY of the temperatures in °C")
+    parser.add_argument('--metadata', help="CSV table of the per-frame telemetry")
+    parser.add_argument('--chunk', type=int, default=64, help="frames processed per chunk")
+    args = parser.parse_args(argv)
+
+    if not (args.tiff or args.npy or args.metadata):
+        base = Path(args.raw)
+        args.tiff, args.npy, args.metadata = (str(base.with_suffix(s)) for s in ('.tif', '.npy', '.csv'))
+
+    start = time.monotonic()
+    exporter = RecordingExporter(args.raw, args.tiff, args.npy, args.metadata, args.chunk)
+    n_frames = exporter.run()
+    outputs = ', '.join(p for p in (args.tiff, args.npy, args.metadata) if p)
+    print(f"Exported {n_frames} frames to {outputs} in {time.monotonic() - start:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,150 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from .ht301_hacklib import temperatureLut, ABSOLUTE_ZERO_CELSIUS
+
+# The HT301 appends 4 rows of metadata below the visible image. Row 0 carries
+# the per-frame measurements, row 3 the calibration constants and the user
+# parameters (see temperatureLut in ht301_hacklib for the byte layout).
+FOOTER_ROWS = 4
+
+# Words of the footer that temperatureLut depends on: Tfpa_raw from row 0,
+# cx/coretmp and the calibration floats (bytes 0..26) and the user parameters
+# (bytes 254..276) from row 3. Two frames with equal words share a LUT.
+_LUT_WORDS_ROW3 = np.r_[0:13, 127:138]
+
+# Integer footer words of the readings: name -> (row, word)
+FOOTER_WORDS = {
+    'fpaavg': (0, 0), 'Tfpa_raw': (0, 1), 'Tmax_x': (0, 2), 'Tmax_y': (0, 3), 'Tmax_raw': (0, 4),
+    'Tmin_x': (0, 5), 'Tmin_y': (0, 6), 'Tmin_raw': (0, 7), 'orgavg': (0, 8), 'Tcenter_raw': (0, 12),
+    'cx': (3, 0), 'coretmp': (3, 1), 'distance': (3, 137),
+}
+# The user parameters are little-endian float32s from row 3 word 127 (byte
+# 254), the calibration constants from byte 6
+PARAMETER_WORD = 127
+PARAMETER_FLOATS = ('fix', 'refltmp_C', 'airtmp_C', 'humidity', 'emissivity')
+_CALIB_BYTE = 6
+
+# Per-frame readings published on the frame bus and the control socket and
+# kept by the telemetry log, in this order. The *_C temperatures of *_raw
+# words go through the frame's LUT.
+TELEMETRY_FIELDS = (
+    'timestamp', 'Tmin_C', 'Tmax_C', 'Tcenter_C', 'Tmin_raw', 'Tmax_raw', 'Tcenter_raw',
+    'Tmin_x', 'Tmin_y', 'Tmax_x', 'Tmax_y', 'fpatmp_C', 'coretmp_C', 'fpaavg', 'orgavg',
+    'emissivity', 'refltmp_C', 'airtmp_C', 'humidity', 'distance',
+)
+
+
+def split_frame(frame_raw):
+    """Split raw frame(s) into the visible image and the metadata footer."""
+    return frame_raw[..., :-FOOTER_ROWS, :], frame_raw[..., -FOOTER_ROWS:, :]
+
+
+def _floats(m3, start, count):
+    return np.ascontiguousarray(m3[..., start:start + 4 * count]).view('<f4')
+
+
+def fpa_celsius(tfpa_raw):
+    return 20.0 - (tfpa_raw - 7800.0) / 36.0
+
+
+def core_celsius(coretmp):
+    return coretmp / 10.0 + ABSOLUTE_ZERO_CELSIUS
+
+
+def decode_footer(meta):
+    """Decode the telemetry fields of one footer (4, W) or a stack (N, 4, W).
+
+    Every value is an array with the leading frame dimensions of `meta`.
+    """
+    meta = np.asarray(meta)
+    fields = {name: meta[..., row, word] for name, (row, word) in FOOTER_WORDS.items()}
+    m3 = np.ascontiguousarray(meta[..., 3, :]).view(np.uint8)
+    params = _floats(m3, PARAMETER_WORD * 2, len(PARAMETER_FLOATS))
+    for i, name in enumerate(PARAMETER_FLOATS):
+        fields[name] = params[..., i]
+    fields['calib'] = _floats(m3, _CALIB_BYTE, 5)
+    fields['fpatmp_C'] = fpa_celsius(fields['Tfpa_raw'].astype(np.float64))
+    fields['coretmp_C'] = core_celsius(fields['coretmp'].astype(np.float64))
+    return fields
+
+
+def lut_key(meta):
+    """Return the footer words the temperature LUT is computed from.
+
+    Works on a single footer (4, W) and on stacks (N, 4, W), in which case one
+    key row is returned per frame.
+    """
+    meta = np.asarray(meta)
+    tfpa = meta[..., 0, 1:2]
+    row3 = meta[..., 3, _LUT_WORDS_ROW3]
+    return np.concatenate([tfpa, row3], axis=-1)
+
+
+def build_lut(meta):
+    """Compute the temperature LUT for a single footer."""
+    row, word = FOOTER_WORDS['Tfpa_raw']
+    return temperatureLut(fpa_celsius(float(meta[row][word])), meta[3])
+
+
+class LutCache:
+    """Memoize temperature LUTs by the footer words they depend on.
+
+    The calibration parameters change only on shutter events or when the user
+    edits emissivity/distance on the device, so nearly every lookup is a hit.
+    `version` increments whenever a lookup returns a different LUT than the
+    previous one, which lets consumers refresh derived thresholds cheaply.
+    """
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._luts = OrderedDict()
+        self._last_key = None
+        self.version = 0
+        self.current = None
+
+    def lookup(self, meta):
+        """Return the LUT for a single footer, computing it on a miss."""
+        key = lut_key(meta).tobytes()
+        if key == self._last_key:
+            return self.current
+
+        lut = self._luts.get(key)
+        if lut is None:
+            lut = build_lut(meta)
+            self._luts[key] = lut
+            if len(self._luts) > self.max_entries:
+                self._luts.popitem(last=False)
+        else:
+            self._luts.move_to_end(key)
+
+        self._last_key = key
+        self.current = lut
+        self.version += 1
+        return lut
+
+    def lookup_many(self, meta):
+        """Return (luts, inverse) for a stack of footers.
+
+        `luts` holds one row per distinct parameter set and `inverse` maps each
+        frame to its row, so `luts[inverse, raw]` converts per-frame values.
+        """
+        keys = lut_key(meta)
+        _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+        luts = np.empty((len(first), 16384), dtype=np.float64)
+        for row, idx in enumerate(first):
+            luts[row] = self.lookup(meta[idx])
+        return luts, inverse.reshape(-1)
+
+
+def celsius_to_raw(lut, temps_C, side='right'):
+    """Convert temperatures to raw counts through a (monotonic) LUT.
+
+    With side='right' the result is the first raw value whose temperature is
+    above `temps_C`, so `raw >= result` means "hotter than". With side='left'
+    it is the first raw value at or above it, so `raw < result` means "colder
+    than". NaNs at the ends of the LUT are treated as out of range.
+    """
+    lut = np.asarray(lut, dtype=np.float64)
+    monotonic = np.maximum.accumulate(np.where(np.isnan(lut), -np.inf, lut))
+    return np.searchsorted(monotonic, temps_C, side=side)
@@ -0,0 +1,287 @@
+#!/usr/bin/python3
+"""Shared-memory bus publishing the live raw frames to other processes.
+
+Only one process can open the V4L2 device. The viewer (or the headless mode)
+publishes every raw frame and its decoded telemetry into a ring of slots in
+`multiprocessing.shared_memory`; any number of readers map the block and read
+the latest frame without ever blocking the producer:
+
+    from ht301_thermal_viewer.frame_bus import FrameBusReader
+    bus = FrameBusReader()
+    frame_raw, telemetry, seq = bus.read_latest()
+
+Each slot is guarded by a sequence counter (a seqlock): it is odd while the
+producer writes the slot and even otherwise, so a reader detects a torn read
+by comparing the counter before and after copying and simply retries.
+
+Run `python3 -m ht301_thermal_viewer.frame_bus --bench` for a throughput test
+with several reader processes.
+"""
+import time
+import argparse
+import multiprocessing
+import numpy as np
+from multiprocessing import shared_memory
+
+from .footer import TELEMETRY_FIELDS, decode_footer, split_frame
+from .utils import attach_shared_memory
+
+DEFAULT_NAME = 'ht301_frames'
+MAGIC = 0x48543330_31425553  # "HT301BUS"
+
+# Header words (int64): magic, slots, height, width, telemetry fields, latest sequence
+_MAGIC, _SLOTS, _HEIGHT, _WIDTH, _FIELDS, _LATEST = range(6)
+_HEADER_WORDS = 8
+
+
+class _BusLayout:
+    """Numpy views over a frame bus block."""
+    def __init__(self, shm, slots, height, width, fields):
+        self.shm = shm
+        buf = shm.buf
+        offset = _HEADER_WORDS * 8
+        self.header = np.ndarray((_HEADER_WORDS,), dtype=np.int64, buffer=buf)
+        self.seq = np.ndarray((slots,), dtype=np.int64, buffer=buf, offset=offset)
+        offset += slots * 8
+        self.telemetry = np.ndarray((slots, fields), dtype=np.float64, buffer=buf, offset=offset)
+        offset += slots * fields * 8
+        self.frames = np.ndarray((slots, height, width), dtype=np.uint16, buffer=buf, offset=offset)
+
+    @staticmethod
+    def size(slots, height, width, fields):
+        return _HEADER_WORDS * 8 + slots * 8 + slots * fields * 8 + slots * height * width * 2
+
+    def release(self):
+        self.header = self.seq = self.telemetry = self.frames = None
+
+
+def telemetry_vector(fields, lut, timestamp, out):
+    """Fill `out` with the published telemetry of a frame from its decoded footer."""
+    for i, name in enumerate(TELEMETRY_FIELDS):
+        if name == 'timestamp':
+            out[i] = timestamp
+        elif name in fields:
+            out[i] = fields[name]
+        elif name.endswith('_C') and lut is not None:
+            out[i] = lut[int(fields[name[:-2] + '_raw'])]
+        else:
+            out[i] = np.nan
+    return out
+
+
+class FrameBusPublisher:
+    """Producer side of the frame bus; owns the shared memory block."""
+    def __init__(self, name=DEFAULT_NAME, frame_shape=(292, 384), slots=4):
+        self.name = name
+        self.slots = slots
+        height, width = frame_shape
+        size = _BusLayout.size(slots, height, width, len(TELEMETRY_FIELDS))
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left over from a producer that crashed
+            stale = attach_shared_memory(name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        self.layout = _BusLayout(self.shm, slots, height, width, len(TELEMETRY_FIELDS))
+        self.layout.seq[:] = 0
+        self.layout.header[:] = [MAGIC, slots, height, width, len(TELEMETRY_FIELDS), -1, 0, 0]
+        self.frame_shape = (height, width)
+        self.count = 0
+        self._telemetry = np.empty(len(TELEMETRY_FIELDS), dtype=np.float64)
+
+    def publish(self, frame_raw, lut=None, timestamp=None):
+        """Copy a raw frame and its telemetry into the next slot.
+
+        Without a temperature LUT the Celsius readings are published as NaN.
+        """
+        if frame_raw is None or frame_raw.shape != self.frame_shape:
+            return False
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        fields = decode_footer(split_frame(frame_raw)[1])
+        telemetry_vector(fields, lut, timestamp, self._telemetry)
+
+        layout = self.layout
+        slot = self.count % self.slots
+        layout.seq[slot] += 1          # odd: slot being written
+        np.copyto(layout.frames[slot], frame_raw)
+        layout.telemetry[slot] = self._telemetry
+        layout.seq[slot] += 1          # even: slot consistent again
+        layout.header[_LATEST] = self.count
+        self.count += 1
+        return True
+
+    def close(self):
+        """Remove the bus; attached readers keep their mapping until they close."""
+        self.layout.release()
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class FrameBusReader:
+    """Reader side of the frame bus. Never blocks the producer."""
+    def __init__(self, name=DEFAULT_NAME, shm=None):
+        self.shm = attach_shared_memory(name) if shm is None else shm
+        header = np.ndarray((_HEADER_WORDS,), dtype=np.int64, buffer=self.shm.buf)
+        if header[_MAGIC] != MAGIC:
+            self.shm.close()
+            raise ValueError(f"shared memory '{name}' is not an HT301 frame bus")
+        self.slots, height, width, fields = (int(v) for v in header[_SLOTS:_LATEST])
+        del header
+        self.frame_shape = (height, width)
+        self.fields = TELEMETRY_FIELDS[:fields]
+        self.layout = _BusLayout(self.shm, self.slots, height, width, fields)
+        self.retries = 0
+
+    def latest_seq(self):
+        """Sequence number of the newest frame, -1 before the first one."""
+        return int(self.layout.header[_LATEST])
+
+    def latest_view(self):
+        """Zero-copy access: (frame view, telemetry view, seq, token) of the newest frame.
+
+        The views stay readable, but the producer reuses the slot after
+        `slots - 1` more frames; call valid(token) after using them to check
+        that they were not overwritten meanwhile.
+        """
+        while True:
+            seq = self.latest_seq()
+            if seq < 0:
+                return None, None, -1, None
+            slot = seq % self.slots
+            before = int(self.layout.seq[slot])
+            if before % 2 == 0:
+                return self.layout.frames[slot], self.layout.telemetry[slot], seq, (slot, before)
+            self.retries += 1
+
+    def valid(self, token):
+        """True if the slot behind a latest_view() result was not rewritten."""
+        slot, before = token
+        return int(self.layout.seq[slot]) == before
+
+    def read_latest(self, out=None, telemetry_out=None):
+        """Copy the newest frame out consistently; returns (frame, telemetry dict, seq)."""
+        if out is None:
+            out = np.empty(self.frame_shape, dtype=np.uint16)
+        if telemetry_out is None:
+            telemetry_out = np.empty(len(self.fields), dtype=np.float64)
+        while True:
+            frame, telemetry, seq, token = self.latest_view()
+            if token is None:
+                return None, None, -1
+            np.copyto(out, frame)
+            np.copyto(telemetry_out, telemetry)
+            if self.valid(token):
+                return out, dict(zip(self.fields, telemetry_out.tolist())), seq
+            self.retries += 1
+
+    def wait_for_frame(self, after_seq, timeout=1.0, poll=0.002):
+        """Wait until a frame newer than `after_seq` is published; returns its seq or None."""
+        deadline = time.monotonic() + timeout
+        while True:
+            seq = self.latest_seq()
+            if seq > after_seq:
+                return seq
+            if time.monotonic() > deadline:
+                return None
+            time.sleep(poll)
+
+    def close(self):
+        self.layout.release()
+        self.shm.close()
+
+
+def _bench_reader(name, ready, results):
+    # Spawned children share the resource tracker of the publisher, so they
+    # attach plainly instead of unregistering the block from it
+    reader = FrameBusReader(name, shared_memory.SharedMemory(name=name))
+    out = np.empty(reader.frame_shape, dtype=np.uint16)
+    seq, frames, torn = -1, 0, 0
+    ready.wait()
+    # Read until the publisher goes quiet
+    while reader.wait_for_frame(seq, timeout=0.5) is not None:
+        frame, telemetry, seq = reader.read_latest(out)
+        frames += 1
+        # Every pixel of a benchmark frame holds its sequence number
+        if frame[0, 0] != frame[-1, -1] or frame[0, 0] != (seq & 0xffff):
+            torn += 1
+    results.put((frames, reader.retries, torn))
+    reader.close()
+
+
+def benchmark(readers=4, seconds=5.0, fps=200.0, name=DEFAULT_NAME + '_bench'):
+    """Publish synthetic frames at `fps` with several reader processes attached."""
+    publisher = FrameBusPublisher(name)
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    ready = ctx.Barrier(readers + 1)
+    procs = [ctx.Process(target=_bench_reader, args=(name, ready, results)) for _ in range(readers)]
+    for p in procs:
+        p.start()
+    ready.wait()
+
+    frame = np.zeros(publisher.frame_shape, dtype=np.uint16)
+    start = time.monotonic()
+    publish_time = 0.0
+    next_time = start
+    while time.monotonic() - start < seconds:
+        frame.fill(publisher.count & 0xffff)
+        t0 = time.perf_counter()
+        publisher.publish(frame, None, time.monotonic())
+        publish_time += time.perf_counter() - t0
+        next_time += 1.0 / fps
+        time.sleep(max(0.0, next_time - time.monotonic()))
+
+    stats = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    published = publisher.count
+    publisher.close()
+
+    print(f"published {published} frames in {seconds:.1f}s "
+          f"({published / seconds:.0f} fps, {publish_time / max(published, 1) * 1e6:.0f} us per publish)")
+    for i, (frames, retries, torn) in enumerate(stats):
+        print(f"reader {i}: {frames} frames ({frames / seconds:.0f} fps), {retries} retries, {torn} torn frames")
+    return published, stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HT301 shared-memory frame bus tools.")
+    parser.add_argument('--bench', action='store_true', help="run the multi-reader throughput test")
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--fps', type=float, default=200.0, help="publish rate of the benchmark")
+    parser.add_argument('--name', default=DEFAULT_NAME, help="bus name to read from")
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        benchmark(args.readers, args.seconds, args.fps)
+        return 0
+
+    # Print the telemetry of the live bus
+    reader = FrameBusReader(args.name)
+    seq = -1
+    try:
+        while True:
+            seq = reader.wait_for_frame(seq, timeout=5.0)
+            if seq is None:
+                print("No frames published for 5 s")
+                seq = reader.latest_seq()
+                continue
+            _, telemetry, seq = reader.read_latest()
+            print(f"{seq}: Tmin {telemetry['Tmin_C']:.2f}C Tmax {telemetry['Tmax_C']:.2f}C "
+                  f"Tcenter {telemetry['Tcenter_C']:.2f}C FPA {telemetry['fpatmp_C']:.2f}C")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,183 @@
+#!/usr/bin/python3
+"""Run the capture loop without the GTK interface.
+
+    python3 -m ht301_thermal_viewer.headless                      # live camera
+    python3 -m ht301_thermal_viewer.headless --replay rec.raw     # play a recording
+
+Frames are published on the shared-memory frame bus (see frame_bus.py) so
+other processes can consume them while nothing is displayed; --control
+serves readings and controls on a JSON-RPC socket (see control_server.py).
+"""
+import time
+import argparse
+import functools
+
+from .camera_manager import CameraManager
+from .control_server import ControlServer, socket_path
+from .footer import split_frame
+from .frame_bus import FrameBusPublisher, DEFAULT_NAME
+from .instrumentation import FrameStats
+from .nuc import ShutterScheduler
+from .recorder import Recorder
+from .telemetry import TelemetryLog, log_path
+from .raw_reader import ReplayDevice
+
+
+class HeadlessRunner:
+    """Capture loop of the headless mode."""
+    def __init__(self, camera_manager, bus_name=DEFAULT_NAME, auto_calibrate=True, telemetry_log=None,
+                 control_socket=None):
+        self.camera_manager = camera_manager
+        # Footer telemetry ring buffer, optionally written to a CSV file
+        self.telemetry = TelemetryLog(path=log_path(telemetry_log))
+        self.shutter_scheduler = ShutterScheduler(camera_manager)
+        self.shutter_scheduler.enabled = auto_calibrate
+        self.bus_name = bus_name
+        self.frame_bus = None
+        self.control_socket = control_socket
+        self.control_server = None
+        # Raw recordings started through the control socket
+        self.recorder = Recorder()
+        self.stats = FrameStats()
+        self.running = False
+        self.frames = 0
+
+    def start(self):
+        if not self.camera_manager.initialize():
+            print("Camera initialization failed!")
+            return False
+        if self.bus_name:
+            self.frame_bus = FrameBusPublisher(self.bus_name)
+            print(f"Publishing frames on shared memory '{self.bus_name}'")
+        if self.control_socket is not None:
+            self.control_server = ControlServer(self.control_socket, self.camera_manager, self.telemetry)
+            self.register_controls(self.control_server)
+            if not self.control_server.start():
+                self.control_server = None
+        self.running = True
+        return True
+
+    def register_controls(self, server):
+        def set_raw_recording(active=True):
+            if active and not self.recorder.is_raw_recording:
+                self.recorder.start_raw_recording(self.camera_manager.frame_raw)
+            elif not active and self.recorder.is_raw_recording:
+                self.recorder.stop_raw_recording()
+            return self.recorder.is_raw_recording
+            
+        def status():
+            return {'frames': self.frames, 'raw_recording': self.recorder.is_raw_recording,
+                    'auto_calibrate': self.shutter_scheduler.enabled}
+            
+        server.register('set_raw_recording', set_raw_recording, frame_loop=True, description="start or stop the raw recording")
+        server.register('status', status, frame_loop=True, description="frame count and recording state")
+
+    def step(self):
+        """Read and publish one frame; returns False when the source is exhausted."""
+        if self.control_server is not None:
+            self.control_server.run_pending()
+        ret, frame, frame_raw = self.camera_manager.read_raw()
+        timestamp = time.monotonic()
+        if not ret:
+            if self.camera_manager.reconnecting():
+                # The watchdog is reopening the camera; keep going
+                self.stats.set_value('disconnects', self.camera_manager.capture_status()['disconnects'])
+                time.sleep(0.1)
+                return True
+            return False
+        self.frames += 1
+        self.stats.count('frames')
+        # Never calibrate (and freeze the frames) in the middle of a raw recording
+        if self.shutter_scheduler.update(frame_raw, timestamp, self.recorder.is_raw_recording):
+            self.stats.count('auto_calibrations')
+        meta = split_frame(frame_raw)[1]
+        lut = self.camera_manager.lut_cache.lookup(meta)
+        self.telemetry.append(meta, timestamp, lut)
+        if self.frame_bus is not None:
+            self.frame_bus.publish(frame_raw, lut, timestamp)
+        if self.control_server is not None:
+            self.control_server.publish(frame_raw, lut, timestamp)
+        self.recorder.write_raw_frame(frame_raw, timestamp)
+        self.stats.maybe_report()
+        return True
+
+    def run(self, max_frames=None, duration=None):
+        deadline = None if duration is None else time.monotonic() + duration
+        try:
+            while self.running:
+                if not self.step():
+                    break
+                if max_frames is not None and self.frames >= max_frames:
+                    break
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        self.running = False
+        if self.control_server is not None:
+            self.control_server.close()
+            self.control_server = None
+        if self.recorder.is_raw_recording:
+            self.recorder.stop_raw_recording()
+        if self.frame_bus is not None:
+            self.frame_bus.close()
+            self.frame_bus = None
+        status = self.camera_manager.capture_status()
+        self.camera_manager.release()
+        self.telemetry.close()
+        print(f"Headless mode stopped after {self.frames} frames")
+        if status is not None and status['disconnects']:
+            print(f"Camera lost {status['disconnects']} times, {status['reconnect_attempts']} reconnection attempts, "
+                  f"last outage {status['last_outage_s'] or 0:.1f}s")
+        if self.telemetry.count:
+            print(self.telemetry_summary())
+            
+    def telemetry_summary(self):
+        """One line with the current sensor temperatures and their drift over the last minute."""
+        t = self.telemetry
+        return (f"FPA {t.current('fpatmp_C'):.2f}°C ({t.drift('fpatmp_C'):+.2f}°C/min), "
+                f"core {t.current('coretmp_C'):.2f}°C ({t.drift('coretmp_C'):+.2f}°C/min), "
+                f"Tmax {t.current('Tmax_C'):.2f}°C")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HT301 capture loop without the user interface.")
+    parser.add_argument('--replay', help="play a .raw recording instead of opening the camera")
+    parser.add_argument('--fps', type=float, default=25.0, help="replay rate when the recording has no timestamps")
+    parser.add_argument('--no-loop', action='store_true', help="stop at the end of the recording")
+    parser.add_argument('--bus', default=DEFAULT_NAME, help="frame bus name, empty to disable")
+    parser.add_argument('--frames', type=int, help="stop after this many frames")
+    parser.add_argument('--duration', type=float, help="stop after this many seconds")
+    parser.add_argument('--no-auto-calibrate', action='store_true',
+                        help="never trigger the shutter calibration automatically")
+    parser.add_argument('--telemetry-log', nargs='?', const='1',
+                        help="write the per-frame footer telemetry to this CSV file "
+                             "(without a value: a timestamped file in the data directory)")
+    parser.add_argument('--control', nargs='?', const='1',
+                        help="serve the JSON-RPC control API on this Unix socket "
+                             "(without a value: ht301-thermal-viewer.sock in $XDG_RUNTIME_DIR)")
+    args = parser.parse_args(argv)
+
+    if args.replay:
+        factory = functools.partial(ReplayDevice, args.replay, fps=args.fps, loop=not args.no_loop)
+        camera_manager = CameraManager(factory)
+        # A recording was corrected when it was captured
+        camera_manager.correct_flat_field = camera_manager.correct_bad_pixels = False
+    else:
+        camera_manager = CameraManager()
+
+    # A recording has no shutter
+    runner = HeadlessRunner(camera_manager, args.bus, not (args.no_auto_calibrate or args.replay),
+                            args.telemetry_log, socket_path(args.control))
+    if not runner.start():
+        return 1
+    runner.run(args.frames, args.duration)
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,119 @@
+import sys
+import cv2
+import numpy as np
+
+from .footer import celsius_to_raw
+from .pipeline import Stage
+
+# The sensor delivers 14-bit counts
+RAW_LEVELS = 16384
+
+
+class RawHistogram:
+    """Histogram of the raw counts of the current frame, shared by its users.
+
+    compute() counts the uint16 image in a single pass with one bin per raw
+    level; calling it again with the same frame returns the cached counts, so
+    the histogram AGC and the histogram panel never count a frame twice.
+    cv2.calcHist fills a preallocated buffer, where np.bincount would first
+    copy the frame to int64 (eight times its size).
+    """
+    def __init__(self):
+        self._hist = np.zeros((RAW_LEVELS, 1), dtype=np.float32)
+        self.counts = self._hist[:, 0]
+        self.total = 0
+        self._source = None
+        self._cdf = np.zeros(RAW_LEVELS + 1, dtype=np.float64)
+        self._cdf_source = None
+
+    def compute(self, raw):
+        if raw is not self._source:
+            cv2.calcHist([raw], [0], None, [RAW_LEVELS], [0, RAW_LEVELS], hist=self._hist)
+            self.total = raw.size
+            self._source = raw
+        return self.counts
+
+    def cdf(self):
+        """Cumulative counts with a leading 0: cdf[r] is the number of pixels below raw r."""
+        if self._cdf_source is not self._source:
+            np.cumsum(self.counts, out=self._cdf[1:])
+            self._cdf_source = self._source
+        return self._cdf
+
+    def celsius_bins(self, lut, low_C, high_C, bins=64):
+        """Pixel counts in `bins` equal °C bins between low_C and high_C; returns (edges_C, counts)."""
+        edges = np.linspace(low_C, high_C, bins + 1)
+        raw_edges = celsius_to_raw(lut, edges, side='left')
+        # The top edge is inclusive
+        raw_edges[-1] = celsius_to_raw(lut, high_C, side='right')
+        cdf = self.cdf()
+        return edges, cdf[raw_edges[1:]] - cdf[raw_edges[:-1]]
+
+    def statistics(self, lut):
+        """Mean, standard deviation, median, 5th and 95th percentile in °C."""
+        counts = self.counts
+        valid = np.isfinite(lut)
+        temps = np.where(valid, lut, 0.0)
+        n = counts[valid].sum()
+        if n == 0:
+            return None
+        mean = np.dot(counts, temps) / n
+        std = np.sqrt(max(np.dot(counts, (temps - mean) ** 2 * valid) / n, 0.0))
+        cdf = self.cdf()
+        percentiles = np.searchsorted(cdf[1:], np.array([0.05, 0.5, 0.95]) * self.total)
+        p5, median, p95 = lut[np.minimum(percentiles, RAW_LEVELS - 1)]
+        return {'mean_C': mean, 'std_C': std, 'median_C': median, 'p5_C': p5, 'p95_C': p95}
+
+
+class HistogramAGCStage(Stage):
+    """Map raw counts to 8 bits by plateau histogram equalization.
+
+    Unlike the min/max stretch, contrast goes where the pixels are, so a
+    small hot object no longer flattens the rest of the scene. Each bin is
+    clipped to `plateau` times the mean bin count before equalizing.
+    """
+    name = 'agc'
+    accepts = (np.uint16,)
+    out_dtype = np.uint8
+
+    def __init__(self, processor, plateau=4.0, name=None):
+        super().__init__(name)
+        self.processor = processor
+        self.plateau = plateau
+        self._clipped = np.zeros(RAW_LEVELS, dtype=np.float32)
+        self._table = np.zeros(RAW_LEVELS, dtype=np.uint8)
+        self._index = None
+        self._index_low = None
+
+    def active(self, src, info):
+        return self.processor.agc == 'histogram' and src.dtype == np.uint16
+
+    def run(self, src, dst, info):
+        # The whole sensor, when zoomed with the contrast of the full frame
+        reference = self.processor.pipeline.contrast_source
+        if reference is None:
+            reference = src
+        counts = self.processor.histogram.compute(reference)
+        occupied = int(np.count_nonzero(counts))
+        # Scalars are float32: a float64 one would make NumPy cast the counts to a temporary
+        limit = np.float32(max(self.plateau * reference.size / max(occupied, 1), 1.0))
+        np.minimum(counts, limit, out=self._clipped)
+        np.cumsum(self._clipped, out=self._clipped)
+        # Raw levels below the coldest pixel map to 0, above the hottest to 255
+        # (the cumulative counts are sorted, so searchsorted finds the first occupied level)
+        first = self._clipped[np.searchsorted(self._clipped, np.float32(0), side='right')] if occupied else 0.0
+        span = max(self._clipped[-1] - first, 1)
+        np.subtract(self._clipped, first, out=self._clipped)
+        np.multiply(self._clipped, np.float32(255.0 / span), out=self._clipped)
+        np.clip(self._clipped, 0, 255, out=self._clipped)
+        self._table[:] = self._clipped
+        # np.take converts uint16 indices to a new intp array on every call.
+        # Instead the counts are copied into the low 16 bits of a zeroed intp
+        # buffer, a plain copy without casting.
+        if self._index is None or self._index.shape != src.shape:
+            self._index = np.zeros(src.shape, dtype=np.intp)
+            words = self._index.itemsize // 2
+            low = 0 if sys.byteorder == 'little' else words - 1
+            self._index_low = self._index.view(np.uint16).reshape(src.shape + (words,))[..., low]
+        np.copyto(self._index_low, src)
+        np.take(self._table, self._index, out=dst, mode='clip')
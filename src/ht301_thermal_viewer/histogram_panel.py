@@ -0,0 +1,98 @@
+import gi
+from gi.repository import Gtk, GLib
+
+class HistogramPanel(Gtk.Box):
+    """Temperature histogram of the scene with its statistics, drawn over the view.
+
+    The panel redraws on its own timer, a few times per second, instead of
+    with every frame: it reads the raw histogram of the last frame from the
+    image processor (counted once per frame and shared with the histogram
+    AGC) and bins it in °C through the frame's LUT.
+    """
+    def __init__(self, window, interval_ms=250, bins=64):
+        super().__init__(orientation=Gtk.Orientation.VERTICAL)
+        self.window = window
+        self.interval_ms = interval_ms
+        self.bins = bins
+        self.edges = None
+        self.counts = None
+        self._timer = None
+
+        self.set_halign(Gtk.Align.START)
+        self.set_valign(Gtk.Align.END)
+        self.set_margin_start(16)
+        self.set_margin_bottom(96)
+        self.add_css_class("histogram-panel")
+
+        self.drawing_area = Gtk.DrawingArea()
+        self.drawing_area.set_content_width(220)
+        self.drawing_area.set_content_height(90)
+        self.drawing_area.set_draw_func(self.on_draw)
+        self.append(self.drawing_area)
+
+        self.stats_label = Gtk.Label()
+        self.stats_label.set_halign(Gtk.Align.START)
+        self.stats_label.add_css_class("histogram-stats")
+        self.append(self.stats_label)
+
+        self.set_visible(False)
+
+    def show_panel(self, visible):
+        self.set_visible(visible)
+        if visible and self._timer is None:
+            self.refresh()
+            self._timer = GLib.timeout_add(self.interval_ms, self.refresh)
+        elif not visible and self._timer is not None:
+            GLib.source_remove(self._timer)
+            self._timer = None
+
+    def refresh(self):
+        try:
+            raw = self.window.last_visible
+            lut = self.window.camera_manager.lut
+            info = self.window.last_info
+            if raw is None or lut is None or info is None:
+                return True
+
+            histogram = self.window.image_processor.histogram
+            histogram.compute(raw)
+            low, high = info['Tmin_C'], info['Tmax_C']
+            if high - low < 0.5:
+                low, high = low - 0.25, high + 0.25
+            self.edges, self.counts = histogram.celsius_bins(lut, low, high, self.bins)
+
+            stats = histogram.statistics(lut)
+            if stats is not None:
+                self.stats_label.set_text(
+                    f"mean {stats['mean_C']:.1f}°C  σ {stats['std_C']:.1f}  median {stats['median_C']:.1f}\n"
+                    f"5% {stats['p5_C']:.1f}°C  95% {stats['p95_C']:.1f}°C")
+            self.drawing_area.queue_draw()
+        except Exception as e:
+            print(f"Error updating histogram: {e}")
+        return True
+
+    def on_draw(self, drawing_area, cr, width, height):
+        if self.counts is None:
+            return
+        label_height = 12
+        bar_height = height - label_height
+        peak = self.counts.max()
+        if peak <= 0:
+            return
+
+        # Bars, scaled to the fullest bin
+        bar_width = width / len(self.counts)
+        cr.set_source_rgba(1.0, 1.0, 1.0, 0.8)
+        for i, count in enumerate(self.counts):
+            h = bar_height * count / peak
+            cr.rectangle(i * bar_width, bar_height - h, max(bar_width - 1, 1), h)
+        cr.fill()
+
+        # Range of the bins below the bars
+        cr.set_source_rgba(1.0, 1.0, 1.0, 0.9)
+        cr.set_font_size(10)
+        cr.move_to(0, height - 2)
+        cr.show_text(f"{self.edges[0]:.1f}°C")
+        text = f"{self.edges[-1]:.1f}°C"
+        cr.move_to(width - cr.text_extents(text).x_advance, height - 2)
+        cr.show_text(text)
@@ -0,0 +1,206 @@
+#!/usr/bin/python3
+"""Several hotspots per frame instead of the footer's single Tmax point.
+
+HotspotDetector finds the K hottest local maxima of the visible raw image
+that are above a temperature threshold and at least `min_distance` pixels
+apart, and tracks them from frame to frame so each keeps its id:
+
+    detector = HotspotDetector(count=5, min_distance=10)
+    hotspots = detector.update(visible, lut)     # [Hotspot(id, x, y, raw, temperature), ...]
+
+The search runs on the image at half resolution: the 2x2 means (one
+cv2.resize) smooth the noise away, so a single noisy pixel is not a
+hotspot. It is compared with its grey dilation by a square of side about
+`min_distance`, and the means equal to the maximum of their neighbourhood
+and above the threshold are the candidates. These are all OpenCV calls
+into reused buffers, a fraction of a millisecond per frame; only the
+candidates reach NumPy, where the hottest are kept greedily, dropping
+those too close to a kept one, and each is moved to the hottest pixel of
+its 2x2 block.
+
+    python3 -m ht301_thermal_viewer.hotspots     # timing and tracking check
+"""
+import time
+import argparse
+import cv2
+import numpy as np
+from collections import namedtuple
+
+# Position in sensor pixels of the visible image
+Hotspot = namedtuple('Hotspot', ['id', 'x', 'y', 'raw', 'temperature'])
+
+
+class HotspotTracker:
+    """Give detections stable ids by matching them to the previous frame's positions.
+
+    Pairs are matched greedily, closest first, up to `max_distance` pixels.
+    A track not seen for more than `max_missed` frames is dropped; a new
+    detection gets the next id.
+    """
+    def __init__(self, max_distance=12.0, max_missed=5):
+        self.max_distance = max_distance
+        self.max_missed = max_missed
+        # [id, x, y, missed] per track
+        self.tracks = []
+        self.next_id = 1
+
+    def update(self, detections):
+        """Assign ids to a list of (x, y, raw, temperature) detections."""
+        matched = [None] * len(detections)
+        free_tracks = set(range(len(self.tracks)))
+        if self.tracks and detections:
+            old = np.array([track[1:3] for track in self.tracks], dtype=np.float64)
+            new = np.array([d[:2] for d in detections], dtype=np.float64)
+            distances = np.hypot(old[:, None, 0] - new[None, :, 0], old[:, None, 1] - new[None, :, 1])
+            for flat in np.argsort(distances, axis=None):
+                t, d = divmod(int(flat), len(detections))
+                if distances[t, d] > self.max_distance:
+                    break
+                if t in free_tracks and matched[d] is None:
+                    matched[d] = t
+                    free_tracks.discard(t)
+
+        hotspots = []
+        for detection, t in zip(detections, matched):
+            if t is None:
+                track = [self.next_id, 0, 0, 0]
+                self.next_id += 1
+                self.tracks.append(track)
+            else:
+                track = self.tracks[t]
+            track[1], track[2], track[3] = detection[0], detection[1], 0
+            hotspots.append(Hotspot(track[0], *detection))
+        for t in free_tracks:
+            self.tracks[t][3] += 1
+        self.tracks = [track for track in self.tracks if track[3] <= self.max_missed]
+        return hotspots
+
+    def reset(self):
+        self.tracks = []
+        self.next_id = 1
+
+
+class HotspotDetector:
+    """Top `count` local maxima above `threshold_C`, at least `min_distance` pixels apart.
+
+    With threshold_C=None a hotspot must be `min_contrast_C` hotter than
+    the mean of the frame.
+    """
+    def __init__(self, count=5, min_distance=10, threshold_C=None, min_contrast_C=3.0):
+        self.enabled = False
+        self.count = count
+        self.min_distance = min_distance
+        self.threshold_C = threshold_C
+        self.min_contrast_C = min_contrast_C
+        self.tracker = HotspotTracker(max_distance=1.5 * min_distance)
+        self._small = None
+        self._dilated = None
+        self._mask = None
+        self._above = None
+        self._kernel = None
+        self._lut_id = None
+        self._sorted_lut = None
+
+    def _buffers(self, shape):
+        small = (shape[0] // 2, shape[1] // 2)
+        if self._small is None or self._small.shape != small:
+            self._small = np.empty(small, dtype=np.uint16)
+            self._dilated = np.empty(small, dtype=np.uint16)
+            self._mask = np.empty(small, dtype=np.uint8)
+            self._above = np.empty(small, dtype=np.uint8)
+        size = 2 * (self.min_distance // 2) + 1
+        if self._kernel is None or self._kernel.shape[0] != size:
+            self._kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (size, size))
+
+    def _threshold(self, lut):
+        """Raw count of the threshold temperature."""
+        if self._lut_id != id(lut):
+            # Monotonic copy of the LUT, as celsius_to_raw() searches it, made once per LUT
+            self._sorted_lut = np.maximum.accumulate(np.where(np.isnan(lut), -np.inf, lut))
+            self._lut_id = id(lut)
+        if self.threshold_C is None:
+            threshold_C = lut[int(cv2.mean(self._small)[0])] + self.min_contrast_C
+        else:
+            threshold_C = self.threshold_C
+        return int(np.searchsorted(self._sorted_lut, threshold_C, side='left'))
+
+    def detect(self, visible, lut):
+        """Untracked (x, y, raw, temperature) detections in a (H, W) raw frame, hottest first."""
+        self._buffers(visible.shape)
+        height, width = self._small.shape
+        cv2.resize(visible[:2 * height, :2 * width], (width, height), self._small, interpolation=cv2.INTER_AREA)
+        cv2.dilate(self._small, self._kernel, self._dilated)
+        cv2.compare(self._small, self._dilated, cv2.CMP_EQ, self._mask)
+        threshold = self._threshold(lut)
+        if threshold >= len(lut):
+            return []
+        cv2.compare(self._small, float(threshold), cv2.CMP_GE, self._above)
+        cv2.bitwise_and(self._mask, self._above, self._mask)
+        points = cv2.findNonZero(self._mask)
+        if points is None:
+            return []
+        points = points.reshape(-1, 2)
+        order = np.argsort(self._small[points[:, 1], points[:, 0]])[::-1]
+        # Full resolution coordinates of the blocks
+        points = points[order].astype(np.float32) * 2
+
+        # A plateau gives several equal candidates: keep the hottest, drop its neighbours
+        detections = []
+        limit = float(self.min_distance) ** 2
+        while len(points) and len(detections) < self.count:
+            x, y = points[0]
+            far = (points[:, 0] - x) ** 2 + (points[:, 1] - y) ** 2 >= limit
+            points = points[far]
+            x, y = int(x), int(y)
+            block = visible[y:y + 2, x:x + 2]
+            dy, dx = divmod(int(np.argmax(block)), 2)
+            raw = int(block[dy, dx])
+            detections.append((x + dx, y + dy, raw, float(lut[raw])))
+        return detections
+
+    def update(self, visible, lut):
+        """Detect and track; returns a list of Hotspot."""
+        return self.tracker.update(self.detect(visible, lut))
+
+
+def _synthetic_scene(rng, t, height=288, width=384):
+    """Three warm blobs drifting slowly over a noisy background (raw counts)."""
+    y, x = np.mgrid[0:height, 0:width]
+    frame = 7800 + 0.3 * x
+    for cx, cy, amplitude in ((80 + 2 * t, 70, 900), (250, 90 + t, 1500), (300 - t, 220, 600)):
+        frame = frame + amplitude * np.exp(-((x - cx) ** 2 + (y - cy) ** 2) / 120.0)
+    return (frame + rng.normal(0, 8, frame.shape)).astype(np.uint16)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the hotspot detector and check the tracking.")
+    parser.add_argument('--frames', type=int, default=50)
+    parser.add_argument('--limit-ms', type=float, default=1.0, help="largest mean detection time accepted")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    # A linear LUT: 0.04°C per count, 20°C at 7800 counts
+    lut = 20.0 + (np.arange(1 << 16) - 7800) * 0.04
+    frames = [_synthetic_scene(rng, t) for t in range(args.frames)]
+    detector = HotspotDetector(count=5, min_distance=10)
+    detector.update(frames[0], lut)
+    detector.tracker.reset()
+
+    ids, elapsed = set(), 0.0
+    for frame in frames:
+        start = time.perf_counter()
+        hotspots = detector.update(frame, lut)
+        elapsed += time.perf_counter() - start
+        ids.update(h.id for h in hotspots)
+    mean_ms = elapsed / len(frames) * 1000.0
+    print(f"detect+track {mean_ms:.3f}ms/frame, {len(hotspots)} hotspots, {len(ids)} ids used")
+    for h in hotspots:
+        print(f"  #{h.id} ({h.x}, {h.y}) {h.temperature:.1f}°C")
+    # The three blobs move 1-2 px per frame: they must keep their ids
+    ok = mean_ms <= args.limit_ms and len(hotspots) == 3 and len(ids) == 3
+    print("ok" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -164,14 +164,15 @@ def temperatureLut(fpatmp_, meta3):
     return sub_10001180(fpatmp_, coretmp_, v5); #//bug in IDA
 
 
-def info(meta, device_strings, width, height):
+def info(meta, device_strings, width, height, temperature_LUT_C=None):
 
     meta0, meta3 = meta[0], meta[3]
 
     Tfpa_raw = meta0[1]
     fpatmp_ = 20.0 - (float(Tfpa_raw) - 7800.0) / 36.0;
 
-    temperature_LUT_C = temperatureLut(fpatmp_, meta3)
+    if temperature_LUT_C is None:
+        temperature_LUT_C = temperatureLut(fpatmp_, meta3)
 
     fpaavg_  = meta0[0]
 #   Tfpa_raw = meta0[1]
@@ -250,7 +251,10 @@ class HT301:
 
         self.cap = cv2.VideoCapture(video_dev, cv2.CAP_V4L2)
         if not self.isHt301(self.cap):
-            Exception('device ' + str(video_dev) + ": HT301 not found!")
+            self.cap.release()
+            raise Exception('device ' + str(video_dev) + ": HT301 not found!")
+        # Frames dropped because their footer did not match, since opening
+        self.mismatches = 0
 
         self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
         # Use raw mode
@@ -286,6 +290,9 @@ class HT301:
 
     def read_(self):
         ret, frame = self.cap.read()
+        # A lost device returns no frame (or a truncated one)
+        if not ret or frame is None or frame.nbytes != self.FRAME_HEIGHT * self.FRAME_WIDTH * 2:
+            return False, None, None, None
         dt = np.dtype('<u2')
         frame = frame.view(dtype=dt)
         frame = frame.reshape(self.FRAME_HEIGHT, self.FRAME_WIDTH)
@@ -294,14 +301,22 @@ class HT301:
         meta      = frame_raw[frame_raw.shape[0] - 4:,...]
         return ret, frame_raw, f_visible, meta
 
-    def read(self):
+    def read(self, max_mismatches=10):
         frame_ok = False
+        mismatches = 0
         while not frame_ok:
             ret, frame_raw, frame, meta = self.read_()
+            if not ret:
+                return False, None, None
             device_strings = device_info(meta)
             if device_strings[3] == 'T3-317-13': frame_ok = True
             else:
                 if debug > 0: print('frame meta no match:', device_strings)
+                self.mismatches += 1
+                mismatches += 1
+                # Not an HT301 stream (any more): give up instead of spinning
+                if mismatches > max_mismatches:
+                    return False, None, None
 
         self.frame_raw = frame_raw
         self.frame = frame
@@ -309,9 +324,13 @@ class HT301:
         self.device_strings  = device_strings
         return ret, self.frame, self.frame_raw
 
-    def info(self):
+    def grab(self):
+        # Dequeue a frame without copying or decoding it (keeps the stream drained)
+        return self.cap.grab()
+
+    def info(self, lut=None):
         width, height = self.frame.shape
-        return info(self.meta, self.device_strings, height, width)
+        return info(self.meta, self.device_strings, height, width, lut)
 
     def calibrate(self):
         self.cap.set(cv2.CAP_PROP_ZOOM, 0x8000)
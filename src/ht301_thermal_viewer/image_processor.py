@@ -1,8 +1,29 @@
 import cv2
 import numpy as np
 from .utils import drawTemperature
+from .pipeline import FramePipeline, NormalizeStage, DenoiseStage, ColormapStage, TransformStage, OverlayStage
+from .isotherm import IsothermStage
+from .colormaps import load_colormaps
+from .histogram import RawHistogram, HistogramAGCStage
 
 class ImageProcessor:
+    MAX_ZOOM = 8.0
+    # Smallest crop side in sensor pixels
+    MIN_CROP = 16
+    
+    def __setattr__(self, name, value):
+        # Any change to the render state (colormap, flips, rotation, overlays)
+        # bumps `version`, so cached renders know they are stale. Private
+        # attributes are caches and do not count.
+        object.__setattr__(self, name, value)
+        if not name.startswith('_'):
+            object.__setattr__(self, '_version', getattr(self, '_version', 0) + 1)
+            
+    @property
+    def version(self):
+        """Render state version, including edits of the pipeline stages."""
+        return self._version + self.pipeline.version
+            
     def __init__(self):
         # Image transformation states
         self.flip_horizontal = False
@@ -10,39 +31,181 @@ class ImageProcessor:
         self.rotation = 0  # 0, 90, 180, 270 degrees
         self.draw_temp = True
         
-        # Initialize colormap settings
-        self.colormaps = [
-            ('NO_MAP', None),
-            ('JET', cv2.COLORMAP_JET),
-            ('HOT', cv2.COLORMAP_HOT),
-            ('INFERNO', cv2.COLORMAP_INFERNO),
-            ('PLASMA', cv2.COLORMAP_PLASMA),
-            ('VIRIDIS', cv2.COLORMAP_VIRIDIS),
-            ('MAGMA', cv2.COLORMAP_MAGMA),
-            ('RAINBOW', cv2.COLORMAP_RAINBOW),
-            ('BONE', cv2.COLORMAP_BONE),
-        ]
+        # Digital zoom: only the sensor region of 1/zoom the size around
+        # zoom_center (sensor pixels, None for the middle) is processed
+        # and displayed. With zoom_contrast the AGC uses that region only,
+        # otherwise the whole frame.
+        self.zoom = 1.0
+        self.zoom_center = None
+        self.zoom_contrast = True
+        self._sensor_shape = None
+        self._crop = None
+        
+        # Optional 3x3 median denoise; the quality governor may suspend it
+        self.denoise = False
+        self.denoise_allowed = True
+        
+        # Contrast: 'minmax' stretch or plateau 'histogram' equalization, the
+        # latter sharing its raw histogram with the histogram panel
+        self.agc = 'minmax'
+        self.histogram = RawHistogram()
+        
+        # Isotherm bands (IsothermBand) highlighted using the temperature LUT
+        # of the current frame, set through set_lut()
+        self.isotherms = []
+        self._lut = None
+        self._lut_version = None
+        
+        # Initialize colormap settings: (name, 256x1 BGR table) pairs, built-in
+        # maps first, then the custom ones from the config directory
+        self.colormaps = load_colormaps()
         self.current_colormap_idx = 0
         
+        # agc/normalize -> denoise -> colormap -> isotherm -> transform -> overlay,
+        # each stage writing into a buffer of its own reused frame after frame
+        self.pipeline = FramePipeline([
+            HistogramAGCStage(self),
+            NormalizeStage(self),
+            DenoiseStage(self),
+            ColormapStage(self),
+            IsothermStage(self),
+            TransformStage(self),
+            OverlayStage(self),
+        ])
+        
+    @property
+    def lut(self):
+        return self._lut
+        
+    @property
+    def lut_version(self):
+        return self._lut_version
+        
+    def set_lut(self, lut, version=None):
+        """Use the temperature LUT of the frames being processed (for isotherms)."""
+        self._lut = lut
+        self._lut_version = id(lut) if version is None else version
+        
     def process_frame(self, frame, info=None):
-        """Process a frame with current transformations and colormap."""
+        """Process a raw (uint16) or normalized (uint8) frame with the current settings.
+
+        The result is the pipeline's output buffer and is overwritten by the
+        next call; copy it to keep it.
+        """
         if frame is None:
             return None
-            
-        # Apply colormap
-        if self.colormaps[self.current_colormap_idx][1] is not None:
-            frame = cv2.applyColorMap(frame, self.colormaps[self.current_colormap_idx][1])
+        self._sensor_shape = frame.shape[:2]
+        x0, y0, w, h = self._crop = self.crop_rect(frame.shape)
+        if (w, h) == (frame.shape[1], frame.shape[0]):
+            self.pipeline.contrast_source = None
+            return self.pipeline.process(frame, info)
+        
+        # Crop as a view; the stages only ever see the zoomed pixels
+        self.pipeline.contrast_source = None if self.zoom_contrast else frame
+        if info is not None:
+            info = dict(info)
+            for name in ('Tmin', 'Tmax', 'Tcenter'):
+                x, y = info[name + '_point']
+                inside = x0 <= x < x0 + w and y0 <= y < y0 + h
+                info[name + '_point'] = (x - x0, y - y0) if inside else None
+            if info.get('hotspots'):
+                info['hotspots'] = [spot._replace(x=spot.x - x0, y=spot.y - y0) for spot in info['hotspots']
+                                    if x0 <= spot.x < x0 + w and y0 <= spot.y < y0 + h]
+        return self.pipeline.process(frame[y0:y0 + h, x0:x0 + w], info)
+        
+    def crop_rect(self, shape):
+        """(x0, y0, width, height) of the zoomed sensor region of a frame of `shape`."""
+        height, width = shape[:2]
+        if self.zoom <= 1.0:
+            return 0, 0, width, height
+        w = min(max(int(round(width / self.zoom)), self.MIN_CROP), width)
+        h = min(max(int(round(height / self.zoom)), self.MIN_CROP), height)
+        cx, cy = self.zoom_center if self.zoom_center is not None else (width / 2, height / 2)
+        x0 = min(max(int(round(cx - w / 2)), 0), width - w)
+        y0 = min(max(int(round(cy - h / 2)), 0), height - h)
+        return x0, y0, w, h
+        
+    def to_display(self, x, y, w, h, edge=1):
+        """A point of a w x h image in sensor orientation, in the flipped and
+        rotated image (edge=0 for continuous coordinates)."""
+        if self.flip_horizontal:
+            x = w - edge - x
+        if self.flip_vertical:
+            y = h - edge - y
+        if self.rotation == 90:
+            x, y = h - edge - y, x
+        elif self.rotation == 180:
+            x, y = w - edge - x, h - edge - y
+        elif self.rotation == 270:
+            x, y = y, w - edge - x
+        return x, y
+        
+    def to_sensor(self, x, y, w, h, edge=1):
+        """Inverse of to_display(): a displayed point back in sensor orientation."""
+        if self.rotation == 90:
+            x, y = y, h - edge - x
+        elif self.rotation == 180:
+            x, y = w - edge - x, h - edge - y
+        elif self.rotation == 270:
+            x, y = w - edge - y, x
+        if self.flip_vertical:
+            y = h - edge - y
+        if self.flip_horizontal:
+            x = w - edge - x
+        return x, y
+        
+    def display_to_sensor(self, x, y):
+        """Sensor pixel coordinates of a point of the last displayed frame."""
+        x0, y0, w, h = self._crop
+        x, y = self.to_sensor(x, y, w, h, edge=0)
+        return x0 + x, y0 + y
+        
+    @property
+    def crop(self):
+        """(x0, y0, width, height) of the sensor region last processed, None before the first frame."""
+        return self._crop
+        
+    def sensor_to_display(self, x, y):
+        """Inverse of display_to_sensor(): a sensor point in the last displayed frame."""
+        x0, y0, w, h = self._crop
+        return self.to_display(x - x0, y - y0, w, h, edge=0)
+        
+    def zoom_at(self, zoom, point=None):
+        """Zoom keeping the sensor point under `point` (displayed frame pixels,
+        None for the middle) where it is."""
+        zoom = min(max(zoom, 1.0), self.MAX_ZOOM)
+        if self._crop is None:
+            self.zoom = zoom
+            return
+        height, width = self._sensor_shape
+        x0, y0, w, h = self._crop
+        if point is None:
+            sx, sy = x0 + w / 2, y0 + h / 2
         else:
-            frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
-            
-        # Apply transformations
-        frame = self.apply_transformations(frame)
+            sx, sy = self.display_to_sensor(*point)
+        fx, fy = (sx - x0) / w, (sy - y0) / h
+        new_w, new_h = width / zoom, height / zoom
+        self.zoom_center = self._clamp_center(sx + (0.5 - fx) * new_w, sy + (0.5 - fy) * new_h, zoom)
+        self.zoom = zoom
         
-        # Draw temperature points if enabled and info is provided
-        if self.draw_temp and info is not None:
-            frame = self.draw_temperature_points(frame, info)
-            
-        return frame
+    def pan_by(self, dx, dy):
+        """Move the zoomed region so the image follows a drag of (dx, dy) displayed frame pixels."""
+        if self._crop is None or self.zoom <= 1.0:
+            return
+        x0, y0, w, h = self._crop
+        # Linear part of the display to sensor mapping
+        ox, oy = self.to_sensor(0, 0, w, h, edge=0)
+        sx, sy = self.to_sensor(dx, dy, w, h, edge=0)
+        self.zoom_center = self._clamp_center(x0 + w / 2 - (sx - ox), y0 + h / 2 - (sy - oy), self.zoom)
+        
+    def reset_zoom(self):
+        self.zoom = 1.0
+        self.zoom_center = None
+        
+    def _clamp_center(self, cx, cy, zoom):
+        height, width = self._sensor_shape
+        half_w, half_h = width / zoom / 2, height / zoom / 2
+        return min(max(cx, half_w), width - half_w), min(max(cy, half_h), height - half_h)
         
     def apply_transformations(self, frame):
         """Apply current geometric transformations to the frame."""
@@ -62,38 +225,27 @@ class ImageProcessor:
         
     def draw_temperature_points(self, frame, info):
         """Draw temperature points on the frame."""
-        # Transform temperature point coordinates based on transformations
-        tmin_point = list(info['Tmin_point'])
-        tmax_point = list(info['Tmax_point'])
-        tcenter_point = list(info['Tcenter_point'])
-        
-        shape0, shape1 = frame.shape[1], frame.shape[0]
+        # Points are in sensor orientation (of the zoomed region); map them
+        # through the flips and rotation. Points outside the zoomed region are None.
+        w, h = frame.shape[1], frame.shape[0]
         if self.rotation in [90, 270]:
-            shape0, shape1 = shape1, shape0
+            w, h = h, w
             
-        if self.flip_horizontal:
-            tmin_point[0] = shape0 - tmin_point[0]
-            tmax_point[0] = shape0 - tmax_point[0]
-            tcenter_point[0] = shape0 - tcenter_point[0]
-            
-        if self.flip_vertical:
-            tmin_point[1] = shape1 - tmin_point[1]
-            tmax_point[1] = shape1 - tmax_point[1]
-            tcenter_point[1] = shape1 - tcenter_point[1]
+        for name, color in (('Tmin', (55,0,0)), ('Tmax', (0,0,85)), ('Tcenter', (0,255,255))):
+            point = info[name + '_point']
+            if point is None:
+                continue
+            if name == 'Tmax' and any(abs(s.x - point[0]) <= 3 and abs(s.y - point[1]) <= 3
+                                      for s in info.get('hotspots', ())):
+                # The hotspot marked there already shows it
+                continue
+            x, y = self.to_display(point[0], point[1], w, h)
+            drawTemperature(frame, (int(x), int(y)), info[name + '_C'], color)
             
-        if self.rotation != 0:
-            for point in [tmin_point, tmax_point, tcenter_point]:
-                if self.rotation == 90:
-                    point[0], point[1] = frame.shape[1] - point[1], point[0]
-                elif self.rotation == 180:
-                    point[0] = frame.shape[1] - point[0]
-                    point[1] = frame.shape[0] - point[1]
-                elif self.rotation == 270:
-                    point[0], point[1] = point[1], frame.shape[0] - point[0]
-                    
-        drawTemperature(frame, tuple(tmin_point), info['Tmin_C'], (55,0,0))
-        drawTemperature(frame, tuple(tmax_point), info['Tmax_C'], (0,0,85))
-        drawTemperature(frame, tuple(tcenter_point), info['Tcenter_C'], (0,255,255))
+        # Tracked hotspots (hotspots.py), labelled with their ids
+        for hotspot in info.get('hotspots', ()):
+            x, y = self.to_display(hotspot.x, hotspot.y, w, h)
+            drawTemperature(frame, (int(x), int(y)), hotspot.temperature, (0, 128, 255), '#%d' % hotspot.id)
         
         return frame
         
@@ -0,0 +1,61 @@
+import os
+import time
+
+
+class FrameStats:
+    """Lightweight per-frame counters and timings for the frame loop.
+
+    Reporting is off unless the HT301_STATS environment variable is set (to
+    the report interval in seconds, or 1 for the default of 5 seconds); the
+    counters themselves are always kept so the UI can show them.
+    """
+    def __init__(self, interval=None):
+        if interval is None:
+            value = os.environ.get('HT301_STATS')
+            try:
+                interval = float(value) if value else 0.0
+            except ValueError:
+                interval = 0.0
+            if interval == 1.0:
+                interval = 5.0
+        self.interval = interval
+        self.counters = {}
+        self.timings = {}
+        self.values = {}
+        self._last_report = time.monotonic()
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_time(self, name, seconds):
+        total, n = self.timings.get(name, (0.0, 0))
+        self.timings[name] = (total + seconds, n + 1)
+
+    def set_value(self, name, value):
+        self.values[name] = value
+
+    def rate(self, part, whole):
+        """Fraction of `whole` events that were `part` events."""
+        total = self.counters.get(whole, 0)
+        return self.counters.get(part, 0) / total if total else 0.0
+
+    def maybe_report(self, now=None):
+        """Print and reset the counters if reporting is on and the interval elapsed."""
+        if not self.interval:
+            return False
+        now = time.monotonic() if now is None else now
+        elapsed = now - self._last_report
+        if elapsed < self.interval:
+            return False
+
+        parts = [f"{name}={n / elapsed:.1f}/s" for name, n in sorted(self.counters.items())]
+        if 'frames' in self.counters and 'skipped' in self.counters:
+            parts.append(f"skip_rate={self.rate('skipped', 'frames'):.0%}")
+        parts += [f"{name}={total / n * 1000:.2f}ms" for name, (total, n) in sorted(self.timings.items()) if n]
+        parts += [f"{name}={value}" for name, value in sorted(self.values.items())]
+        print("stats: " + " ".join(parts))
+
+        self.counters.clear()
+        self.timings.clear()
+        self._last_report = now
+        return True
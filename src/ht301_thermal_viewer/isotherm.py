@@ -0,0 +1,104 @@
+import json
+import cv2
+import numpy as np
+from collections import namedtuple
+
+from .footer import celsius_to_raw
+from .pipeline import Stage
+from .utils import get_config_dir
+
+# A temperature band in degrees Celsius: low=None means "below high", high=None
+# means "above low". Colours are BGR; alpha 1 paints the band opaque.
+IsothermBand = namedtuple('IsothermBand', ['low', 'high', 'color', 'alpha'],
+                          defaults=(None, None, (255, 0, 255), 0.6))
+
+
+def load_isotherms(path=None):
+    """Load bands from isotherms.json in the config directory, if present.
+
+        {"bands": [{"above": 60, "color": [0, 0, 255]},
+                   {"low": 30, "high": 37, "color": [0, 255, 0], "alpha": 0.4}]}
+    """
+    path = path or get_config_dir() / 'isotherms.json'
+    try:
+        with open(str(path)) as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        return []
+    except Exception as e:
+        print(f"Error loading isotherms from {path}: {e}")
+        return []
+
+    bands = []
+    for spec in config.get('bands', []):
+        low = spec.get('low', spec.get('above'))
+        high = spec.get('high', spec.get('below'))
+        if low is None and high is None:
+            print(f"Ignoring isotherm without limits: {spec}")
+            continue
+        bands.append(IsothermBand(low, high, tuple(spec.get('color', (255, 0, 255))),
+                                  float(spec.get('alpha', 0.6))))
+    return bands
+
+
+class IsothermStage(Stage):
+    """Highlight the pixels whose temperature falls in the processor's isotherm bands.
+
+    Band limits are converted to raw counts through the current LUT (it is
+    monotonic) whenever the LUT or the bands change, so each frame costs one
+    cv2.inRange over the raw uint16 image per band and a masked blend of the
+    band colour over the colormapped buffer. The stage runs in sensor
+    orientation, before flips and rotation.
+    """
+    name = 'isotherm'
+    in_place = True
+
+    def __init__(self, processor, name=None):
+        super().__init__(name)
+        self.processor = processor
+        self._key = None
+        self._bands = []
+        self._mask = None
+        self._blend = None
+
+    def active(self, src, info):
+        raw = self.processor.pipeline.source
+        return (bool(self.processor.isotherms) and self.processor.lut is not None
+                and raw is not None and raw.dtype == np.uint16
+                and src.ndim == 3 and src.shape[:2] == raw.shape[:2])
+
+    def thresholds(self):
+        """(low, high) inclusive raw limits of each band, or None for empty bands."""
+        lut = self.processor.lut
+        limits = []
+        for band in self.processor.isotherms:
+            low = 0 if band.low is None else int(celsius_to_raw(lut, band.low, side='left'))
+            high = len(lut) if band.high is None else int(celsius_to_raw(lut, band.high, side='right'))
+            limits.append((low, high - 1) if low < high else None)
+        return limits
+
+    def _refresh(self, shape):
+        self._bands = []
+        for band, limits in zip(self.processor.isotherms, self.thresholds()):
+            if limits is None:
+                continue
+            color = np.empty(shape, dtype=np.uint8)
+            color[:] = band.color
+            self._bands.append((limits[0], limits[1], color, min(max(band.alpha, 0.0), 1.0)))
+        self._mask = np.empty(shape[:2], dtype=np.uint8)
+        self._blend = np.empty(shape, dtype=np.uint8)
+
+    def run(self, src, dst, info):
+        key = (self.processor.lut_version, tuple(self.processor.isotherms), dst.shape)
+        if key != self._key:
+            self._refresh(dst.shape)
+            self._key = key
+
+        raw = self.processor.pipeline.source
+        for low, high, color, alpha in self._bands:
+            cv2.inRange(raw, low, high, self._mask)
+            if alpha >= 1.0:
+                cv2.copyTo(color, self._mask, dst)
+            else:
+                cv2.addWeighted(dst, 1.0 - alpha, color, alpha, 0.0, self._blend)
+                cv2.copyTo(self._blend, self._mask, dst)
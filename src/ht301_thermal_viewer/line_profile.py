@@ -0,0 +1,78 @@
+"""Temperature profile along a line of the sensor.
+
+The segment is given in sensor pixel coordinates, so it stays on the same
+part of the scene whatever the zoom, flips and rotation of the view. For
+each sample the flat indices of its four neighbouring pixels and their
+bilinear weights are computed once per line; sampling a frame is then a
+gather of 4 x N raw counts, a weighted sum and a LUT lookup interpolated
+between neighbouring raw levels.
+"""
+import numpy as np
+
+
+class LineProfile:
+    """Bilinearly interpolated temperatures along a segment, one sample per pixel of length."""
+    def __init__(self):
+        self.start = None
+        self.end = None
+        # Distance of each sample from the start, in sensor pixels
+        self.distance = None
+        self.temperatures = None
+        self._key = None
+        self._index = None
+        self._weights = None
+        self._corners = None
+
+    @property
+    def active(self):
+        return self.start is not None and self.end is not None
+
+    def set_line(self, start, end):
+        self.start = (float(start[0]), float(start[1]))
+        self.end = (float(end[0]), float(end[1]))
+
+    def clear(self):
+        self.start = self.end = None
+        self.temperatures = None
+
+    def length(self):
+        return float(np.hypot(self.end[0] - self.start[0], self.end[1] - self.start[1]))
+
+    def _prepare(self, shape):
+        """Sample coordinates for the current line; only recomputed when it or the frame size changes."""
+        key = (self.start, self.end, shape)
+        if key == self._key:
+            return
+        height, width = shape
+        length = self.length()
+        n = max(int(np.ceil(length)) + 1, 2)
+        t = np.linspace(0.0, 1.0, n)
+        xs = np.clip(self.start[0] + t * (self.end[0] - self.start[0]), 0, width - 1)
+        ys = np.clip(self.start[1] + t * (self.end[1] - self.start[1]), 0, height - 1)
+        # Top left neighbour; on the last row/column the weight of the next one is 0
+        x0 = np.minimum(np.floor(xs).astype(np.intp), width - 2)
+        y0 = np.minimum(np.floor(ys).astype(np.intp), height - 2)
+        fx, fy = xs - x0, ys - y0
+        top_left = y0 * width + x0
+        self._index = np.stack([top_left, top_left + 1, top_left + width, top_left + width + 1], axis=1)
+        self._weights = np.stack([(1 - fx) * (1 - fy), fx * (1 - fy), (1 - fx) * fy, fx * fy], axis=1)
+        self._corners = np.empty(self._index.shape, dtype=np.uint16)
+        self.distance = t * length
+        self._key = key
+
+    def sample(self, visible, lut):
+        """Temperatures in °C along the line in a visible raw frame (H, W)."""
+        if not self.active:
+            return None
+        raw = self.raw_values(visible)
+        # The LUT is sampled at integer raw levels: interpolate between them
+        low = np.minimum(raw.astype(np.intp), len(lut) - 2)
+        frac = raw - low
+        self.temperatures = lut[low] + frac * (lut[low + 1] - lut[low])
+        return self.temperatures
+
+    def raw_values(self, visible):
+        """Bilinearly interpolated raw counts along the line."""
+        self._prepare(visible.shape)
+        np.take(visible.reshape(-1), self._index, out=self._corners)
+        return np.einsum('ij,ij->i', self._corners, self._weights)
@@ -0,0 +1,140 @@
+import gi
+from gi.repository import Gtk, GLib
+import numpy as np
+
+from .line_profile import LineProfile
+
+class LineProfilePanel(Gtk.Box):
+    """Live plot of the temperature along a line dragged on the view.
+
+    While the tool is active, dragging on the view sets the line (stored in
+    sensor coordinates) instead of moving the window; the segment is drawn
+    over the view and the plot is resampled from the last displayed frame on
+    the panel's own timer.
+    """
+    def __init__(self, window, interval_ms=100):
+        super().__init__(orientation=Gtk.Orientation.VERTICAL)
+        self.window = window
+        self.interval_ms = interval_ms
+        self.profile = LineProfile()
+        self.temperatures = None
+        self._timer = None
+        self._drag_start = None
+
+        self.set_halign(Gtk.Align.END)
+        self.set_valign(Gtk.Align.START)
+        self.set_margin_end(16)
+        self.set_margin_top(80)
+        self.add_css_class("line-profile-panel")
+
+        self.drawing_area = Gtk.DrawingArea()
+        self.drawing_area.set_content_width(260)
+        self.drawing_area.set_content_height(110)
+        self.drawing_area.set_draw_func(self.on_draw)
+        self.append(self.drawing_area)
+
+        self.stats_label = Gtk.Label(label="Drag on the image to draw a line")
+        self.stats_label.set_halign(Gtk.Align.START)
+        self.stats_label.add_css_class("line-profile-stats")
+        self.append(self.stats_label)
+
+        self.set_visible(False)
+        window.thermal_view.annotations.append(self.draw_line)
+
+    @property
+    def active(self):
+        return self.get_visible()
+
+    def show_panel(self, visible):
+        self.set_visible(visible)
+        if visible and self._timer is None:
+            self.refresh()
+            self._timer = GLib.timeout_add(self.interval_ms, self.refresh)
+        elif not visible and self._timer is not None:
+            GLib.source_remove(self._timer)
+            self._timer = None
+        self.window.thermal_view.drawing_area.queue_draw()
+
+    def begin_line(self, x, y):
+        """Start a line at a point of the drawing area."""
+        self._drag_start = self._to_sensor(x, y)
+
+    def extend_line(self, x, y):
+        end = self._to_sensor(x, y)
+        if self._drag_start is None or end is None:
+            return
+        self.profile.set_line(self._drag_start, end)
+        self.refresh()
+        self.window.thermal_view.drawing_area.queue_draw()
+
+    def _to_sensor(self, x, y):
+        point = self.window.thermal_view.widget_to_frame(x, y)
+        if point is None or self.window.image_processor.crop is None:
+            return None
+        return self.window.image_processor.display_to_sensor(*point)
+
+    def refresh(self):
+        try:
+            raw = self.window.last_visible
+            lut = self.window.camera_manager.lut
+            if raw is None or lut is None or not self.profile.active:
+                return True
+            self.temperatures = self.profile.sample(raw, lut)
+            hottest = int(np.argmax(self.temperatures))
+            self.stats_label.set_text(
+                f"min {self.temperatures.min():.1f}°C  max {self.temperatures[hottest]:.1f}°C  "
+                f"mean {self.temperatures.mean():.1f}°C\n"
+                f"length {self.profile.length():.0f} px, hottest at {self.profile.distance[hottest]:.0f} px")
+            self.drawing_area.queue_draw()
+        except Exception as e:
+            print(f"Error updating line profile: {e}")
+        return True
+
+    def draw_line(self, cr, scale):
+        """Draw the segment over the view (a ThermalView annotation)."""
+        processor = self.window.image_processor
+        if not self.active or not self.profile.active or processor.crop is None:
+            return
+        start = processor.sensor_to_display(*self.profile.start)
+        end = processor.sensor_to_display(*self.profile.end)
+        cr.set_line_width(2.0 / scale)
+        cr.set_source_rgba(1.0, 1.0, 1.0, 0.9)
+        cr.move_to(*start)
+        cr.line_to(*end)
+        cr.stroke()
+        # Hottest sample
+        if self.temperatures is not None and len(self.temperatures) == len(self.profile.distance):
+            t = np.argmax(self.temperatures) / max(len(self.temperatures) - 1, 1)
+            x = self.profile.start[0] + t * (self.profile.end[0] - self.profile.start[0])
+            y = self.profile.start[1] + t * (self.profile.end[1] - self.profile.start[1])
+            cr.set_source_rgba(1.0, 0.2, 0.2, 0.9)
+            cr.arc(*processor.sensor_to_display(x, y), 3.0 / scale, 0, 2 * np.pi)
+            cr.fill()
+
+    def on_draw(self, drawing_area, cr, width, height):
+        temps = self.temperatures
+        if temps is None or len(temps) < 2:
+            return
+        label_height = 12
+        plot_height = height - label_height
+        low, high = float(temps.min()), float(temps.max())
+        if high - low < 0.5:
+            low, high = low - 0.25, high + 0.25
+
+        # Temperature against the distance along the line
+        xs = np.linspace(0, width, len(temps))
+        ys = plot_height - (temps - low) / (high - low) * plot_height
+        cr.set_source_rgba(1.0, 1.0, 1.0, 0.9)
+        cr.set_line_width(1.5)
+        cr.move_to(xs[0], ys[0])
+        for x, y in zip(xs[1:], ys[1:]):
+            cr.line_to(x, y)
+        cr.stroke()
+
+        # Range of the plot below it
+        cr.set_font_size(10)
+        cr.move_to(0, height - 2)
+        cr.show_text(f"{low:.1f}°C")
+        text = f"{high:.1f}°C"
+        cr.move_to(width - cr.text_extents(text).x_advance, height - 2)
+        cr.show_text(text)
@@ -1,9 +1,16 @@
 #!/usr/bin/python3
+import argparse
+from pathlib import Path
 from .app import ThermalCameraApp
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HT301 thermal camera viewer.")
+    parser.add_argument('recording', nargs='?', help="play a .raw recording instead of opening the camera")
+    args = parser.parse_args(argv)
+    
     try:
-        app = ThermalCameraApp()
+        playback_path = str(Path(args.recording).resolve()) if args.recording else None
+        app = ThermalCameraApp(playback_path)
         return app.run(None)
     except Exception as e:
         print(f"Error starting application: {e}")
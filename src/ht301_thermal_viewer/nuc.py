@@ -0,0 +1,228 @@
+#!/usr/bin/python3
+"""Non-uniformity correction: automatic shutter calibration and flat field.
+
+ShutterScheduler triggers the camera's shutter calibration when the image
+is likely to have drifted since the last one: the FPA or core temperature
+moved, or the fixed-pattern noise (column and row stripes) grew. It never
+calibrates while the caller is busy (recording), so no frames freeze then.
+
+FlatField is an optional software correction on top of it, computed from
+frames of a uniform scene:
+
+    python3 -m ht301_thermal_viewer.nuc --frames 50              # one point: offsets
+    python3 -m ht301_thermal_viewer.nuc --frames 50 --two-point  # cold and hot scene: gains too
+"""
+import time
+import argparse
+import functools
+import cv2
+import numpy as np
+
+from .footer import decode_footer, split_frame
+from .bad_pixels import device_id
+from .utils import get_config_dir
+
+
+def pattern_noise(visible, width=9):
+    """Fixed-pattern noise estimate in raw counts: the column and row mean
+    stripes left after removing their smooth trend."""
+    noise = 0.0
+    for axis in (0, 1):
+        means = visible.mean(axis=axis, dtype=np.float32).reshape(1, -1)
+        stripes = means - cv2.blur(means, (width, 1), borderType=cv2.BORDER_REFLECT)
+        noise = max(noise, float(stripes.std()))
+    return noise
+
+
+class ShutterScheduler:
+    """Decide when to trigger the shutter calibration from the footer telemetry.
+
+    The reference FPA/core temperatures and pattern noise are taken
+    `settle_s` seconds after each calibration (automatic or manual). A new
+    one is due when the FPA temperature moved by `fpa_drift_C`, the core
+    temperature by `core_drift_C`, or the pattern noise grew by
+    `noise_growth` times (and by at least `noise_min` counts); but never
+    sooner than `min_interval_s` after the last one, and at least every
+    `max_interval_s`. Checks run every `check_every` frames.
+    """
+    def __init__(self, camera_manager, fpa_drift_C=0.5, core_drift_C=1.0, noise_growth=1.5,
+                 noise_min=2.0, min_interval_s=20.0, max_interval_s=600.0, settle_s=2.0, check_every=5):
+        self.camera_manager = camera_manager
+        self.enabled = True
+        self.fpa_drift_C = fpa_drift_C
+        self.core_drift_C = core_drift_C
+        self.noise_growth = noise_growth
+        self.noise_min = noise_min
+        self.min_interval_s = min_interval_s
+        self.max_interval_s = max_interval_s
+        self.settle_s = settle_s
+        self.check_every = check_every
+        self.reference = None
+        self.reason = None
+        self.triggered = 0
+        self._calibrations = None
+        self._frames = 0
+
+    def update(self, frame_raw, now=None, busy=False):
+        """Check one frame; triggers the calibration and returns True when it is due."""
+        self._frames += 1
+        if not self.enabled or self._frames % self.check_every:
+            return False
+        now = time.monotonic() if now is None else now
+        camera = self.camera_manager
+        if self._calibrations != camera.calibrations:
+            # A calibration ran (ours or the button's): take a new reference once settled
+            self._calibrations = camera.calibrations
+            self.reference = None
+        last = camera.last_calibration or 0.0
+        if now - last < self.settle_s:
+            return False
+
+        visible, meta = split_frame(frame_raw)
+        fields = decode_footer(meta)
+        state = (float(fields['fpatmp_C']), float(fields['coretmp_C']), pattern_noise(visible))
+        if self.reference is None:
+            self.reference = state
+            return False
+
+        self.reason = self._reason(state, now - last)
+        if self.reason is None or busy or now - last < self.min_interval_s:
+            return False
+        print(f"Automatic calibration: {self.reason}")
+        camera.calibrate()
+        self.triggered += 1
+        return True
+
+    def _reason(self, state, elapsed):
+        fpa, core, noise = state
+        fpa0, core0, noise0 = self.reference
+        if abs(fpa - fpa0) >= self.fpa_drift_C:
+            return f"FPA temperature drifted {fpa - fpa0:+.2f}°C"
+        if abs(core - core0) >= self.core_drift_C:
+            return f"core temperature drifted {core - core0:+.2f}°C"
+        if noise > noise0 * self.noise_growth and noise - noise0 >= self.noise_min:
+            return f"pattern noise grew from {noise0:.1f} to {noise:.1f}"
+        if elapsed >= self.max_interval_s:
+            return f"{elapsed:.0f}s since the last calibration"
+        return None
+
+
+def flat_field_path(device_strings):
+    return get_config_dir() / 'flat_field' / f"{device_id(device_strings)}.npz"
+
+
+class FlatField:
+    """Per-pixel gain and offset: corrected = raw * gain + offset.
+
+    correct() works in place through a preallocated float32 buffer, with
+    OpenCV rounding and saturating the result back to uint16.
+    """
+    def __init__(self, gain, offset):
+        self.gain = np.asarray(gain, dtype=np.float32)
+        self.offset = np.asarray(offset, dtype=np.float32)
+        self._buffer = np.empty(self.gain.shape, dtype=np.float32)
+
+    @classmethod
+    def from_references(cls, cold, hot=None):
+        """Compute the correction from mean frames of uniform scenes.
+
+        With one reference only the offsets are corrected; with a second,
+        hotter one the gains map both to their frame means.
+        """
+        cold = np.asarray(cold, dtype=np.float64)
+        if hot is None:
+            gain = np.ones(cold.shape)
+        else:
+            hot = np.asarray(hot, dtype=np.float64)
+            if hot.mean() - cold.mean() < 10.0:
+                raise ValueError("the hot reference must be warmer than the cold one")
+            span = hot - cold
+            # Pixels that did not respond (bad pixels) keep a gain of 1
+            responding = span >= 1.0
+            gain = np.where(responding, (hot.mean() - cold.mean()) / np.where(responding, span, 1.0), 1.0)
+        offset = cold.mean() - gain * cold
+        return cls(gain, offset)
+
+    def correct(self, visible):
+        if visible.shape != self.gain.shape:
+            return visible
+        cv2.multiply(visible, self.gain, self._buffer, dtype=cv2.CV_32F)
+        cv2.add(self._buffer, self.offset, visible, dtype=cv2.CV_16U)
+        return visible
+
+    def save(self, path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(str(path), gain=self.gain, offset=self.offset)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(str(path)) as data:
+            return cls(data['gain'], data['offset'])
+
+
+def load_flat_field(device_strings):
+    """The saved flat field of a camera, or None."""
+    path = flat_field_path(device_strings)
+    if not path.exists():
+        return None
+    try:
+        flat_field = FlatField.load(path)
+        print(f"Loaded flat field from {path}")
+        return flat_field
+    except Exception as e:
+        print(f"Error loading flat field {path}: {e}")
+        return None
+
+
+def capture_mean(camera_manager, frames):
+    """Mean visible frame over `frames` frames."""
+    total = None
+    for _ in range(frames):
+        ret, frame, frame_raw = camera_manager.read_raw()
+        if not ret:
+            raise RuntimeError("capture failed")
+        visible = split_frame(frame_raw)[0]
+        if total is None:
+            total = np.zeros(visible.shape, dtype=np.float64)
+        total += visible
+    return total / frames
+
+
+def main(argv=None):
+    from .camera_manager import CameraManager
+    from .raw_reader import ReplayDevice
+
+    parser = argparse.ArgumentParser(description="Capture a flat-field correction for an HT301.")
+    parser.add_argument('--frames', type=int, default=50, help="frames averaged per reference")
+    parser.add_argument('--two-point', action='store_true', help="also capture a hot reference for the gains")
+    parser.add_argument('--replay', help="use a .raw recording instead of the camera")
+    args = parser.parse_args(argv)
+
+    if args.replay:
+        camera_manager = CameraManager(functools.partial(ReplayDevice, args.replay, realtime=False))
+    else:
+        camera_manager = CameraManager()
+    if not camera_manager.initialize():
+        return 1
+    # References are taken on uncorrected frames, right after a shutter calibration
+    camera_manager.correct_flat_field = False
+    try:
+        camera_manager.calibrate()
+        time.sleep(2.0)
+        input("Point the camera at a uniform scene and press Enter...")
+        cold = capture_mean(camera_manager, args.frames)
+        hot = None
+        if args.two_point:
+            input("Point the camera at a warmer uniform scene and press Enter...")
+            hot = capture_mean(camera_manager, args.frames)
+        flat_field = FlatField.from_references(cold, hot)
+        path = flat_field_path(camera_manager.cap.device_strings)
+        flat_field.save(path)
+    finally:
+        camera_manager.release()
+    print(f"Saved flat field to {path}")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
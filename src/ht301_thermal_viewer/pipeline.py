@@ -0,0 +1,360 @@
+#!/usr/bin/python3
+"""Frame processing pipeline with preallocated stage buffers.
+
+A FramePipeline runs a list of stages over each frame. Every stage declares
+the dtypes it accepts, the dtype it produces and the shape of its output for
+a given input shape; its output buffer is allocated on the first frame (or
+when the shape changes) and then reused through cv2 `dst=` / NumPy `out=`,
+so processing a steady stream of frames allocates no new arrays.
+
+The returned frame is the last stage's buffer and is overwritten by the next
+call; consumers that keep frames (recorder, snapshots) copy them.
+
+Run `python3 -m ht301_thermal_viewer.pipeline` to print the per-stage timings
+and check that steady-state processing does not allocate memory.
+"""
+import time
+import argparse
+import tracemalloc
+import cv2
+import numpy as np
+
+
+class Stage:
+    """One processing step. Subclasses implement run(src, dst, info)."""
+    name = 'stage'
+    accepts = (np.uint8,)
+    # None keeps the input dtype
+    out_dtype = None
+    # In-place stages draw into their input instead of a buffer of their own
+    in_place = False
+
+    def __init__(self, name=None):
+        if name is not None:
+            self.name = name
+        self._dst = None
+
+    def active(self, src, info):
+        """Inactive stages are skipped; their input is passed on unchanged."""
+        return True
+
+    def out_shape(self, in_shape):
+        return in_shape
+
+    def buffer(self, shape, dtype):
+        """Return this stage's output buffer, allocating it only when its spec changes."""
+        if self._dst is None or self._dst.shape != shape or self._dst.dtype != dtype:
+            self._dst = np.empty(shape, dtype=dtype)
+        return self._dst
+
+    def run(self, src, dst, info):
+        raise NotImplementedError
+
+
+class FramePipeline:
+    """An ordered, editable list of stages with per-stage timing."""
+    def __init__(self, stages=()):
+        self.stages = []
+        # name -> [total seconds, calls]
+        self.timings = {}
+        # Optional FrameStats receiving the stage times
+        self.stats = None
+        # Incremented on every change of the stage list
+        self.version = 0
+        # Frame given to the running process() call, for stages that need the raw data
+        self.source = None
+        # Frame the contrast stages take their range from, when not the input
+        # itself (the whole sensor while processing a zoomed crop of it)
+        self.contrast_source = None
+        for stage in stages:
+            self.append(stage)
+
+    def index(self, name):
+        for i, stage in enumerate(self.stages):
+            if stage.name == name:
+                return i
+        raise KeyError(name)
+
+    def __getitem__(self, name):
+        return self.stages[self.index(name)]
+
+    def __contains__(self, name):
+        return any(stage.name == name for stage in self.stages)
+
+    def insert(self, index, stage):
+        if stage.name in self:
+            raise ValueError(f"pipeline already has a stage named '{stage.name}'")
+        self.stages.insert(index, stage)
+        self.timings[stage.name] = [0.0, 0]
+        self.version += 1
+        return stage
+
+    def append(self, stage):
+        return self.insert(len(self.stages), stage)
+
+    def insert_before(self, name, stage):
+        return self.insert(self.index(name), stage)
+
+    def insert_after(self, name, stage):
+        return self.insert(self.index(name) + 1, stage)
+
+    def remove(self, name):
+        stage = self.stages.pop(self.index(name))
+        del self.timings[stage.name]
+        self.version += 1
+        return stage
+
+    def move(self, name, index):
+        self.stages.insert(index, self.stages.pop(self.index(name)))
+        self.version += 1
+
+    def validate(self, shape, dtype):
+        """Check that the stages chain for an input spec; returns the output (shape, dtype)."""
+        dtype = np.dtype(dtype)
+        for stage in self.stages:
+            if dtype not in [np.dtype(d) for d in stage.accepts]:
+                raise TypeError(f"stage '{stage.name}' does not accept {dtype} input")
+            if not stage.in_place:
+                shape = stage.out_shape(shape)
+                dtype = np.dtype(stage.out_dtype or dtype)
+        return shape, dtype
+
+    def process(self, frame, info=None):
+        """Run the active stages over a frame and return the output buffer."""
+        self.source = src = frame
+        for stage in self.stages:
+            if not stage.active(src, info):
+                continue
+            start = time.perf_counter()
+            if src.dtype not in stage.accepts:
+                raise TypeError(f"stage '{stage.name}' does not accept {src.dtype} input")
+            if stage.in_place:
+                if src is frame:
+                    # Never draw on the caller's frame
+                    src = stage.buffer(frame.shape, frame.dtype)
+                    np.copyto(src, frame)
+                stage.run(src, src, info)
+            else:
+                dst = stage.buffer(stage.out_shape(src.shape), stage.out_dtype or src.dtype)
+                stage.run(src, dst, info)
+                src = dst
+            elapsed = time.perf_counter() - start
+            timing = self.timings[stage.name]
+            timing[0] += elapsed
+            timing[1] += 1
+            if self.stats is not None:
+                self.stats.add_time('stage_' + stage.name, elapsed)
+        return src
+
+    def stage_times(self):
+        """Average milliseconds per call of each stage that ran."""
+        return {name: total / n * 1000.0 for name, (total, n) in self.timings.items() if n}
+
+    def reset_timings(self):
+        for timing in self.timings.values():
+            timing[0], timing[1] = 0.0, 0
+
+    def measure_allocations(self, frame, info=None, frames=200, warmup=20, process=None):
+        """Process `frames` frames under tracemalloc; returns (net bytes per frame, peak bytes).
+
+        `process` replaces self.process, e.g. by a processor's process_frame
+        that crops the frame first.
+
+        Peak is the largest amount of memory held at once above the starting
+        point, so a stage allocating a temporary frame shows up even though
+        the array is freed again. The few kilobytes of small Python objects
+        (point lists, text, NumPy iterator buffers) stay far below the size
+        of a frame.
+        """
+        process = self.process if process is None else process
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start()
+        try:
+            # Buffers and interpreter caches fill up during the warmup
+            for _ in range(warmup):
+                process(frame, info)
+            tracemalloc.reset_peak()
+            start, _ = tracemalloc.get_traced_memory()
+            for _ in range(frames):
+                process(frame, info)
+            end, peak = tracemalloc.get_traced_memory()
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+        return (end - start) / frames, peak - start
+
+
+class NormalizeStage(Stage):
+    """Stretch a raw 16-bit image to 8 bits between its min and max.
+
+    With a processor whose pipeline has a contrast_source, the min and max
+    are those of that frame instead.
+    """
+    name = 'normalize'
+    accepts = (np.uint16, np.uint8)
+    out_dtype = np.uint8
+
+    def __init__(self, processor=None, name=None):
+        super().__init__(name)
+        self.processor = processor
+
+    def active(self, src, info):
+        return src.dtype != np.uint8
+
+    def run(self, src, dst, info):
+        reference = self.processor.pipeline.contrast_source if self.processor is not None else None
+        if reference is None:
+            cv2.normalize(src, dst, 0, 255, cv2.NORM_MINMAX, cv2.CV_8U)
+            return
+        low, high = cv2.minMaxLoc(reference)[:2]
+        scale = 255.0 / (high - low) if high > low else 0.0
+        cv2.convertScaleAbs(src, dst, scale, -low * scale)
+
+
+class DenoiseStage(Stage):
+    """3x3 median filter, when enabled and allowed by the quality governor."""
+    name = 'denoise'
+
+    def __init__(self, processor, name=None):
+        super().__init__(name)
+        self.processor = processor
+
+    def active(self, src, info):
+        return self.processor.denoise and self.processor.denoise_allowed
+
+    def run(self, src, dst, info):
+        cv2.medianBlur(src, 3, dst)
+
+
+class ColormapStage(Stage):
+    """Map the 8-bit image to BGR through the selected colormap table."""
+    name = 'colormap'
+
+    def __init__(self, processor, name=None):
+        super().__init__(name)
+        self.processor = processor
+
+    def out_shape(self, in_shape):
+        return in_shape[:2] + (3,)
+
+    def run(self, src, dst, info):
+        lut = self.processor.colormaps[self.processor.current_colormap_idx][1]
+        if lut is None:
+            cv2.cvtColor(src, cv2.COLOR_GRAY2BGR, dst)
+        else:
+            # A precomputed table; cheaper than an enum, which OpenCV rebuilds per call
+            cv2.applyColorMap(src, lut, dst)
+
+
+class TransformStage(Stage):
+    """Flips and rotation by multiples of 90 degrees."""
+    name = 'transform'
+    accepts = (np.uint8, np.uint16)
+    ROTATE_CODES = {90: cv2.ROTATE_90_CLOCKWISE, 180: cv2.ROTATE_180, 270: cv2.ROTATE_90_COUNTERCLOCKWISE}
+
+    def __init__(self, processor, name=None):
+        super().__init__(name)
+        self.processor = processor
+        self._flipped = None
+
+    def _flip_code(self):
+        p = self.processor
+        if p.flip_horizontal and p.flip_vertical:
+            return -1
+        if p.flip_horizontal:
+            return 1
+        if p.flip_vertical:
+            return 0
+        return None
+
+    def active(self, src, info):
+        return self._flip_code() is not None or self.processor.rotation in self.ROTATE_CODES
+
+    def out_shape(self, in_shape):
+        if self.processor.rotation in (90, 270):
+            return (in_shape[1], in_shape[0]) + in_shape[2:]
+        return in_shape
+
+    def run(self, src, dst, info):
+        flip = self._flip_code()
+        rotate = self.ROTATE_CODES.get(self.processor.rotation)
+        if rotate is None:
+            cv2.flip(src, flip, dst)
+            return
+        if flip is not None:
+            if self._flipped is None or self._flipped.shape != src.shape or self._flipped.dtype != src.dtype:
+                self._flipped = np.empty_like(src)
+            cv2.flip(src, flip, self._flipped)
+            src = self._flipped
+        cv2.rotate(src, rotate, dst)
+
+
+class OverlayStage(Stage):
+    """Draw the Tmin/Tmax/Tcenter markers and readings."""
+    name = 'overlay'
+    in_place = True
+
+    def __init__(self, processor, name=None):
+        super().__init__(name)
+        self.processor = processor
+
+    def active(self, src, info):
+        return self.processor.draw_temp and info is not None
+
+    def run(self, src, dst, info):
+        self.processor.draw_temperature_points(dst, info)
+
+
+def _synthetic_frame(rng, height=288, width=384):
+    """A smooth raw image with a hot spot and the info dict of its readings."""
+    y, x = np.mgrid[0:height, 0:width]
+    frame = 7800 + 4 * x + 2 * y + 1500 * np.exp(-((x - 250) ** 2 + (y - 100) ** 2) / 400.0)
+    frame = (frame + rng.normal(0, 8, frame.shape)).astype(np.uint16)
+    tmin, tmax = np.unravel_index(frame.argmin(), frame.shape), np.unravel_index(frame.argmax(), frame.shape)
+    info = {
+        'Tmin_C': 18.5, 'Tmin_point': (int(tmin[1]), int(tmin[0])),
+        'Tmax_C': 64.25, 'Tmax_point': (int(tmax[1]), int(tmax[0])),
+        'Tcenter_C': 31.0, 'Tcenter_point': (width // 2, height // 2),
+    }
+    return frame, info
+
+
+def main(argv=None):
+    from .image_processor import ImageProcessor
+
+    parser = argparse.ArgumentParser(description="Time the frame pipeline and check its allocations.")
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--limit', type=int, default=16384,
+                        help="largest peak allocation in bytes accepted while processing "
+                             "(a frame is over 100 kB)")
+    args = parser.parse_args(argv)
+
+    frame, info = _synthetic_frame(np.random.default_rng(0))
+    configurations = [
+        ('default', {}),
+        ('colormap', {'current_colormap_idx': 3}),
+        ('denoise', {'denoise': True}),
+        ('histogram agc', {'agc': 'histogram'}),
+        ('flip+rotate', {'flip_horizontal': True, 'rotation': 90}),
+        ('no overlay', {'draw_temp': False, 'rotation': 180}),
+        ('zoom', {'zoom': 3.0, 'zoom_center': (250, 100), 'flip_vertical': True, 'rotation': 270}),
+        ('zoom full agc', {'zoom': 2.0, 'zoom_contrast': False, 'agc': 'histogram'}),
+    ]
+    failed = False
+    for label, settings in configurations:
+        processor = ImageProcessor()
+        for attr, value in settings.items():
+            setattr(processor, attr, value)
+        net, peak = processor.pipeline.measure_allocations(frame, info, args.frames,
+                                                           process=processor.process_frame)
+        times = ' '.join(f"{name}={ms:.3f}ms" for name, ms in processor.pipeline.stage_times().items())
+        # A leaked or temporary frame would exceed the limit on its own
+        ok = peak <= args.limit and net * args.frames <= args.limit
+        failed |= not ok
+        print(f"{label:15s} {'ok' if ok else 'FAIL':4s} net={net:.1f}B/frame peak={peak}B  {times}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,122 @@
+import gi
+from gi.repository import Gtk, GLib
+
+class PlaybackBar(Gtk.Box):
+    """Seek bar, frame stepping and speed for a recording played through a ReplayDevice.
+
+    The frames go through the window's usual capture loop and image
+    pipeline, so colormap, rotation and overlays apply to the recording as
+    they do to the camera. The bar polls the playback position on a timer.
+    """
+    def __init__(self, window, interval_ms=200):
+        super().__init__(orientation=Gtk.Orientation.HORIZONTAL, spacing=4)
+        self.window = window
+        self.interval_ms = interval_ms
+        self._timer = None
+
+        self.set_halign(Gtk.Align.FILL)
+        self.set_valign(Gtk.Align.START)
+        self.set_margin_top(84)
+        self.set_margin_start(16)
+        self.set_margin_end(16)
+        self.add_css_class("playback-bar")
+
+        step_back = Gtk.Button()
+        step_back.set_icon_name("media-skip-backward-symbolic")
+        step_back.add_css_class("flat")
+        step_back.connect("clicked", self._on_step, -1)
+        step_back.set_tooltip_text("Previous Frame")
+        self.append(step_back)
+
+        self.play_button = Gtk.Button()
+        self.play_button.set_icon_name("media-playback-pause-symbolic")
+        self.play_button.add_css_class("flat")
+        self.play_button.connect("clicked", self._on_play_clicked)
+        self.play_button.set_tooltip_text("Pause")
+        self.append(self.play_button)
+
+        step_forward = Gtk.Button()
+        step_forward.set_icon_name("media-skip-forward-symbolic")
+        step_forward.add_css_class("flat")
+        step_forward.connect("clicked", self._on_step, 1)
+        step_forward.set_tooltip_text("Next Frame")
+        self.append(step_forward)
+
+        self.scale = Gtk.Scale.new_with_range(Gtk.Orientation.HORIZONTAL, 0, 1, 1)
+        self.scale.set_hexpand(True)
+        self.scale.set_draw_value(False)
+        self._seek_handler = self.scale.connect("value-changed", self._on_seek)
+        self.append(self.scale)
+
+        self.position_label = Gtk.Label()
+        self.position_label.add_css_class("playback-position")
+        self.append(self.position_label)
+
+        self.speeds = None
+        self.speed_dropdown = Gtk.DropDown()
+        self.speed_dropdown.set_tooltip_text("Playback Speed")
+        self.speed_dropdown.connect("notify::selected", self._on_speed_selected)
+        self.append(self.speed_dropdown)
+
+        self.set_visible(False)
+
+    @property
+    def device(self):
+        return self.window.camera_manager.cap
+
+    def attach(self):
+        """Show the bar for the recording now open in the camera manager."""
+        device = self.device
+        self.speeds = device.SPEEDS
+        self.speed_dropdown.set_model(Gtk.StringList.new([f"{speed:g}×" for speed in self.speeds]))
+        self.speed_dropdown.set_selected(self.speeds.index(1.0))
+        self.scale.set_range(0, max(len(device) - 1, 1))
+        self.play_button.set_icon_name("media-playback-pause-symbolic")
+        self.play_button.set_tooltip_text("Pause")
+        self.set_visible(True)
+        if self._timer is None:
+            self._timer = GLib.timeout_add(self.interval_ms, self.refresh)
+        self.refresh()
+
+    def detach(self):
+        self.set_visible(False)
+        if self._timer is not None:
+            GLib.source_remove(self._timer)
+            self._timer = None
+
+    def refresh(self):
+        device = self.device
+        if device is None or not hasattr(device, 'seek'):
+            return True
+        idx = max(device.current, 0)
+        # Follow playback without seeking back to where the slider was
+        self.scale.handler_block(self._seek_handler)
+        self.scale.set_value(idx)
+        self.scale.handler_unblock(self._seek_handler)
+        self.position_label.set_text(f"{device.time_at(idx):.1f} s  {idx + 1}/{len(device)}")
+        return True
+
+    def _on_play_clicked(self, button):
+        device = self.device
+        device.set_paused(not device.paused)
+        if device.paused:
+            button.set_icon_name("media-playback-start-symbolic")
+            button.set_tooltip_text("Play")
+        else:
+            button.set_icon_name("media-playback-pause-symbolic")
+            button.set_tooltip_text("Pause")
+
+    def _on_step(self, button, frames):
+        self.device.step(frames)
+        # Render the new frame even if it barely differs from the last one
+        self.window.change_detector.reset()
+        self.play_button.set_icon_name("media-playback-start-symbolic")
+        self.play_button.set_tooltip_text("Play")
+
+    def _on_seek(self, scale):
+        self.device.seek(scale.get_value())
+        self.window.change_detector.reset()
+
+    def _on_speed_selected(self, dropdown, _param):
+        if self.speeds is not None and self.device is not None:
+            self.device.set_speed(self.speeds[dropdown.get_selected()])
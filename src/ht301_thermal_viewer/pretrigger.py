@@ -0,0 +1,171 @@
+import math
+import threading
+import numpy as np
+from pathlib import Path
+
+from .recorder import write_timestamps
+
+
+class PreTriggerBuffer:
+    """Always-on ring of the most recent raw frames ("save the last N seconds").
+
+    All memory is allocated up front: `capacity` frames of uint16 plus one
+    float64 timestamp each, sized from the requested duration and capped at
+    `max_bytes`. Pushing a frame is a single copy into the next slot.
+
+    While a flush is running, slots that have not been written out yet are
+    protected: frames that would overwrite them are skipped (and counted)
+    instead of corrupting the saved file.
+    """
+    def __init__(self, frame_shape=(292, 384), duration=10.0, fps=25.0, max_bytes=64 * 1024 * 1024):
+        self.frame_shape = tuple(frame_shape)
+        frame_bytes = int(np.prod(self.frame_shape)) * 2 + 8
+        wanted = max(1, int(math.ceil(duration * fps)))
+        self.capacity = max(1, min(wanted, max_bytes // frame_bytes))
+        if self.capacity < wanted:
+            print(f"Pre-trigger buffer capped at {self.capacity} frames ({max_bytes // (1024 * 1024)} MB)")
+
+        self.frames = np.zeros((self.capacity,) + self.frame_shape, dtype=np.uint16)
+        self.timestamps = np.zeros(self.capacity, dtype=np.float64)
+        self.count = 0          # frames pushed since startup
+        self.skipped = 0        # frames not stored because a flush held their slot
+        self._flushed_upto = None
+        self._flush_thread = None
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    @property
+    def is_flushing(self):
+        return self._flush_thread is not None and self._flush_thread.is_alive()
+
+    def duration(self):
+        """Time span covered by the buffered frames, in seconds."""
+        if len(self) < 2:
+            return 0.0
+        newest = (self.count - 1) % self.capacity
+        oldest = (self.count - len(self)) % self.capacity
+        return float(self.timestamps[newest] - self.timestamps[oldest])
+
+    def push(self, frame_raw, timestamp):
+        """Store a raw frame; returns False if it was not buffered."""
+        if frame_raw is None or frame_raw.shape != self.frame_shape:
+            return False
+        flushed_upto = self._flushed_upto
+        if flushed_upto is not None and self.count - self.capacity >= flushed_upto:
+            self.skipped += 1
+            return False
+
+        slot = self.count % self.capacity
+        np.copyto(self.frames[slot], frame_raw, casting='unsafe')
+        self.timestamps[slot] = timestamp
+        self.count += 1
+        return True
+
+    def flush_to(self, raw_file, on_done=None, timestamps=None):
+        """Append the buffered frames to an open raw file in the background.
+
+        The frames are written oldest first; their timestamps are appended to
+        the `timestamps` list if one is given. `on_done` is called from the
+        writer thread once everything is written.
+        """
+        if self.is_flushing:
+            print("Pre-trigger buffer is already being saved")
+            return None
+
+        end = self.count
+        start = max(0, end - self.capacity)
+        self._flushed_upto = start
+        self._flush_thread = threading.Thread(
+            target=self._flush, args=(raw_file, start, end, on_done, timestamps), daemon=True)
+        self._flush_thread.start()
+        return self._flush_thread
+
+    def _flush(self, raw_file, start, end, on_done, timestamps, batch=16):
+        try:
+            for first in range(start, end, batch):
+                last = min(first + batch, end)
+                # A batch may wrap around the end of the ring
+                for lo, hi in self._slot_ranges(first, last):
+                    self.frames[lo:hi].tofile(raw_file)
+                    if timestamps is not None:
+                        timestamps.extend(self.timestamps[lo:hi].tolist())
+                self._flushed_upto = last
+        except Exception as e:
+            print(f"Error saving pre-trigger buffer: {e}")
+        finally:
+            self._flushed_upto = None
+            if on_done is not None:
+                on_done()
+
+    def _slot_ranges(self, first, last):
+        lo, hi = first % self.capacity, (last - 1) % self.capacity + 1
+        if lo < hi:
+            return [(lo, hi)]
+        return [(lo, self.capacity), (0, hi)]
+
+    def save(self, raw_path, on_done=None):
+        """Write the buffer to a new raw recording (plus timestamp sidecar) in the background."""
+        raw_path = Path(raw_path)
+        if len(self) == 0:
+            print("Pre-trigger buffer is empty, nothing to save")
+            return None
+        if self.is_flushing:
+            print("Pre-trigger buffer is already being saved")
+            return None
+
+        raw_file = open(str(raw_path), 'wb')
+        np.array([self.frame_shape[0], self.frame_shape[1], 2], dtype=np.int32).tofile(raw_file)
+        timestamps = []
+
+        def finished():
+            raw_file.close()
+            write_timestamps(raw_path.with_suffix('.timestamps.txt'), timestamps)
+            print(f"Pre-trigger buffer saved as {raw_path} ({len(timestamps)} frames)")
+            if on_done is not None:
+                on_done(raw_path)
+
+        return self.flush_to(raw_file, finished, timestamps)
+
+    def save_video(self, video_path, render, fps=25.0, on_done=None):
+        """Render the buffered frames through `render(frame_raw)` into a video file.
+
+        Runs in the background; like flush_to, it keeps the saved slots from
+        being overwritten until they are encoded.
+        """
+        if len(self) == 0:
+            print("Pre-trigger buffer is empty, nothing to save")
+            return None
+        if self.is_flushing:
+            print("Pre-trigger buffer is already being saved")
+            return None
+
+        end = self.count
+        start = max(0, end - self.capacity)
+        self._flushed_upto = start
+
+        def encode():
+            import cv2
+            writer = None
+            try:
+                for idx in range(start, end):
+                    frame = render(self.frames[idx % self.capacity])
+                    if writer is None:
+                        height, width = frame.shape[:2]
+                        writer = cv2.VideoWriter(str(video_path), cv2.VideoWriter_fourcc(*'avc1'),
+                                                 fps, (width, height))
+                    writer.write(frame)
+                    self._flushed_upto = idx + 1
+                print(f"Pre-trigger buffer saved as {video_path} ({end - start} frames)")
+            except Exception as e:
+                print(f"Error saving pre-trigger video: {e}")
+            finally:
+                if writer is not None:
+                    writer.release()
+                self._flushed_upto = None
+                if on_done is not None:
+                    on_done(video_path)
+
+        self._flush_thread = threading.Thread(target=encode, daemon=True)
+        self._flush_thread.start()
+        return self._flush_thread
@@ -0,0 +1,86 @@
+class QualityGovernor:
+    """Trade rendering quality for frame rate when processing can't keep up.
+
+    The processing time of each rendered frame (everything after the capture
+    read) is compared against the sensor frame interval. When its running
+    average stays above `budget` of the interval, quality is lowered one step;
+    when it stays well below, it is restored one step. Each level keeps the
+    degradations of the levels before it:
+
+        0  full quality
+        1  denoise suspended
+        2  FAST instead of BILINEAR scaling when drawing
+        3  only every other frame displayed
+    """
+    LEVELS = ('full', 'denoise off', 'fast scaling', 'half display rate')
+
+    def __init__(self, sensor_fps=25.0, budget=0.8, recover_below=0.5,
+                 degrade_after=15, recover_after=75, smoothing=0.1):
+        self.sensor_fps = sensor_fps
+        self.budget = budget
+        self.recover_below = recover_below
+        self.degrade_after = degrade_after
+        self.recover_after = recover_after
+        self.smoothing = smoothing
+        self.level = 0
+        self.average = None
+        self._over = 0
+        self._under = 0
+        self._frame_no = 0
+        self.on_change = None
+
+    @property
+    def name(self):
+        return self.LEVELS[self.level]
+
+    @property
+    def interval(self):
+        return 1.0 / self.sensor_fps if self.sensor_fps > 0 else 0.04
+
+    # Settings implied by the current level
+    @property
+    def denoise_allowed(self):
+        return self.level < 1
+
+    @property
+    def fast_scaling(self):
+        return self.level >= 2
+
+    @property
+    def display_decimation(self):
+        return 2 if self.level >= 3 else 1
+
+    def should_display(self):
+        """Called once per captured frame; False when the frame should be dropped."""
+        self._frame_no += 1
+        return self._frame_no % self.display_decimation == 0
+
+    def frame_processed(self, seconds):
+        """Account for the processing time of a rendered frame."""
+        if self.average is None:
+            self.average = seconds
+        else:
+            self.average += self.smoothing * (seconds - self.average)
+
+        # With decimation each displayed frame may take two sensor intervals
+        allowed = self.interval * self.display_decimation
+        if self.average > self.budget * allowed:
+            self._over += 1
+            self._under = 0
+        elif self.average < self.recover_below * self.budget * self.interval:
+            self._under += 1
+            self._over = 0
+        else:
+            self._over = self._under = 0
+
+        if self._over >= self.degrade_after and self.level < len(self.LEVELS) - 1:
+            self._set_level(self.level + 1)
+        elif self._under >= self.recover_after and self.level > 0:
+            self._set_level(self.level - 1)
+
+    def _set_level(self, level):
+        self.level = level
+        self._over = self._under = 0
+        print(f"Quality level {level}: {self.name} (processing {self.average * 1000:.1f} ms/frame)")
+        if self.on_change is not None:
+            self.on_change(self)
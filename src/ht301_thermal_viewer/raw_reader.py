@@ -0,0 +1,314 @@
+import time
+import threading
+import numpy as np
+from pathlib import Path
+
+from .footer import split_frame
+from .ht301_hacklib import info, device_info
+
+# Recorder.start_raw_recording writes three int32 values (height, width,
+# itemsize) followed by the full raw frames, footer rows included.
+HEADER_SIZE = 3 * np.dtype(np.int32).itemsize
+
+
+class RawRecording:
+    """Memory-mapped reader for `.raw` files written by the Recorder."""
+    def __init__(self, path):
+        self.path = Path(path)
+        header = np.fromfile(str(self.path), dtype=np.int32, count=3)
+        if header.size < 3:
+            raise ValueError(f"{self.path}: not a raw recording (header too short)")
+
+        self.height, self.width, itemsize = (int(v) for v in header)
+        if itemsize != 2 or self.height <= 0 or self.width <= 0:
+            raise ValueError(f"{self.path}: unsupported raw header {header.tolist()}")
+
+        self.frame_shape = (self.height, self.width)
+        self.frame_bytes = self.height * self.width * itemsize
+        # A recording interrupted mid-write may end with a partial frame; ignore it
+        n_frames = (self.path.stat().st_size - HEADER_SIZE) // self.frame_bytes
+        if n_frames > 0:
+            self.frames = np.memmap(str(self.path), dtype='<u2', mode='r', offset=HEADER_SIZE,
+                                    shape=(n_frames,) + self.frame_shape)
+        else:
+            self.frames = np.empty((0,) + self.frame_shape, dtype='<u2')
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, idx):
+        return self.frames[idx]
+
+    def read(self, idx):
+        """Return (visible, meta) views of a single frame."""
+        return split_frame(self.frames[idx])
+
+    def chunks(self, chunk_frames=256, start=0, stop=None):
+        """Yield (first_index, frames_raw) slices of at most `chunk_frames` frames."""
+        stop = len(self) if stop is None else min(stop, len(self))
+        for first in range(start, stop, chunk_frames):
+            yield first, self.frames[first:min(first + chunk_frames, stop)]
+
+    def close(self):
+        """Drop the memory map; it is unmapped once no views remain."""
+        self.frames = np.empty((0,) + self.frame_shape, dtype='<u2')
+
+
+def read_timestamps(path):
+    """Read a Matroska v2 timestamp file; returns seconds relative to the first frame."""
+    times = []
+    with open(str(path)) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                times.append(float(line) / 1000.0)
+    return np.array(times)
+
+
+class FramePrefetcher:
+    """Copy the frames ahead of the playback position out of a recording in a thread.
+
+    Reading a memory-mapped frame that is not in the page cache blocks on
+    the disk; the thread takes that wait so the UI thread finds the frames
+    it is about to show already in memory, even in multi-GB recordings.
+    want(idx) moves the window of `ahead` frames to start at idx (after a
+    seek the old window is dropped); get(idx) returns a frame copy.
+    """
+    def __init__(self, recording, ahead=32):
+        self.recording = recording
+        self.ahead = ahead
+        self.hits = 0
+        self.misses = 0
+        self._cache = {}
+        self._want = 0
+        self._condition = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='raw-prefetch', daemon=True)
+        self._thread.start()
+
+    def want(self, idx):
+        with self._condition:
+            if idx != self._want:
+                self._want = idx
+                self._condition.notify()
+
+    def get(self, idx):
+        with self._condition:
+            frame = self._cache.get(idx)
+        if frame is not None:
+            self.hits += 1
+            return frame
+        self.misses += 1
+        return np.array(self.recording[idx])
+
+    def _next_missing(self):
+        """First frame of the window not cached yet; drops frames outside the window."""
+        n = len(self.recording)
+        window = [(self._want + i) % n for i in range(min(self.ahead, n))]
+        keep = set(window)
+        for idx in [idx for idx in self._cache if idx not in keep]:
+            del self._cache[idx]
+        for idx in window:
+            if idx not in self._cache:
+                return idx
+        return None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                idx = self._next_missing() if self._running else None
+                while self._running and idx is None:
+                    self._condition.wait()
+                    idx = self._next_missing()
+                if not self._running:
+                    return
+                want = self._want
+            try:
+                # The copy reads from disk outside the lock
+                frame = np.array(self.recording[idx])
+            except Exception as e:
+                print(f"Error prefetching frame {idx}: {e}")
+                return
+            with self._condition:
+                # Skip frames a seek made useless meanwhile
+                if want == self._want:
+                    self._cache[idx] = frame
+
+    def close(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join()
+        self._cache.clear()
+
+
+class ReplayDevice:
+    """Play a `.raw` recording back through the same interface as HT301.
+
+    Frames are paced at their recorded timestamps when the `.timestamps.txt`
+    sidecar exists, otherwise at `fps`, scaled by `speed`. With
+    realtime=False frames are returned as fast as they are read.
+
+    Playback can be paused, stepped and seeked; while paused read() keeps
+    returning the current frame, at most every PAUSED_INTERVAL_S, so the
+    render settings can still be changed on it. With prefetch=True a
+    FramePrefetcher reads ahead.
+
+    read() sleeps until the next frame is due. A caller that must not block
+    (the GTK main loop) asks due_in() first and comes back later.
+    """
+    SPEEDS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0)
+    PAUSED_INTERVAL_S = 0.05
+
+    def __init__(self, path, fps=25.0, loop=True, realtime=True, prefetch=False):
+        self.recording = RawRecording(path)
+        if len(self.recording) == 0:
+            raise ValueError(f"{path}: recording has no frames")
+        self.fps = fps
+        self.loop = loop
+        self.realtime = realtime
+        self.times = None
+        sidecar = self.recording.path.with_suffix('.timestamps.txt')
+        if sidecar.exists():
+            times = read_timestamps(sidecar)
+            if len(times) == len(self.recording) and len(times) > 1:
+                self.times = times
+                self.fps = (len(times) - 1) / times[-1] if times[-1] > 0 else fps
+        self.prefetcher = FramePrefetcher(self.recording) if prefetch else None
+        self.speed = 1.0
+        self.paused = False
+        # Next frame to return, and the frame returned last (-1 before the first read)
+        self.position = 0
+        self.current = -1
+        # Wall clock time at which the recording time _anchor_time is due
+        self._anchor = None
+        self._anchor_time = 0.0
+        # Wall clock time of the last read() while paused
+        self._paused_read = None
+
+    def __len__(self):
+        return len(self.recording)
+
+    def read(self):
+        if self.paused and self.current >= 0:
+            self._wait_paused()
+            return True, self.frame, self.frame_raw
+
+        if not self._advance():
+            return False, None, None
+        if self.prefetcher is not None:
+            frame_raw = self.prefetcher.get(self.current)
+            self.prefetcher.want((self.current + 1) % len(self.recording))
+        else:
+            frame_raw = np.array(self.recording[self.current])
+        self.frame_raw = frame_raw
+        self.frame, self.meta = split_frame(frame_raw)
+        self.device_strings = device_info(self.meta)
+        return True, self.frame, self.frame_raw
+
+    def grab(self):
+        """Skip to the next frame, paced like read(), without reading it."""
+        if self.paused and self.current >= 0:
+            self._wait_paused()
+            return True
+        return self._advance()
+
+    def due_in(self):
+        """Seconds until read() has a frame to return without sleeping (0: now)."""
+        if not self.realtime:
+            return 0.0
+        now = time.monotonic()
+        if self.paused and self.current >= 0:
+            if self._paused_read is None:
+                return 0.0
+            return max(0.0, self._paused_read + self.PAUSED_INTERVAL_S - now)
+        if not self._wrap():
+            return 0.0
+        if self._anchor is None:
+            self._reset_clock(now)
+        return max(0.0, self._anchor + (self._frame_time(self.position) - self._anchor_time) / self.speed - now)
+
+    def _wait_paused(self):
+        if self.realtime:
+            delay = self.due_in()
+            if delay > 0:
+                time.sleep(delay)
+            self._paused_read = time.monotonic()
+
+    def _wrap(self):
+        """Go back to the first frame at the end of a looped recording; False at the end otherwise."""
+        if self.position < len(self.recording):
+            return True
+        if not self.loop:
+            return False
+        # The loop restarts the timeline after one frame interval
+        if self._anchor is not None:
+            self._anchor += (self._frame_time(len(self.recording) - 1) - self._anchor_time
+                             + 1.0 / self.fps) / self.speed
+            self._anchor_time = self._frame_time(0)
+        self.position = 0
+        return True
+
+    def _advance(self):
+        """Wait until the next frame is due and make it the current one; False at the end."""
+        if not self._wrap():
+            return False
+        delay = self.due_in()
+        if delay > 0:
+            time.sleep(delay)
+
+        self.current = self.position
+        self.position += 1
+        return True
+
+    def _frame_time(self, idx):
+        return self.times[idx] if self.times is not None else idx / self.fps
+
+    def _reset_clock(self, now=None):
+        """Restart pacing so the next frame is due now."""
+        self._anchor = time.monotonic() if now is None else now
+        self._anchor_time = self._frame_time(min(self.position, len(self.recording) - 1))
+
+    def seek(self, idx):
+        """Continue playback at frame idx; while paused, show it."""
+        idx = min(max(int(idx), 0), len(self.recording) - 1)
+        self.position = idx
+        self._reset_clock()
+        if self.prefetcher is not None:
+            self.prefetcher.want(idx)
+        if self.paused:
+            # Let the next read() return the new frame
+            self.current = -1
+
+    def step(self, frames=1):
+        """Pause and move `frames` frames forward (negative: backward) from the current one."""
+        self.paused = True
+        self.seek(max(self.current, 0) + frames)
+
+    def set_paused(self, paused):
+        self.paused = paused
+        if not paused:
+            # Resume from the frame after the one shown
+            self._reset_clock()
+
+    def set_speed(self, speed):
+        self.speed = min(max(float(speed), self.SPEEDS[0]), self.SPEEDS[-1])
+        self._reset_clock()
+
+    def time_at(self, idx):
+        """Recording time of frame idx in seconds."""
+        return self._frame_time(idx)
+
+    def info(self, lut=None):
+        width, height = self.frame.shape
+        return info(self.meta, self.device_strings, height, width, lut)
+
+    def calibrate(self):
+        # The shutter of a recording can't be triggered
+        pass
+
+    def release(self):
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+            self.prefetcher = None
+        self.recording.close()
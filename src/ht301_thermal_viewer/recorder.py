@@ -1,18 +1,172 @@
 import cv2
 import time
 import os
+import json
+import queue
+import threading
 import numpy as np
 from pathlib import Path
 from .utils import get_videos_dir
 
+class FrameRateConformer:
+    """Map monotonic frame timestamps onto a constant-rate output timeline.
+
+    Each frame is assigned the output slot nearest to its capture time. Slots
+    skipped since the previous frame are filled by repeating that frame, and a
+    frame landing on an already filled slot is dropped, so the video plays
+    back at real-time speed whatever the capture rate was.
+    """
+    def __init__(self, fps):
+        self.fps = fps
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self.next_slot = 0
+        self.received = 0
+        self.written = 0
+        self.duplicated = 0
+        self.dropped = 0
+
+    def observe(self, timestamp):
+        """Account for a received frame without placing it."""
+        self.received += 1
+        if self.first_timestamp is None:
+            self.first_timestamp = timestamp
+        self.last_timestamp = timestamp
+
+    def place(self, timestamp):
+        """Return (repeats_of_previous, write_current) for a new frame."""
+        self.observe(timestamp)
+        slot = int(round((timestamp - self.first_timestamp) * self.fps))
+        if slot < self.next_slot:
+            self.dropped += 1
+            return 0, False
+
+        repeats = slot - self.next_slot if self.written else 0
+        self.duplicated += repeats
+        self.written += repeats + 1
+        self.next_slot = slot + 1
+        return repeats, True
+
+    def measured_fps(self):
+        """Average capture rate over the frames seen so far."""
+        if self.received < 2 or self.last_timestamp == self.first_timestamp:
+            return 0.0
+        return (self.received - 1) / (self.last_timestamp - self.first_timestamp)
+
+
+class VideoEncoderThread(threading.Thread):
+    """Encode queued (timestamp, frame) pairs so write_frame never blocks."""
+    def __init__(self, video_writer, fps, constant_rate=True, timestamps_path=None, max_queue=64):
+        super().__init__(daemon=True)
+        self.video_writer = video_writer
+        self.constant_rate = constant_rate
+        self.conformer = FrameRateConformer(fps)
+        self.frames = queue.Queue(maxsize=max_queue)
+        self.queue_dropped = 0
+        self.timestamps_path = timestamps_path
+        self.timestamps = []
+
+    def submit(self, frame, timestamp):
+        """Queue a copy of the frame; drop it if the encoder is too far behind."""
+        try:
+            self.frames.put_nowait((timestamp, frame.copy()))
+            return True
+        except queue.Full:
+            self.queue_dropped += 1
+            return False
+
+    def lag(self):
+        """Return (frames, seconds) the encoder is behind the producer."""
+        backlog = self.frames.qsize()
+        if backlog == 0 or self.conformer.last_timestamp is None:
+            return backlog, 0.0
+        return backlog, max(0.0, time.monotonic() - self.conformer.last_timestamp)
+
+    def finish(self):
+        """Flush the queue and wait for the encoder to finish."""
+        self.frames.put(None)
+        self.join()
+
+    def run(self):
+        previous = None
+        while True:
+            item = self.frames.get()
+            if item is None:
+                break
+            timestamp, frame = item
+            try:
+                if self.constant_rate:
+                    repeats, write = self.conformer.place(timestamp)
+                    for _ in range(repeats):
+                        self.video_writer.write(previous)
+                    if write:
+                        self.video_writer.write(frame)
+                        previous = frame
+                else:
+                    self.conformer.observe(timestamp)
+                    self.conformer.written += 1
+                    self.video_writer.write(frame)
+                    self.timestamps.append(timestamp)
+            except Exception as e:
+                print(f"Error encoding frame: {e}")
+
+        if not self.constant_rate and self.timestamps_path is not None:
+            write_timestamps(self.timestamps_path, self.timestamps)
+
+    def report(self):
+        """Summarize what happened to the submitted frames."""
+        c = self.conformer
+        return {
+            'mode': 'constant' if self.constant_rate else 'variable',
+            'output_fps': c.fps,
+            'measured_fps': round(c.measured_fps(), 3),
+            'duration_s': round((c.last_timestamp or 0) - (c.first_timestamp or 0), 3),
+            'frames_received': c.received + self.queue_dropped,
+            'frames_written': c.written,
+            'frames_duplicated': c.duplicated,
+            'frames_dropped_late': c.dropped,
+            'frames_dropped_backlog': self.queue_dropped,
+        }
+
+
+def write_timestamps(path, timestamps):
+    """Write a Matroska v2 timestamp file (milliseconds, one frame per line).
+
+    `mkvmerge --timestamps 0:<file>` remuxes a video to its true frame times.
+    """
+    with open(str(path), 'w') as f:
+        f.write("# timestamp format v2\n")
+        if timestamps:
+            t0 = timestamps[0]
+            for t in timestamps:
+                f.write(f"{(t - t0) * 1000.0:.3f}\n")
+
+
 class Recorder:
-    def __init__(self):
+    def __init__(self, video_fps=25.0, constant_rate=True):
         self.is_recording = False
         self.is_raw_recording = False
         self.video_writer = None
+        self.video_path = None
+        self.encoder = None
+        # Size of the video being recorded; frames of another size (zoom, rotation) are fitted into it
+        self.frame_shape = None
+        self._resized = None
+        # (shape of the frames fitted, the part of _resized they are scaled into)
+        self._letterbox = None
         self.raw_file = None
+        self.raw_path = None
+        self.raw_timestamps = []
+        # Live raw frames held back while a pre-trigger buffer is written first
+        self.raw_backlog = None
+        self.raw_lock = threading.Lock()
+        self.pretrigger_flush = None
         self.recording_start_time = None
         self.raw_recording_start_time = None
+        # Output rate of the video file; frames are duplicated/dropped to hold
+        # it, or written once each with a timestamp sidecar when not constant
+        self.video_fps = video_fps
+        self.constant_rate = constant_rate
         
     def start_recording(self, frame):
         """Start recording video with frame dimensions."""
@@ -22,13 +176,12 @@ class Recorder:
             
         try:
             # Setup video recording
-            height, width = frame.shape[:2]
             base_filename = time.strftime("%Y-%m-%d_%H:%M:%S")
-            video_path = Path(get_videos_dir()) / f"{base_filename}.mp4"
+            self.video_path = Path(get_videos_dir()) / f"{base_filename}.mp4"
             
-            # Initialize video writer
-            fourcc = cv2.VideoWriter_fourcc(*'avc1')
-            self.video_writer = cv2.VideoWriter(str(video_path), fourcc, 25.0, (width, height))
+            timestamps_path = None if self.constant_rate else self.video_path.with_suffix('.timestamps.txt')
+            self.encoder = self._start_encoder(frame.shape, timestamps_path)
+            self.frame_shape = frame.shape
             
             self.recording_start_time = time.time()
             self.is_recording = True
@@ -38,21 +191,56 @@ class Recorder:
             self.cleanup()
             return False
             
-    def start_raw_recording(self, frame_raw):
-        """Start recording raw data."""
+    def _start_encoder(self, frame_shape, timestamps_path):
+        """Start the encoder in a child process, or in a thread if that fails."""
+        encoder = None
+        try:
+            from .encoder_process import VideoEncoderProcess
+            encoder = VideoEncoderProcess(self.video_path, frame_shape, self.video_fps,
+                                          self.constant_rate, timestamps_path)
+            encoder.start()
+            return encoder
+        except Exception as e:
+            if encoder is not None:
+                # The child never attached: remove the shared memory block
+                encoder.ring.close()
+            print(f"Encoder process unavailable, encoding in a thread: {e}")
+
+        # Initialize video writer
+        height, width = frame_shape[:2]
+        fourcc = cv2.VideoWriter_fourcc(*'avc1')
+        self.video_writer = cv2.VideoWriter(str(self.video_path), fourcc, self.video_fps, (width, height))
+        encoder = VideoEncoderThread(self.video_writer, self.video_fps, self.constant_rate, timestamps_path)
+        encoder.start()
+        return encoder
+
+    def encoder_lag(self):
+        """Return (frames, seconds) the video encoder is behind, if recording."""
+        if self.encoder is None:
+            return 0, 0.0
+        return self.encoder.lag()
+
+    def start_raw_recording(self, frame_raw, pretrigger=None):
+        """Start recording raw data, optionally preceded by a pre-trigger buffer."""
         if frame_raw is None:
             print("Error: No raw frame available to start recording")
             return False
             
         try:
             base_filename = time.strftime("%Y-%m-%d_%H:%M:%S")
-            raw_path = Path(get_videos_dir()) / f"{base_filename}.raw"
+            self.raw_path = Path(get_videos_dir()) / f"{base_filename}.raw"
             
             # Initialize raw data file
-            self.raw_file = open(str(raw_path), 'wb')
+            self.raw_file = open(str(self.raw_path), 'wb')
             # Write header with frame dimensions and data type
             header = np.array([frame_raw.shape[0], frame_raw.shape[1], frame_raw.dtype.itemsize], dtype=np.int32)
             header.tofile(self.raw_file)
+            self.raw_timestamps = []
+
+            if pretrigger is not None and len(pretrigger) and not pretrigger.is_flushing:
+                self.raw_backlog = []
+                self.pretrigger_flush = pretrigger.flush_to(self.raw_file, self._drain_raw_backlog,
+                                                            self.raw_timestamps)
             
             self.raw_recording_start_time = time.time()
             self.is_raw_recording = True
@@ -65,34 +253,82 @@ class Recorder:
     def stop_recording(self):
         """Stop video recording and release resources."""
         self.is_recording = False
+        if self.encoder is not None:
+            self.encoder.finish()
+            self.write_report(self.encoder.report())
+            self.encoder = None
         if self.video_writer is not None:
             self.video_writer.release()
             self.video_writer = None
         self.recording_start_time = None
+
+    def write_report(self, report):
+        """Write the dropped/duplicated frame report next to the video."""
+        print(f"Recording finished: {report['frames_written']} frames written, "
+              f"{report['frames_duplicated']} duplicated, "
+              f"{report['frames_dropped_late'] + report['frames_dropped_backlog']} dropped "
+              f"(capture rate {report['measured_fps']:.2f} fps, "
+              f"max encoder lag {report.get('max_encoder_lag_s', 0.0):.2f}s)")
+        try:
+            with open(str(self.video_path.with_suffix('.report.json')), 'w') as f:
+                json.dump(report, f, indent=2)
+        except Exception as e:
+            print(f"Error writing recording report: {e}")
             
+    def _drain_raw_backlog(self):
+        """Write the frames that arrived while the pre-trigger buffer was flushed."""
+        with self.raw_lock:
+            try:
+                for frame_raw, timestamp in self.raw_backlog or []:
+                    frame_raw.tofile(self.raw_file)
+                    self.raw_timestamps.append(timestamp)
+            except Exception as e:
+                print(f"Error writing raw frame: {e}")
+            self.raw_backlog = None
+
     def stop_raw_recording(self):
         """Stop raw recording and release resources."""
         self.is_raw_recording = False
+        if self.pretrigger_flush is not None:
+            self.pretrigger_flush.join()
+            self.pretrigger_flush = None
         if self.raw_file is not None:
             self.raw_file.close()
             self.raw_file = None
+            write_timestamps(self.raw_path.with_suffix('.timestamps.txt'), self.raw_timestamps)
         self.raw_recording_start_time = None
             
-    def write_frame(self, frame):
-        """Write a frame to video if recording."""
+    def write_frame(self, frame, timestamp=None):
+        """Queue a frame for encoding if recording; returns immediately."""
         if not self.is_recording:
             return False
             
         try:
-            # Write processed frame to video
-            if self.video_writer is not None and frame is not None:
-                self.video_writer.write(frame)
+            if self.encoder is not None and frame is not None:
+                if frame.shape != self.frame_shape:
+                    frame = self._fit_frame(frame)
+                self.encoder.submit(frame, time.monotonic() if timestamp is None else timestamp)
             return True
         except Exception as e:
             print(f"Error writing frame: {e}")
             return False
             
-    def write_raw_frame(self, frame_raw):
+    def _fit_frame(self, frame):
+        """Scale a frame of another size into the video size, keeping its aspect ratio (black bars)."""
+        if (self._resized is None or self._resized.shape != self.frame_shape
+                or self._letterbox[0] != frame.shape):
+            height, width = self.frame_shape[:2]
+            scale = min(width / frame.shape[1], height / frame.shape[0])
+            w = max(1, min(width, round(frame.shape[1] * scale)))
+            h = max(1, min(height, round(frame.shape[0] * scale)))
+            x, y = (width - w) // 2, (height - h) // 2
+            self._resized = np.zeros(self.frame_shape, dtype=frame.dtype)
+            self._letterbox = (frame.shape, self._resized[y:y + h, x:x + w])
+        view = self._letterbox[1]
+        cv2.resize(frame, (view.shape[1], view.shape[0]), view, interpolation=cv2.INTER_NEAREST)
+        return self._resized
+        
+    def write_raw_frame(self, frame_raw, timestamp=None):
         """Write raw frame data if raw recording."""
         if not self.is_raw_recording:
             return False
@@ -100,7 +336,13 @@ class Recorder:
         try:
             # Write raw frame data
             if self.raw_file is not None and frame_raw is not None:
-                frame_raw.tofile(self.raw_file)
+                timestamp = time.monotonic() if timestamp is None else timestamp
+                with self.raw_lock:
+                    if self.raw_backlog is not None:
+                        self.raw_backlog.append((frame_raw.copy(), timestamp))
+                        return True
+                    frame_raw.tofile(self.raw_file)
+                    self.raw_timestamps.append(timestamp)
             return True
         except Exception as e:
             print(f"Error writing raw frame: {e}")
@@ -113,4 +355,4 @@ class Recorder:
         
     def cleanup_raw(self):
         """Clean up raw recording resources."""
-        self.stop_raw_recording() 
\ No newline at end of file
+        self.stop_raw_recording() 
@@ -0,0 +1,89 @@
+import cv2
+import time
+import queue
+import threading
+import numpy as np
+from pathlib import Path
+
+from .footer import split_frame
+
+
+class SnapshotWriter:
+    """Write radiometric snapshots on a background thread.
+
+    A snapshot is the rendered image (PNG) plus an `.npz` with everything
+    needed to recompute temperatures later: the full raw frame, its visible
+    part and metadata footer, the temperature LUT and the readings. A 16-bit
+    TIFF of the raw counts can be added for tools that do not read NumPy files.
+
+    capture() only copies the arrays and queues them, so taking a snapshot
+    never stalls the frame loop.
+    """
+    def __init__(self, formats=('png', 'npz'), max_pending=8):
+        self.formats = tuple(formats)
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.thread = None
+
+    def capture(self, directory, image, frame_raw=None, lut=None, info=None, basename=None):
+        """Queue a snapshot; returns the PNG path or None if it was dropped."""
+        basename = basename or time.strftime("%Y-%m-%d_%H:%M:%S")
+        base_path = Path(directory) / basename
+        item = (
+            base_path,
+            None if image is None else image.copy(),
+            None if frame_raw is None else frame_raw.copy(),
+            None if lut is None else np.asarray(lut),
+            dict(info) if info is not None else None,
+            time.time(),
+        )
+        try:
+            self.pending.put_nowait(item)
+        except queue.Full:
+            print("Snapshot dropped: writer is busy")
+            return None
+
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+        return base_path.with_suffix('.png')
+
+    def _run(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            try:
+                self._write(*item)
+            except Exception as e:
+                print(f"Error saving snapshot: {e}")
+
+    def _write(self, base_path, image, frame_raw, lut, info, wall_time):
+        if image is not None and 'png' in self.formats:
+            cv2.imwrite(str(base_path.with_suffix('.png')), image)
+        if frame_raw is not None:
+            visible, meta = split_frame(frame_raw)
+            if 'npz' in self.formats:
+                readings = {}
+                for key, value in (info or {}).items():
+                    if key != 'device_strings':
+                        readings['info_' + key] = np.asarray(value)
+                if info and 'device_strings' in info:
+                    readings['device_strings'] = np.array(info['device_strings'])
+                np.savez_compressed(
+                    str(base_path.with_suffix('.npz')),
+                    frame_raw=frame_raw,
+                    visible=visible,
+                    meta=meta,
+                    lut=lut if lut is not None else np.empty(0),
+                    time=np.float64(wall_time),
+                    **readings,
+                )
+            if 'tiff' in self.formats:
+                cv2.imwrite(str(base_path.with_suffix('.tiff')), np.ascontiguousarray(visible))
+        print(f"Snapshot saved as {base_path}.*")
+
+    def close(self):
+        """Wait for queued snapshots to be written."""
+        if self.thread is not None and self.thread.is_alive():
+            self.pending.put(None)
+            self.thread.join()
@@ -0,0 +1,177 @@
+"""Per-frame sensor telemetry from the metadata footer.
+
+TelemetryLog decodes the sensor and parameter fields of every frame's
+footer into a preallocated columnar ring buffer (one float64 row per field)
+and appends them to a CSV file in batches from a writer thread:
+
+    log = TelemetryLog(path='telemetry.csv')
+    log.append(meta, timestamp, lut)
+    recent = log.latest(250)            # {'fpatmp_C': array, ...}, oldest first
+    log.drift('fpatmp_C', seconds=60)   # change over the last minute
+
+The columns are footer.TELEMETRY_FIELDS. The footer words they come from
+(footer.FOOTER_WORDS and the parameter floats) are gathered with one
+np.take into a small buffer and scattered into the row through indices
+computed at import, so logging costs a few microseconds per frame.
+"""
+import time
+import queue
+import threading
+import numpy as np
+
+from .footer import (FOOTER_ROWS, FOOTER_WORDS, PARAMETER_WORD, PARAMETER_FLOATS, TELEMETRY_FIELDS,
+                     core_celsius, fpa_celsius)
+from .utils import get_data_dir
+
+TELEMETRY_COLUMNS = TELEMETRY_FIELDS
+COLUMN_INDEX = {name: i for i, name in enumerate(TELEMETRY_COLUMNS)}
+
+# Footer words gathered per frame: the integer words, then the parameter floats
+_WORD_NAMES = tuple(FOOTER_WORDS)
+_PARAMETER_WORDS = range(PARAMETER_WORD, PARAMETER_WORD + 2 * len(PARAMETER_FLOATS))
+
+
+def _columns(names, wanted=lambda name: name):
+    """(column indices, source indices) of the `names` whose wanted(name) is a column."""
+    pairs = [(COLUMN_INDEX[wanted(name)], i) for i, name in enumerate(names) if wanted(name) in COLUMN_INDEX]
+    return np.array([c for c, _ in pairs]), np.array([i for _, i in pairs])
+
+
+_WORD_COLUMNS, _WORD_SOURCES = _columns(_WORD_NAMES)
+_PARAMETER_COLUMNS, _PARAMETER_SOURCES = _columns(PARAMETER_FLOATS)
+# The *_C column of each *_raw word, converted through the LUT
+_LUT_COLUMNS, _LUT_SOURCES = _columns(_WORD_NAMES, lambda name: name[:-4] + '_C' if name.endswith('_raw') else None)
+# Columns converted from single words
+_TFPA, _CORETMP = _WORD_NAMES.index('Tfpa_raw'), _WORD_NAMES.index('coretmp')
+_TIMESTAMP, _FPATMP, _CORETMP_C = (COLUMN_INDEX[name] for name in ('timestamp', 'fpatmp_C', 'coretmp_C'))
+# CSV formats: the footer words are integers
+_CSV_FORMATS = ['%.6f' if name == 'timestamp' else '%d' if name in FOOTER_WORDS else '%.4f'
+                for name in TELEMETRY_COLUMNS]
+
+
+def log_path(value):
+    """CSV path for a --telemetry-log / HT301_TELEMETRY_LOG value: '1' picks a
+    timestamped file in the data directory; empty disables the file."""
+    if not value:
+        return None
+    if value == '1':
+        directory = get_data_dir() / 'telemetry'
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory / (time.strftime("%Y-%m-%d_%H:%M:%S") + '.csv')
+    return value
+
+
+class TelemetryLog:
+    """Ring buffer of the last `capacity` frames' telemetry, optionally logged to CSV."""
+    def __init__(self, capacity=3000, path=None, batch=250):
+        self.capacity = capacity
+        self.data = np.full((len(TELEMETRY_COLUMNS), capacity), np.nan)
+        # Rows appended so far; the newest is at (count - 1) % capacity
+        self.count = 0
+        self.path = path
+        self.batch = batch
+        self._flushed = 0
+        self._words = np.empty(len(_WORD_NAMES) + len(_PARAMETER_WORDS), dtype=np.uint16)
+        self._row = np.full(len(TELEMETRY_COLUMNS), np.nan)
+        self._index = None
+        self._queue = None
+        self._writer = None
+        if path is not None:
+            self._queue = queue.Queue()
+            self._writer = threading.Thread(target=self._write_batches, name='telemetry-writer', daemon=True)
+            self._writer.start()
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, meta, timestamp=None, lut=None):
+        """Decode one (4, W) footer into the next row."""
+        width = meta.shape[-1]
+        if self._index is None or self._index[1] != width:
+            index = [row * width + word for row, word in FOOTER_WORDS.values()]
+            index += [3 * width + word for word in _PARAMETER_WORDS]
+            self._index = (np.array(index), width)
+        words, row = self._words, self._row
+        np.take(meta.reshape(-1), self._index[0], out=words)
+        row[_WORD_COLUMNS] = words[_WORD_SOURCES]
+        row[_PARAMETER_COLUMNS] = words[len(_WORD_NAMES):].view('<f4')[_PARAMETER_SOURCES]
+        row[_LUT_COLUMNS] = np.nan if lut is None else lut[words[_LUT_SOURCES]]
+        row[_TIMESTAMP] = time.monotonic() if timestamp is None else timestamp
+        row[_FPATMP] = fpa_celsius(int(words[_TFPA]))
+        row[_CORETMP_C] = core_celsius(int(words[_CORETMP]))
+
+        self.data[:, self.count % self.capacity] = row
+        self.count += 1
+        if self._queue is not None and self.count - self._flushed >= self.batch:
+            self.flush()
+
+    def append_frame(self, frame_raw, timestamp=None, lut=None):
+        self.append(frame_raw[-FOOTER_ROWS:], timestamp, lut)
+
+    def latest(self, n=None):
+        """The last n rows (all buffered ones by default) as a dict of columns, oldest first."""
+        n = len(self) if n is None else min(n, len(self))
+        idx = np.arange(self.count - n, self.count) % self.capacity
+        block = self.data[:, idx]
+        return {name: block[i] for i, name in enumerate(TELEMETRY_COLUMNS)}
+
+    def since(self, timestamp):
+        """The buffered rows recorded at or after `timestamp`."""
+        columns = self.latest()
+        keep = columns['timestamp'] >= timestamp
+        return {name: values[keep] for name, values in columns.items()}
+
+    def current(self, name):
+        """Newest value of a column (NaN when empty)."""
+        if self.count == 0:
+            return np.nan
+        return self.data[COLUMN_INDEX[name], (self.count - 1) % self.capacity]
+
+    def drift(self, name, seconds=60.0):
+        """Change of a column over the last `seconds` (least-squares slope times the span)."""
+        if self.count < 2:
+            return np.nan
+        columns = self.since(self.current('timestamp') - seconds)
+        t, values = columns['timestamp'], columns[name]
+        valid = np.isfinite(values)
+        if valid.sum() < 2 or np.ptp(t[valid]) <= 0:
+            return np.nan
+        slope = np.polyfit(t[valid] - t[valid][0], values[valid], 1)[0]
+        return slope * seconds
+
+    def flush(self):
+        """Queue the rows not written yet for the writer thread."""
+        if self._queue is None:
+            return
+        pending = self.count - self._flushed
+        if pending <= 0:
+            return
+        if pending > self.capacity:
+            print(f"Telemetry log fell behind: {pending - self.capacity} rows lost")
+            pending = self.capacity
+        idx = np.arange(self.count - pending, self.count) % self.capacity
+        self._queue.put(self.data[:, idx].T.copy())
+        self._flushed = self.count
+
+    def _write_batches(self):
+        try:
+            with open(str(self.path), 'w') as f:
+                f.write(','.join(TELEMETRY_COLUMNS) + '\n')
+                while True:
+                    rows = self._queue.get()
+                    if rows is None:
+                        return
+                    np.savetxt(f, rows, fmt=_CSV_FORMATS, delimiter=',')
+                    f.flush()
+        except Exception as e:
+            print(f"Error writing telemetry log {self.path}: {e}")
+            # Keep consuming so close() does not wait on a dead writer
+            while self._queue.get() is not None:
+                pass
+
+    def close(self):
+        if self._writer is not None:
+            self.flush()
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
@@ -0,0 +1,43 @@
+import gi
+from gi.repository import Gtk, GLib
+import numpy as np
+
+class TelemetryPanel(Gtk.Label):
+    """Sensor temperatures and their drift over the last minute, from the telemetry log."""
+    def __init__(self, telemetry, interval_ms=1000):
+        super().__init__()
+        self.telemetry = telemetry
+        self.interval_ms = interval_ms
+        self._timer = None
+        self.set_halign(Gtk.Align.END)
+        self.set_valign(Gtk.Align.END)
+        self.set_margin_end(16)
+        self.set_margin_bottom(96)
+        self.set_xalign(0.0)
+        self.add_css_class("telemetry-panel")
+        self.set_visible(False)
+
+    def show_panel(self, visible):
+        self.set_visible(visible)
+        if visible and self._timer is None:
+            self.refresh()
+            self._timer = GLib.timeout_add(self.interval_ms, self.refresh)
+        elif not visible and self._timer is not None:
+            GLib.source_remove(self._timer)
+            self._timer = None
+
+    def refresh(self):
+        log = self.telemetry
+        if log.count == 0:
+            self.set_text("No telemetry yet")
+            return True
+        lines = []
+        for name, label in (('fpatmp_C', "FPA"), ('coretmp_C', "Core")):
+            drift = log.drift(name, 60.0)
+            drift_text = "" if np.isnan(drift) else f"  {drift:+.2f}°C/min"
+            lines.append(f"{label} {log.current(name):.2f}°C{drift_text}")
+        lines.append(f"ε {log.current('emissivity'):.2f}  air {log.current('airtmp_C'):.1f}°C  "
+                     f"refl {log.current('refltmp_C'):.1f}°C")
+        lines.append(f"humidity {log.current('humidity'):.2f}  distance {log.current('distance'):.0f}")
+        self.set_text("\n".join(lines))
+        return True
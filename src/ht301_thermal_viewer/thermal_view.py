@@ -1,6 +1,7 @@
 import gi
 import cairo
 import cv2
+import numpy as np
 from gi.repository import Gtk, GLib, Gdk, GdkPixbuf
 
 class ThermalView(Gtk.Box):
@@ -8,6 +9,14 @@ class ThermalView(Gtk.Box):
         super().__init__()
         self.current_frame = None
         self.frame_count = 0
+        # Cheaper nearest-neighbour scaling, used by the quality governor
+        self.fast_scaling = False
+        self._frame_rgb = None
+        # Placement of the frame in the drawing area at the last draw: (scale, x offset, y offset)
+        self.view_geometry = None
+        # Callables drawing over the frame, called with the cairo context in
+        # frame pixel units and the scale of a frame pixel on screen
+        self.annotations = []
         
         # Create a drawing area for the thermal view
         self.drawing_area = Gtk.DrawingArea()
@@ -25,6 +34,14 @@ class ThermalView(Gtk.Box):
         self.status_label.add_css_class("status-label")
         self.overlay.add_overlay(self.status_label)
         
+        # Quality level label, shown while rendering quality is reduced
+        self.quality_label = Gtk.Label()
+        self.quality_label.set_visible(False)
+        self.quality_label.set_halign(Gtk.Align.CENTER)
+        self.quality_label.set_valign(Gtk.Align.START)
+        self.quality_label.add_css_class("quality-label")
+        self.overlay.add_overlay(self.quality_label)
+        
         # Add the overlay to the box
         self.append(self.overlay)
         
@@ -35,6 +52,18 @@ class ThermalView(Gtk.Box):
         self.status_label.set_visible(False)
         self.drawing_area.queue_draw()
         
+    def set_quality(self, level, name):
+        """Show the active quality level; hidden at full quality."""
+        self.quality_label.set_text(f"Quality {level}: {name}")
+        self.quality_label.set_visible(level > 0)
+        
+    def widget_to_frame(self, x, y):
+        """Pixel coordinates in the displayed frame of a point of the drawing area, or None."""
+        if self.view_geometry is None:
+            return None
+        scale, x_offset, y_offset = self.view_geometry
+        return (x - x_offset) / scale, (y - y_offset) / scale
+        
     def on_draw(self, drawing_area, cr, width, height):
         if self.current_frame is None:
             # Show error message with proper styling
@@ -43,8 +72,10 @@ class ThermalView(Gtk.Box):
             return False
             
         try:
-            # Convert BGR to RGB
-            frame_rgb = cv2.cvtColor(self.current_frame, cv2.COLOR_BGR2RGB)
+            # Convert BGR to RGB into a buffer reused between draws
+            if self._frame_rgb is None or self._frame_rgb.shape != self.current_frame.shape:
+                self._frame_rgb = np.empty_like(self.current_frame)
+            frame_rgb = cv2.cvtColor(self.current_frame, cv2.COLOR_BGR2RGB, self._frame_rgb)
             
             # Create a GdkPixbuf from the numpy array
             frame_height, frame_width = frame_rgb.shape[:2]
@@ -68,14 +99,17 @@ class ThermalView(Gtk.Box):
             scaled_height = frame_height * scale
             x_offset = (width - scaled_width) / 2
             y_offset = (height - scaled_height) / 2
+            self.view_geometry = (scale, x_offset, y_offset)
             
             # Draw the scaled image
             cr.save()
             cr.translate(x_offset, y_offset)
             cr.scale(scale, scale)
             Gdk.cairo_set_source_pixbuf(cr, pixbuf, 0, 0)
-            cr.get_source().set_filter(cairo.Filter.BILINEAR)
+            cr.get_source().set_filter(cairo.Filter.FAST if self.fast_scaling else cairo.Filter.BILINEAR)
             cr.paint()
+            for annotate in self.annotations:
+                annotate(cr, scale)
             cr.restore()
             
             return True
@@ -0,0 +1,230 @@
+#!/usr/bin/python3
+"""Low duty cycle time-lapse logging for long monitoring runs.
+
+    python3 -m ht301_thermal_viewer.timelapse --interval 10                 # live camera
+    python3 -m ht301_thermal_viewer.timelapse --interval 5 --replay rec.raw
+
+Curing, battery packs and the like only need a frame every few seconds,
+for days. The capture thread only grab()s frames to keep the V4L2 queue
+drained (see capture.py); every `check_s` seconds one frame is retrieved,
+its telemetry logged, and its footer readings and a 1/8 scale temperature
+map compared with the last stored frame. The frame is stored when
+`interval_s` has passed since then, or sooner when a reading or a block of
+the map moved by `change_C`.
+
+Stored frames go to a `.raw` recording with its `.timestamps.txt` sidecar,
+so they play back and export like any other recording, and the telemetry
+of every check to a CSV file next to it. Both are flushed as they are
+written: an interrupted run keeps everything up to its last frame.
+"""
+import time
+import argparse
+import functools
+import cv2
+import numpy as np
+from pathlib import Path
+
+from .camera_manager import CameraManager
+from .footer import split_frame
+from .nuc import ShutterScheduler
+from .raw_reader import ReplayDevice
+from .telemetry import TelemetryLog
+from .utils import get_videos_dir
+
+# Footer row 0 words: Tmax_raw, Tmin_raw, Tcenter_raw
+READING_WORDS = np.array([4, 7, 12])
+
+
+class IntervalRecording:
+    """Raw recording (see raw_reader.py) written and flushed one frame at a time."""
+    def __init__(self, path, frame_shape):
+        self.path = Path(path)
+        self.frames = 0
+        self._t0 = None
+        self.file = open(str(self.path), 'wb')
+        np.array([frame_shape[0], frame_shape[1], 2], dtype=np.int32).tofile(self.file)
+        self.file.flush()
+        self.timestamps = open(str(self.path.with_suffix('.timestamps.txt')), 'w')
+        self.timestamps.write("# timestamp format v2\n")
+
+    def write(self, frame_raw, timestamp):
+        if self._t0 is None:
+            self._t0 = timestamp
+        frame_raw.tofile(self.file)
+        self.file.flush()
+        # After the frame, so the sidecar never lists a frame the file lacks
+        self.timestamps.write(f"{(timestamp - self._t0) * 1000.0:.3f}\n")
+        self.timestamps.flush()
+        self.frames += 1
+
+    def close(self):
+        self.file.close()
+        self.timestamps.close()
+
+
+class TimeLapse:
+    """Check a frame every `check_s` and store it on the interval or on a change."""
+    def __init__(self, camera_manager, output_dir=None, interval_s=10.0, check_s=1.0, change_C=2.0,
+                 auto_calibrate=True, settle_s=2.0):
+        self.camera_manager = camera_manager
+        self.output_dir = output_dir
+        self.interval_s = interval_s
+        self.check_s = check_s
+        self.change_C = change_C
+        # Frames right after a shutter calibration are not stored
+        self.settle_s = settle_s
+        # Every retrieved frame is a check, so the scheduler looks at each one
+        self.shutter_scheduler = ShutterScheduler(camera_manager, check_every=1)
+        self.shutter_scheduler.enabled = auto_calibrate
+        self.base_path = None
+        self.recording = None
+        self.telemetry = None
+        self.running = False
+        self.checks = 0
+        self.stored = 0
+        self.stored_on_change = 0
+        self._reference = None
+        self._stored_at = None
+        self._started = None
+
+    def start(self):
+        if not self.camera_manager.initialize():
+            print("Camera initialization failed!")
+            return False
+        cap = self.camera_manager.cap
+        if hasattr(cap, 'on_demand'):
+            cap.on_demand = True
+        directory = Path(self.output_dir or get_videos_dir())
+        directory.mkdir(parents=True, exist_ok=True)
+        self.base_path = directory / (time.strftime("%Y-%m-%d_%H:%M:%S") + '_timelapse')
+        self.telemetry = TelemetryLog(capacity=3600, path=self.base_path.with_suffix('.csv'), batch=60)
+        print(f"Time-lapse every {self.interval_s:g}s (or on a {self.change_C:g}°C change) "
+              f"to {self.base_path.with_suffix('.raw')}")
+        self.running = True
+        self._started = (time.monotonic(), time.process_time())
+        return True
+
+    def check(self):
+        """Retrieve one frame and store it if due; returns False when the source is exhausted."""
+        ret, frame, frame_raw = self.camera_manager.read_raw()
+        now = time.monotonic()
+        if not ret:
+            return self.camera_manager.reconnecting()
+        self.checks += 1
+        visible, meta = split_frame(frame_raw)
+        lut = self.camera_manager.lut_cache.lookup(meta)
+        self.telemetry.append(meta, now, lut)
+        self.shutter_scheduler.update(frame_raw, now)
+        if now - (self.camera_manager.last_calibration or 0.0) < self.settle_s:
+            return True
+
+        # Block means of the corrected image, plus the footer readings for small hotspots
+        height, width = visible.shape
+        blocks = cv2.resize(visible, (width // 8, height // 8), interpolation=cv2.INTER_AREA)
+        temps = np.concatenate([lut[blocks].ravel(), lut[meta[0, READING_WORDS]]])
+        if self._reference is None or now - self._stored_at >= self.interval_s:
+            reason = None
+        else:
+            change = float(np.max(np.abs(temps - self._reference)))
+            if change < self.change_C:
+                return True
+            reason = f"{change:.1f}°C change"
+        self.store(frame_raw, now)
+        self._reference = temps
+        if reason is not None:
+            self.stored_on_change += 1
+            print(f"Stored frame {self.stored} ({reason}), Tmax {lut[meta[0, 4]]:.1f}°C")
+        return True
+
+    def store(self, frame_raw, timestamp):
+        if self.recording is None:
+            self.recording = IntervalRecording(self.base_path.with_suffix('.raw'), frame_raw.shape)
+        self.recording.write(frame_raw, timestamp)
+        self.stored += 1
+        self._stored_at = timestamp
+
+    def wait(self, until):
+        """Sleep until the next check; a capture without a thread is drained here. False at its end."""
+        cap = self.camera_manager.cap
+        if cap is None or hasattr(cap, 'on_demand'):
+            delay = until - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            return True
+        while time.monotonic() < until:
+            if not cap.grab():
+                return False
+        return True
+
+    def run(self, duration=None):
+        deadline = None if duration is None else time.monotonic() + duration
+        next_check = time.monotonic()
+        try:
+            while self.running:
+                if not self.check():
+                    break
+                next_check = max(next_check + self.check_s, time.monotonic())
+                if deadline is not None and next_check >= deadline:
+                    break
+                if not self.wait(next_check):
+                    break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def cpu_load(self):
+        """Fraction of one core used by the process since start()."""
+        wall = time.monotonic() - self._started[0]
+        return (time.process_time() - self._started[1]) / wall if wall > 0 else 0.0
+
+    def stop(self):
+        self.running = False
+        status = self.camera_manager.capture_status()
+        self.camera_manager.release()
+        if self.recording is not None:
+            self.recording.close()
+        if self.telemetry is not None:
+            self.telemetry.close()
+        print(f"Time-lapse stopped: {self.stored} frames stored ({self.stored_on_change} on a change) "
+              f"out of {self.checks} checks, CPU {self.cpu_load() * 100:.1f}%")
+        if status is not None:
+            print(f"{status['grabbed']} frames grabbed without decoding, {status['disconnects']} disconnects")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Store a raw frame every few seconds, or on a change, "
+                                                 "for long monitoring runs at a low CPU load.")
+    parser.add_argument('--interval', type=float, default=10.0, help="seconds between stored frames")
+    parser.add_argument('--check', type=float, default=1.0,
+                        help="seconds between frames checked for a change (and logged to the telemetry)")
+    parser.add_argument('--change', type=float, default=2.0,
+                        help="store a frame early when a reading or a region moved by this many °C")
+    parser.add_argument('--output', help="directory of the recording (default: the Videos/ThermalCam directory)")
+    parser.add_argument('--duration', type=float, help="stop after this many seconds")
+    parser.add_argument('--no-auto-calibrate', action='store_true',
+                        help="never trigger the shutter calibration automatically")
+    parser.add_argument('--replay', help="play a .raw recording instead of opening the camera")
+    parser.add_argument('--fps', type=float, default=25.0, help="replay rate when the recording has no timestamps")
+    parser.add_argument('--no-loop', action='store_true', help="stop at the end of the recording")
+    args = parser.parse_args(argv)
+
+    if args.replay:
+        factory = functools.partial(ReplayDevice, args.replay, fps=args.fps, loop=not args.no_loop)
+        camera_manager = CameraManager(factory)
+        # A recording was corrected when it was captured
+        camera_manager.correct_flat_field = camera_manager.correct_bad_pixels = False
+    else:
+        camera_manager = CameraManager()
+
+    # A recording has no shutter
+    timelapse = TimeLapse(camera_manager, args.output, args.interval, args.check, args.change,
+                          not (args.no_auto_calibrate or args.replay))
+    if not timelapse.start():
+        return 1
+    timelapse.run(args.duration)
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -1,17 +1,19 @@
 import cv2
 import os
 import subprocess
+import functools
 from pathlib import Path
 
 
 
 
-def drawTemperature(img, point, T, color = (0,0,0)):
+def drawTemperature(img, point, T, color = (0,0,0), label = None):
     d1, d2 = 2, 5
     dsize = 1
     font = cv2.FONT_HERSHEY_PLAIN
     (x, y) = point
     t = '%.2fC' % T
+    if label: t = label + ' ' + t
     cv2.line(img,(x+d1, y),(x+d2,y),color, dsize)
     cv2.line(img,(x-d1, y),(x-d2,y),color, dsize)
     cv2.line(img,(x, y+d1),(x,y+d2),color, dsize)
@@ -53,8 +55,12 @@ def autoExposure(update, T_min, T_max, T_margin, auto_exposure_type, frame):
 
     return update, T_min, T_max
 
+@functools.lru_cache(maxsize=None)
 def get_pictures_dir():
-    """Get the system Pictures directory and ensure ThermalCam subdirectory exists."""
+    """Get the system Pictures directory and ensure ThermalCam subdirectory exists.
+
+    Resolved once per session; xdg-user-dir is a subprocess.
+    """
     try:
         # Get the Pictures directory using xdg-user-dir
         result = subprocess.run(['xdg-user-dir', 'PICTURES'], capture_output=True, text=True)
@@ -70,8 +76,12 @@ def get_pictures_dir():
         # Fallback to current directory if xdg-user-dir fails
         return str(Path.cwd())
 
+@functools.lru_cache(maxsize=None)
 def get_videos_dir():
-    """Get the system Videos directory and ensure ThermalCam subdirectory exists."""
+    """Get the system Videos directory and ensure ThermalCam subdirectory exists.
+
+    Resolved once per session; xdg-user-dir is a subprocess.
+    """
     try:
         # Get the Videos directory using xdg-user-dir
         result = subprocess.run(['xdg-user-dir', 'VIDEOS'], capture_output=True, text=True)
@@ -86,3 +96,48 @@ def get_videos_dir():
         print(f"Error getting Videos directory: {e}")
         # Fallback to current directory if xdg-user-dir fails
         return str(Path.cwd())
+
+def get_config_dir():
+    """Get the per-user configuration directory of the viewer, creating it if needed."""
+    config_home = os.environ.get('XDG_CONFIG_HOME') or str(Path.home() / '.config')
+    config_dir = Path(config_home) / 'ht301-thermal-viewer'
+    try:
+        config_dir.mkdir(parents=True, exist_ok=True)
+    except Exception as e:
+        print(f"Error creating config directory: {e}")
+    return config_dir
+
+def get_cache_dir():
+    """Get the per-user cache directory of the viewer, creating it if needed."""
+    cache_home = os.environ.get('XDG_CACHE_HOME') or str(Path.home() / '.cache')
+    cache_dir = Path(cache_home) / 'ht301-thermal-viewer'
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+    except Exception as e:
+        print(f"Error creating cache directory: {e}")
+    return cache_dir
+
+def get_data_dir():
+    """Get the per-user data directory of the viewer (logs), creating it if needed."""
+    data_home = os.environ.get('XDG_DATA_HOME') or str(Path.home() / '.local' / 'share')
+    data_dir = Path(data_home) / 'ht301-thermal-viewer'
+    try:
+        data_dir.mkdir(parents=True, exist_ok=True)
+    except Exception as e:
+        print(f"Error creating data directory: {e}")
+    return data_dir
+
+def attach_shared_memory(name):
+    """Attach to an existing shared memory block without taking ownership of it.
+
+    Before Python 3.13 every attach registers the block with the resource
+    tracker of the attaching process, which unlinks it when that process exits.
+    """
+    from multiprocessing import shared_memory
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
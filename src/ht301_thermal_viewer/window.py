@@ -1,8 +1,8 @@
 import gi
-import cv2
 import time
 import subprocess
 import os
+import functools
 from pathlib import Path
 from gi.repository import Gtk, GLib, Adw, Gdk, Gio
 import numpy as np
@@ -11,11 +11,29 @@ from .thermal_view import ThermalView
 from .camera_manager import CameraManager
 from .image_processor import ImageProcessor
 from .recorder import Recorder
+from .pretrigger import PreTriggerBuffer
+from .footer import split_frame
+from .alarms import AlarmEngine
+from .snapshot import SnapshotWriter
+from .change_detector import FrameChangeDetector
+from .hotspots import HotspotDetector
+from .instrumentation import FrameStats
+from .quality_governor import QualityGovernor
+from .frame_bus import FrameBusPublisher
+from .nuc import ShutterScheduler
+from .telemetry import TelemetryLog, log_path
+from .telemetry_panel import TelemetryPanel
 from .controls_manager import ControlsManager
-from .utils import get_pictures_dir
+from .histogram_panel import HistogramPanel
+from .line_profile_panel import LineProfilePanel
+from .playback_bar import PlaybackBar
+from .raw_reader import ReplayDevice
+from .capture import ResilientCapture
+from .control_server import ControlServer, socket_path
+from .utils import get_pictures_dir, get_videos_dir
 
 class ThermalCameraWindow(Adw.ApplicationWindow):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, playback_path=None, **kwargs):
         super().__init__(*args, **kwargs)
         
         # Set window properties
@@ -25,8 +43,36 @@ class ThermalCameraWindow(Adw.ApplicationWindow):
         
         # Initialize components
         self.camera_manager = CameraManager()
+        # Recording played instead of the camera, if any
+        self.playback_path = None
+        self.update_source = None
         self.image_processor = ImageProcessor()
         self.recorder = Recorder()
+        # Last seconds of raw frames, saved on demand or prepended to raw recordings
+        self.pretrigger_buffer = PreTriggerBuffer(duration=10.0, max_bytes=64 * 1024 * 1024)
+        # Start raw recordings with the buffered seconds (a toggle in the buffer menu)
+        self.pretrigger_preroll = False
+        self.snapshot_writer = SnapshotWriter()
+        self.last_info = None
+        # Visible raw data of the last displayed frame, for the histogram panel
+        self.last_visible = None
+        # Skip the render pipeline when neither the scene nor the settings changed
+        self.change_detector = FrameChangeDetector()
+        # Top-K tracked hotspots, drawn by the overlay when enabled
+        self.hotspot_detector = HotspotDetector()
+        self.stats = FrameStats()
+        # Lowers rendering quality step by step when frames take too long
+        self.governor = QualityGovernor()
+        self.governor.on_change = self.on_quality_changed
+        self.image_processor.pipeline.stats = self.stats
+        # Triggers the shutter calibration when the sensor drifted
+        self.shutter_scheduler = ShutterScheduler(self.camera_manager)
+        # Footer telemetry of the last two minutes, also written to CSV when
+        # HT301_TELEMETRY_LOG is set (to a path, or 1 for the data directory)
+        self.telemetry = TelemetryLog(path=log_path(os.environ.get('HT301_TELEMETRY_LOG')))
+        # Raw frames for other processes, when HT301_FRAME_BUS names the bus
+        bus_name = os.environ.get('HT301_FRAME_BUS')
+        self.frame_bus = FrameBusPublisher(bus_name) if bus_name else None
         
         # Screen wake lock inhibitor
         self.wake_lock_inhibitor = None
@@ -48,13 +94,75 @@ class ThermalCameraWindow(Adw.ApplicationWindow):
         drag_gesture.connect("drag-update", self.on_drag_update)
         self.thermal_view.drawing_area.add_controller(drag_gesture)  # Add gesture to drawing area
         
+        # Digital zoom: pinch or scroll to zoom, drag to pan while zoomed,
+        # double click to reset
+        self._pointer = None
+        self._pan_offset = None
+        self._line_start = None
+        self._pinch_zoom = None
+        zoom_gesture = Gtk.GestureZoom.new()
+        zoom_gesture.connect("begin", self.on_zoom_begin)
+        zoom_gesture.connect("scale-changed", self.on_zoom_scale_changed)
+        self.thermal_view.drawing_area.add_controller(zoom_gesture)
+        scroll_controller = Gtk.EventControllerScroll.new(Gtk.EventControllerScrollFlags.VERTICAL)
+        scroll_controller.connect("scroll", self.on_zoom_scroll)
+        self.thermal_view.drawing_area.add_controller(scroll_controller)
+        motion_controller = Gtk.EventControllerMotion.new()
+        motion_controller.connect("motion", self.on_pointer_motion)
+        self.thermal_view.drawing_area.add_controller(motion_controller)
+        click_gesture = Gtk.GestureClick.new()
+        click_gesture.connect("pressed", self.on_view_pressed)
+        self.thermal_view.drawing_area.add_controller(click_gesture)
+        
         self.main_box.append(self.thermal_view)
         
+        # Histogram panel, toggled from the top controls
+        self.histogram_panel = HistogramPanel(self)
+        self.thermal_view.overlay.add_overlay(self.histogram_panel)
+        
+        # Temperature along a line, toggled from the top controls
+        self.line_profile_panel = LineProfilePanel(self)
+        self.thermal_view.overlay.add_overlay(self.line_profile_panel)
+        
+        # Sensor temperatures and drift, toggled from the transformations menu
+        self.telemetry_panel = TelemetryPanel(self.telemetry)
+        self.thermal_view.overlay.add_overlay(self.telemetry_panel)
+        
+        # Shown while a lost camera is being reconnected
+        self.capture_status_label = Gtk.Label()
+        self.capture_status_label.set_halign(Gtk.Align.CENTER)
+        self.capture_status_label.set_valign(Gtk.Align.CENTER)
+        self.capture_status_label.add_css_class("capture-status")
+        self.capture_status_label.set_visible(False)
+        self.thermal_view.overlay.add_overlay(self.capture_status_label)
+        
+        # Seek bar and speed of the recording in playback mode
+        self.playback_bar = PlaybackBar(self)
+        self.thermal_view.overlay.add_overlay(self.playback_bar)
+        
         # Create controls
         self.controls_manager = ControlsManager(self, self.image_processor, self.camera_manager, self.recorder)
         self.thermal_view.overlay.add_overlay(self.controls_manager.controls)
         self.thermal_view.overlay.add_overlay(self.controls_manager.top_controls)
         
+        # Alarm rules from the config directory, evaluated on every frame
+        self.alarm_engine = AlarmEngine.from_config()
+        self.alarm_engine.actions.update({
+            'snapshot': self.save_screenshot,
+            'record_start': lambda: self.controls_manager.record_button.set_active(True),
+            'record_stop': lambda: self.controls_manager.record_button.set_active(False),
+            'save_buffer': self.save_pretrigger_buffer,
+        })
+        
+        # JSON-RPC control socket, when HT301_CONTROL_SOCKET is set (to a path, or 1)
+        self.control_server = None
+        control_path = socket_path(os.environ.get('HT301_CONTROL_SOCKET'))
+        if control_path is not None:
+            self.control_server = ControlServer(control_path, self.camera_manager, self.telemetry)
+            self.register_controls(self.control_server)
+            if not self.control_server.start():
+                self.control_server = None
+        
         # Apply CSS styles
         self.apply_css()
         
@@ -70,6 +178,10 @@ class ThermalCameraWindow(Adw.ApplicationWindow):
         # Get the original orientation lock setting
         self.get_original_orientation_lock()
         
+        if playback_path is not None:
+            self.set_playback_source(playback_path)
+            self.controls_manager.update_playback_button()
+        
     def apply_css(self):
         css_provider = Gtk.CssProvider()
         css_provider.load_from_path(str(Path(__file__).parent / "styles.css"))
@@ -178,40 +290,248 @@ class ThermalCameraWindow(Adw.ApplicationWindow):
         
     def initialize_camera(self):
         if self.camera_manager.initialize():
+            self.governor.sensor_fps = self.camera_manager.sensor_fps()
+            self.capture_status_label.set_visible(False)
+            if self.playback_path is not None:
+                self.playback_bar.attach()
             # Start continuous update loop after camera is initialized
-            GLib.idle_add(self.update_frame)
+            if self.update_source is None:
+                self.update_source = GLib.idle_add(self.update_frame)
             return False
         else:
             print("Camera initialization failed!")
+            # Nothing to read: stop the update loop instead of spinning on it
+            self.stop_updates()
+            self.show_camera_missing()
+            if self.playback_path is None:
+                # Look for the camera again until it is plugged in
+                self.update_source = GLib.timeout_add_seconds(2, self._retry_camera)
             return False
+            
+    def stop_updates(self):
+        """Remove the pending update (or camera retry) callback, if any."""
+        if self.update_source is not None:
+            GLib.source_remove(self.update_source)
+            self.update_source = None
+            
+    def _retry_camera(self):
+        # This source ends here; initialize_camera() schedules the next one if needed
+        self.update_source = None
+        self.initialize_camera()
+        return False
+        
+    def show_camera_missing(self):
+        """Show that there is no source to play instead of a frozen image."""
+        if self.playback_path is None:
+            text = "No camera found\nWaiting for the camera..."
+        else:
+            text = f"Cannot play {Path(self.playback_path).name}"
+        self.capture_status_label.set_text(text)
+        self.capture_status_label.set_visible(True)
+        
+    def set_playback_source(self, path):
+        """Play a raw recording (None: the camera) on the next initialize_camera()."""
+        self.playback_path = path
+        # A recording has no shutter, and was corrected when it was captured
+        self.shutter_scheduler.enabled = path is None
+        self.camera_manager.correct_flat_field = self.camera_manager.correct_bad_pixels = path is None
+        if path is None:
+            self.camera_manager.device_factory = ResilientCapture
+        else:
+            self.camera_manager.device_factory = functools.partial(ReplayDevice, path, prefetch=True)
+            
+    def open_recording(self, path):
+        """Switch from the camera (or another recording) to playing a raw recording."""
+        self.playback_bar.detach()
+        self.stop_updates()
+        self.camera_manager.release()
+        self.change_detector.reset()
+        self.set_playback_source(path)
+        self.initialize_camera()
+        
+    def close_recording(self):
+        """Leave playback mode and go back to the camera."""
+        self.open_recording(None)
         
     def update_frame(self):
         try:
-            ret, frame, frame_raw, info = self.camera_manager.read_frame()
+            if self.control_server is not None:
+                self.control_server.run_pending()
+            if self.camera_manager.cap is None:
+                # Released with no source to replace it: initialize_camera() restarts the loop
+                self.update_source = None
+                return False
+            if self.playback_path is not None:
+                # A recording is paced here rather than by sleeping in read(), which would block
+                # the UI. At most 100 ms at a time, so seeks and controls are handled meanwhile.
+                delay = self.camera_manager.cap.due_in()
+                if delay > 0.001:
+                    self.update_source = GLib.timeout_add(max(1, int(min(delay, 0.1) * 1000)),
+                                                          self._resume_updates)
+                    return False
+            ret, frame, frame_raw = self.camera_manager.read_raw()
+            timestamp = time.monotonic()
             if not ret:
+                if self.camera_manager.reconnecting():
+                    # Poll slowly, keeping the UI responsive, until the camera is back
+                    self.show_capture_status()
+                    self.update_source = GLib.timeout_add(250, self._resume_updates)
+                    return False
                 print("Failed to read frame in update_frame")
                 return True  # Keep the loop running even if we fail
+            if self.capture_status_label.get_visible():
+                self.capture_status_label.set_visible(False)
+                
+            # Raw data is kept for every frame, changed or not
+            self.recorder.write_raw_frame(frame_raw, timestamp)
+            self.pretrigger_buffer.push(frame_raw, timestamp)
+            meta = split_frame(frame_raw)[1]
+            lut = self.camera_manager.lut_cache.lookup(meta)
+            self.telemetry.append(meta, timestamp, lut)
+            if self.frame_bus is not None:
+                self.frame_bus.publish(frame_raw, lut, timestamp)
+            if self.control_server is not None:
+                self.control_server.publish(frame_raw, lut, timestamp)
+            
+            self.stats.count('frames')
+            self.stats.maybe_report()
+            # Never calibrate (and freeze the image) in the middle of a recording
+            busy = self.recorder.is_recording or self.recorder.is_raw_recording
+            if self.shutter_scheduler.update(frame_raw, timestamp, busy):
+                self.stats.count('auto_calibrations')
                 
-            # Process frame with current settings
+            # Readings and alarms see every frame; only rendering may be skipped
+            info = self.camera_manager.read_info()
+            if self.alarm_engine:
+                self.alarm_engine.evaluate(frame, info, self.camera_manager.lut,
+                                           self.camera_manager.lut_cache.version, timestamp)
+            if not self.change_detector.changed(frame_raw, self.image_processor.version, timestamp):
+                self.stats.count('skipped')
+                return True
+            if not self.governor.should_display():
+                self.stats.count('decimated')
+                return True
+                
+            process_start = time.perf_counter()
+            if self.hotspot_detector.enabled:
+                info['hotspots'] = self.hotspot_detector.update(frame, self.camera_manager.lut)
+            self.last_info = info
+            self.last_visible = frame
+            
+            # Normalize, colormap, transform and overlay in the frame pipeline
+            self.image_processor.set_lut(self.camera_manager.lut, self.camera_manager.lut_cache.version)
             processed_frame = self.image_processor.process_frame(frame, info)
             
-            # Write frame if recording
-            self.recorder.write_frame(processed_frame)
-            self.recorder.write_raw_frame(frame_raw)
+            # Write frame if recording; skipped frames are repeated by the encoder
+            self.recorder.write_frame(processed_frame, timestamp)
             
             # Update display
             self.thermal_view.update_frame(processed_frame, frame_raw)
+            
+            processing_time = time.perf_counter() - process_start
+            self.governor.frame_processed(processing_time)
+            self.stats.add_time('process', processing_time)
             return True
         except Exception as e:
             print(f"Error in update_frame: {e}")
             return True
             
+    def register_controls(self, server):
+        """Expose the viewer's controls on the control server; they run in update_frame()."""
+        processor = self.image_processor
+        controls = self.controls_manager
+        
+        def set_colormap(name=None, index=None):
+            names = [n for n, _ in processor.colormaps]
+            if name is not None:
+                if name not in names:
+                    raise ValueError(f"unknown colormap '{name}'")
+                index = names.index(name)
+            if index is None or not 0 <= int(index) < len(names):
+                raise ValueError("give a colormap name or a valid index")
+            processor.current_colormap_idx = int(index)
+            return names[int(index)]
+            
+        def set_recording(active=True):
+            controls.record_button.set_active(bool(active))
+            return self.recorder.is_recording
+            
+        def set_raw_recording(active=True):
+            controls.raw_record_button.set_active(bool(active))
+            return self.recorder.is_raw_recording
+            
+        def status():
+            return {
+                'colormap': processor.get_current_colormap_name(),
+                'recording': self.recorder.is_recording,
+                'raw_recording': self.recorder.is_raw_recording,
+                'playback': None if self.playback_path is None else str(self.playback_path),
+                'zoom': processor.zoom,
+                'rotation': processor.rotation,
+                'flip_horizontal': processor.flip_horizontal,
+                'flip_vertical': processor.flip_vertical,
+            }
+            
+        server.register('colormaps', lambda: [n for n, _ in processor.colormaps], description="colormap names")
+        server.register('set_colormap', set_colormap, frame_loop=True, description="select a colormap by name or index")
+        server.register('set_recording', set_recording, frame_loop=True, description="start (active=true) or stop the video recording")
+        server.register('set_raw_recording', set_raw_recording, frame_loop=True, description="start or stop the raw recording")
+        server.register('snapshot', self.save_screenshot, frame_loop=True, description="save a screenshot")
+        server.register('status', status, frame_loop=True, description="render and recording settings")
+        server.register('hotspots', lambda: [h._asdict() for h in (self.last_info or {}).get('hotspots', [])],
+                        frame_loop=True, description="tracked hotspots of the last displayed frame")
+        
+    def _resume_updates(self):
+        self.update_source = GLib.idle_add(self.update_frame)
+        return False
+        
+    def show_capture_status(self):
+        """Show that the camera is lost and how the reconnection is going."""
+        status = self.camera_manager.capture_status()
+        if status is None:
+            return
+        self.capture_status_label.set_text(f"Camera disconnected\n{status['last_error']}\nReconnecting...")
+        self.capture_status_label.set_visible(True)
+        self.stats.set_value('disconnects', status['disconnects'])
+        
+    def on_quality_changed(self, governor):
+        """Apply the settings of the new quality level."""
+        self.image_processor.denoise_allowed = governor.denoise_allowed
+        self.thermal_view.fast_scaling = governor.fast_scaling
+        self.thermal_view.set_quality(governor.level, governor.name)
+        self.stats.set_value('quality', governor.level)
+        
     def save_screenshot(self):
         if self.thermal_view.current_frame is not None:
-            filename = time.strftime("%Y-%m-%d_%H:%M:%S") + '.png'
-            save_path = Path(get_pictures_dir()) / filename
-            cv2.imwrite(str(save_path), self.thermal_view.current_frame)
-            print(f"Screenshot saved as {save_path}")
+            # Rendered image plus raw frame, footer and LUT, written off the UI thread
+            self.snapshot_writer.capture(
+                get_pictures_dir(),
+                self.thermal_view.current_frame,
+                getattr(self.thermal_view, 'frame_raw', None),
+                self.camera_manager.lut,
+                self.last_info,
+            )
+            
+    def save_pretrigger_buffer(self, as_video=False):
+        """Save the pre-trigger buffer as a raw recording or a rendered video, in the background."""
+        base_filename = time.strftime("%Y-%m-%d_%H:%M:%S") + '_pretrigger'
+        save_dir = Path(get_videos_dir())
+        if not as_video:
+            return self.pretrigger_buffer.save(save_dir / f"{base_filename}.raw")
+            
+        # Render with a private processor: the UI one keeps running meanwhile
+        processor = ImageProcessor()
+        for attr in ('flip_horizontal', 'flip_vertical', 'rotation', 'current_colormap_idx', 'agc',
+                     'zoom', 'zoom_center', 'zoom_contrast'):
+            setattr(processor, attr, getattr(self.image_processor, attr))
+            
+        def render(frame_raw):
+            visible, _ = split_frame(frame_raw)
+            return processor.process_frame(visible)
+            
+        buffered, duration = len(self.pretrigger_buffer), self.pretrigger_buffer.duration()
+        fps = (buffered - 1) / duration if duration > 0 else self.recorder.video_fps
+        return self.pretrigger_buffer.save_video(save_dir / f"{base_filename}.mp4", render, fps)
             
     def on_window_close(self, window):
         # Clean up wake lock inhibitor
@@ -220,11 +540,30 @@ class ThermalCameraWindow(Adw.ApplicationWindow):
         self.enable_auto_rotation()
         
         self.recorder.cleanup()
+        self.snapshot_writer.close()
+        print(f"Frames skipped as unchanged: {self.change_detector.skip_rate:.0%}")
+        self.alarm_engine.close()
+        self.telemetry.close()
+        if self.control_server is not None:
+            self.control_server.close()
+        if self.frame_bus is not None:
+            self.frame_bus.close()
         self.camera_manager.release()
         self.get_application().quit()
         return True
 
     def on_drag_begin(self, gesture, start_x, start_y):
+        # With the line profile tool on, dragging draws its line
+        self._line_start = None
+        if self.line_profile_panel.active:
+            self._line_start = (start_x, start_y)
+            self.line_profile_panel.begin_line(start_x, start_y)
+            return
+        # While zoomed, dragging pans the image instead of moving the window
+        if self.image_processor.zoom > 1.0:
+            self._pan_offset = (0.0, 0.0)
+            return
+        self._pan_offset = None
         # Start window dragging using the root surface
         surface = self.get_surface()
         if surface:
@@ -238,5 +577,40 @@ class ThermalCameraWindow(Adw.ApplicationWindow):
             )
         
     def on_drag_update(self, gesture, offset_x, offset_y):
-        # This is needed to handle the drag update event, but we don't need to do anything here
-        pass 
\ No newline at end of file
+        if self._line_start is not None:
+            self.line_profile_panel.extend_line(self._line_start[0] + offset_x, self._line_start[1] + offset_y)
+            return
+        # Window moves are handled by the compositor; only pans need updates
+        if self._pan_offset is None or self.thermal_view.view_geometry is None:
+            return
+        scale = self.thermal_view.view_geometry[0]
+        last_x, last_y = self._pan_offset
+        self._pan_offset = (offset_x, offset_y)
+        self.image_processor.pan_by((offset_x - last_x) / scale, (offset_y - last_y) / scale)
+        
+    def on_pointer_motion(self, controller, x, y):
+        self._pointer = (x, y)
+        
+    def _zoom_point(self, x, y):
+        """Displayed frame pixel under a drawing area point, or None (the middle)."""
+        if x is None:
+            return None
+        return self.thermal_view.widget_to_frame(x, y)
+        
+    def on_zoom_scroll(self, controller, dx, dy):
+        x, y = self._pointer if self._pointer is not None else (None, None)
+        self.image_processor.zoom_at(self.image_processor.zoom * (1.25 ** -dy), self._zoom_point(x, y))
+        return True
+        
+    def on_zoom_begin(self, gesture, sequence):
+        self._pinch_zoom = self.image_processor.zoom
+        
+    def on_zoom_scale_changed(self, gesture, scale):
+        if self._pinch_zoom is None:
+            return
+        ok, x, y = gesture.get_bounding_box_center()
+        self.image_processor.zoom_at(self._pinch_zoom * scale, self._zoom_point(x, y) if ok else None)
+        
+    def on_view_pressed(self, gesture, n_press, x, y):
+        if n_press == 2:
+            self.image_processor.reset_zoom() 
\ No newline at end of file